@@ -0,0 +1,207 @@
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+# Контроль нагрузки перед анализом видео. Каждый запрос резервирует
+# "взвешенные кадры" - число кадров под модель с поправкой на сложность модели,
+# шаг выборки и отрисовку. Давление - большее из доли занятого бюджета кадров
+# и loadavg на ядро. Под давлением параметры запроса понижаются по лестнице
+# DEGRADATION_STEPS, а сверх порога запрос отклоняется с 429 и Retry-After.
+
+# Относительная стоимость кадра для model_complexity 0..2
+COMPLEXITY_COST = {0: 0.6, 1: 1.0, 2: 2.5}
+# Доля стоимости кадра на разметку и кодирование выходного видео
+RENDER_COST = 0.3
+
+class AdmissionRejected(Exception):
+    """Сервер перегружен; retry_after - через сколько секунд повторить запрос"""
+
+    def __init__(self, message: str, retry_after: int, pressure: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.pressure = pressure
+
+def frame_cost(params: Dict, frames: int) -> float:
+    """Взвешенные кадры запроса с параметрами анализа params"""
+    per_frame = COMPLEXITY_COST.get(params["model_complexity"], 1.0)
+    if params.get("people"):
+        # Групповой режим: модель на каждом человеке, выборки кадров нет
+        per_frame *= params["people"]
+    elif params["sampling"] == "adaptive":
+        per_frame /= max(1, params["sample_stride"])
+    if params["render"]:
+        per_frame += RENDER_COST
+    return frames * per_frame
+
+def cpu_load() -> float:
+    """loadavg за минуту на одно ядро; 0, если система его не дает"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (OSError, AttributeError):
+        return 0.0
+
+class AdmissionTicket:
+    """Резерв запроса в бюджете кадров; освобождается при выходе из with или release()"""
+
+    def __init__(self, controller: "AdmissionController", cost: float, pressure: float,
+                 degradations: List[Dict]):
+        self.controller = controller
+        self.ticket_id = uuid.uuid4().hex
+        self.cost = cost
+        self.pressure = pressure
+        self.degradations = degradations
+        self.released = False
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        self.controller.release(self)
+
+    def summary(self) -> Dict:
+        """Для JSON ответа: давление при допуске и примененные понижения"""
+        return {
+            "pressure": round(self.pressure, 3),
+            "frame_cost": round(self.cost, 1),
+            "degraded": bool(self.degradations),
+            "degradations": self.degradations
+        }
+
+    def __enter__(self) -> "AdmissionTicket":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class AdmissionController:
+    """Допуск запросов по бюджету кадров в работе и загрузке CPU.
+
+    При давлении от degrade_at параметры понижаются по шагам, пока давление
+    с учетом запроса не опустится ниже degrade_at или шаги не кончатся.
+    Если и после этого давление не ниже shed_at, запрос отклоняется. Запрос
+    на пустой сервер с нормальной загрузкой CPU принимается всегда, даже если
+    одно видео больше бюджета.
+    """
+
+    # Шаги понижения по порядку: (параметр, описание)
+    DEGRADATION_STEPS = (
+        ("workers", "один процесс вместо параллельного анализа"),
+        ("model_complexity", "модель не тяжелее full (1)"),
+        ("sample_stride", "модель не на каждом кадре"),
+        ("sample_stride", "реже запуск модели вдали от порогов"),
+        ("render", "без размеченного видео"),
+        ("model_complexity", "облегченная модель lite (0)")
+    )
+
+    def __init__(self, max_frames: float, max_load: float, degrade_at: float, shed_at: float,
+                 retry_after: int, sample_stride: int, max_stride: int):
+        self.max_frames = max_frames
+        self.max_load = max_load
+        self.degrade_at = degrade_at
+        self.shed_at = shed_at
+        self.retry_after = retry_after
+        self.sample_stride = sample_stride
+        self.max_stride = max_stride
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def inflight_frames(self) -> float:
+        with self.lock:
+            return sum(self.inflight.values())
+
+    def pressure(self, extra_frames: float = 0.0) -> float:
+        """Давление с учетом extra_frames еще не допущенного запроса"""
+        frames = (self.inflight_frames() + extra_frames) / self.max_frames if self.max_frames else 0.0
+        load = cpu_load() / self.max_load if self.max_load else 0.0
+        return max(frames, load)
+
+    def _reject(self, pressure: float):
+        raise AdmissionRejected("Server is overloaded, retry later", self.retry_after, pressure)
+
+    def check(self):
+        """Быстрая проверка до чтения загрузки: уже перегружен - сразу 429"""
+        pressure = self.pressure()
+        if pressure >= self.shed_at:
+            self._reject(pressure)
+
+    def _degrade(self, params: Dict, step: int) -> Optional[Tuple]:
+        """Применяет шаг понижения к params; (параметр, было, стало) или None, если шаг не нужен"""
+        name = self.DEGRADATION_STEPS[step][0]
+        before = params[name]
+        if step == 0:
+            params["workers"] = 1
+        elif step == 1:
+            params["model_complexity"] = min(params["model_complexity"], 1)
+        elif step in (2, 3) and (params.get("people") or params.get("segmentation") == "auto"):
+            # В групповом режиме и при автоматической разметке выборки кадров нет, понижать нечего
+            return None
+        elif step == 2:
+            if params["sampling"] != "adaptive":
+                params["sampling"] = "adaptive"
+                params["sample_stride"] = max(params["sample_stride"], self.sample_stride)
+                return "sampling", "full", f"adaptive/{params['sample_stride']}"
+            return None
+        elif step == 3:
+            params["sample_stride"] = min(max(params["sample_stride"] * 2, 2), self.max_stride)
+        elif step == 4:
+            params["render"] = False
+        elif step == 5:
+            params["model_complexity"] = 0
+        if params[name] == before:
+            return None
+        return name, before, params[name]
+
+    def admit(self, params: Dict, frames: int) -> Tuple[Dict, AdmissionTicket]:
+        """Понижает параметры под текущую нагрузку и резервирует кадры запроса.
+
+        Возвращает новые параметры и билет; при перегрузке - AdmissionRejected.
+        """
+        params = dict(params)
+        degradations = []
+        with self.lock:
+            inflight = sum(self.inflight.values())
+        load = cpu_load() / self.max_load if self.max_load else 0.0
+
+        def pressure_with(cost: float) -> float:
+            return max((inflight + cost) / self.max_frames if self.max_frames else 0.0, load)
+
+        cost = frame_cost(params, frames)
+        pressure = pressure_with(cost)
+        step = 0
+        while pressure >= self.degrade_at and step < len(self.DEGRADATION_STEPS):
+            change = self._degrade(params, step)
+            if change is not None:
+                name, before, after = change
+                degradations.append({"param": name, "requested": before, "applied": after,
+                                     "reason": self.DEGRADATION_STEPS[step][1]})
+                cost = frame_cost(params, frames)
+                pressure = pressure_with(cost)
+            step += 1
+
+        # Пустой сервер берет даже видео больше бюджета
+        if pressure >= self.shed_at and (inflight > 0 or load >= self.shed_at):
+            self._reject(pressure)
+        ticket = AdmissionTicket(self, cost, pressure, degradations)
+        with self.lock:
+            self.inflight[ticket.ticket_id] = cost
+        return params, ticket
+
+    def release(self, ticket: AdmissionTicket):
+        with self.lock:
+            self.inflight.pop(ticket.ticket_id, None)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            inflight = sum(self.inflight.values())
+            requests = len(self.inflight)
+        return {
+            "inflight_frames": round(inflight, 1),
+            "inflight_requests": requests,
+            "max_frames": self.max_frames,
+            "cpu_load": round(cpu_load(), 3),
+            "max_load": self.max_load,
+            "pressure": round(self.pressure(), 3),
+            "degrade_at": self.degrade_at,
+            "shed_at": self.shed_at
+        }
@@ -0,0 +1,1816 @@
+import cv2
+import numpy as np
+import tempfile
+import ast
+import hashlib
+import contextlib
+import shutil
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import os
+import time
+import mediapipe as mp
+from mediapipe.framework.formats import landmark_pb2
+from typing import List, Dict, Tuple, Optional, Callable, Iterable
+
+import vector_counters
+import landmark_export
+from metrics import StageRecorder
+from smoothing import SMOOTHING_METHODS, create_filter
+from checkpoint import Checkpoint, CheckpointStore
+from landmark_cache import (FRAME_MISSING, FRAME_POSE, LandmarkCache, LandmarkCacheEntry,
+                            landmarks_from_array, landmarks_to_array)
+from people import PersonDetector, PersonTracker, Track, expand_box
+from segmentation import REST, ExerciseSegmenter
+from pipeline import FramePipeline
+from pose_pool import PosePool, create_pose, parse_pool_sizes
+
+# Анализ видео тренировки: счетчики повторений, модели Pose и проходы
+# по видео (последовательный, параллельный, групповой, с автоматической разметкой).
+# Flask здесь не подключается: модуль импортируют процессы параллельного анализа,
+# пакетный анализ из командной строки и benchmark.py, сервис - api.py.
+
+# Инициализация MediaPipe
+mp_pose = mp.solutions.pose
+mp_drawing = mp.solutions.drawing_utils
+
+# Настройки по умолчанию
+DEFAULT_LANDMARK_COLOR = (0, 255, 0)
+DEFAULT_CONNECTION_COLOR = (255, 0, 0)
+# Скелет рисуется прямо на BGR кадре, поэтому цвета переставлены из RGB в BGR
+LANDMARK_DRAWING_SPEC = mp_drawing.DrawingSpec(
+    color=DEFAULT_LANDMARK_COLOR[::-1], thickness=2, circle_radius=2)
+CONNECTION_DRAWING_SPEC = mp_drawing.DrawingSpec(
+    color=DEFAULT_CONNECTION_COLOR[::-1], thickness=2)
+
+EXERCISE_TYPES = ["Отжимания", "Приседания", "Подтягивания", "Планка", "Выпады"]
+
+# Если до следующего интервала больше кадров, перематываем через CAP_PROP_POS_FRAMES, иначе grab()
+SEEK_THRESHOLD_FRAMES = 60
+
+# Параллельный анализ: предел числа процессов, длина куска в кадрах и перекрытие для прогрева
+# трекинга. Запрос идет в пуле процессов, только если задан workers > 1 (см. analyze_video_parallel)
+PARALLEL_WORKERS = int(os.environ.get("PARALLEL_WORKERS", os.cpu_count() or 1))
+CHUNK_FRAMES = int(os.environ.get("CHUNK_FRAMES", 900))
+CHUNK_OVERLAP_FRAMES = int(os.environ.get("CHUNK_OVERLAP_FRAMES", 15))
+
+# Сколько моделей Pose держать в пуле для каждого model_complexity ("сложность:число,...")
+POSE_POOL_SIZES = os.environ.get("POSE_POOL_SIZES", "0:1,1:2,2:1")
+
+# Вырез по человеку: запас вокруг рамки landmarks (доля размера рамки) и порог видимости точек
+CROP_PADDING = 0.25
+CROP_MIN_VISIBILITY = 0.5
+
+# Размер очередей между стадиями конвейера декодирование -> инференс -> кодирование
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 8))
+
+# Адаптивная выборка кадров: модель на каждом SAMPLING_STRIDE-м кадре, пока сигналы
+# счетчиков дальше SAMPLING_MARGIN (в нормированных координатах) от порога
+SAMPLING_MODES = ("full", "adaptive")
+SAMPLING_STRIDE = int(os.environ.get("SAMPLING_STRIDE", 3))
+SAMPLING_MARGIN = float(os.environ.get("SAMPLING_MARGIN", 0.03))
+
+# Устойчивый подсчет: сглаживание landmarks перед счетчиками (none/ema/one_euro) и его
+# параметры, полоса гистерезиса порогов счетчиков (в нормированных координатах)
+# и минимальная длительность повторения (сек). По умолчанию счетчики работают как раньше
+SMOOTHING = os.environ.get("SMOOTHING", "none")
+SMOOTHING_MIN_CUTOFF = float(os.environ.get("SMOOTHING_MIN_CUTOFF", 1.5))
+SMOOTHING_BETA = float(os.environ.get("SMOOTHING_BETA", 1.0))
+SMOOTHING_TAU = float(os.environ.get("SMOOTHING_TAU", 0.08))
+HYSTERESIS_BAND = float(os.environ.get("HYSTERESIS_BAND", 0.0))
+MIN_REP_DURATION = float(os.environ.get("MIN_REP_DURATION", 0.0))
+# После паузы длиннее этого (сек) фильтр начинает заново
+SMOOTHING_MAX_GAP = 0.5
+# Суставы, которые читают счетчики: сглаживаются только они
+COUNTER_JOINTS = tuple(mp_pose.PoseLandmark[name] for name in (
+    "LEFT_SHOULDER", "RIGHT_SHOULDER", "LEFT_ELBOW", "RIGHT_ELBOW", "LEFT_HIP", "RIGHT_HIP",
+    "LEFT_KNEE", "RIGHT_KNEE", "LEFT_ANKLE", "RIGHT_ANKLE"))
+
+# Кеш landmarks на диске и его максимальный размер в байтах
+LANDMARK_CACHE_DIR = os.environ.get(
+    "LANDMARK_CACHE_DIR", os.path.join(tempfile.gettempdir(), "diplom_landmark_cache"))
+LANDMARK_CACHE_MAX_BYTES = int(os.environ.get("LANDMARK_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+# Групповой режим (несколько человек в кадре): максимум людей, шаг детектора людей
+# в кадрах, размер кадра для детектора, запас рамки человека для модели, через сколько
+# секунд без человека трек завершается и сколько секунд человек должен быть найден,
+# чтобы попасть в результат
+PEOPLE_MAX = int(os.environ.get("PEOPLE_MAX", 6))
+PEOPLE_DETECT_INTERVAL = int(os.environ.get("PEOPLE_DETECT_INTERVAL", 15))
+PEOPLE_DETECT_MAX_SIDE = int(os.environ.get("PEOPLE_DETECT_MAX_SIDE", 640))
+PEOPLE_BOX_PADDING = 0.15
+PEOPLE_LOST_SECONDS = float(os.environ.get("PEOPLE_LOST_SECONDS", 1.0))
+PEOPLE_MIN_SECONDS = float(os.environ.get("PEOPLE_MIN_SECONDS", 1.0))
+
+# Автоматическая разметка упражнений (см. segmentation.py): окно классификатора
+# и минимальная длительность отрезка в секундах
+SEGMENTATION_MODES = ("manual", "auto")
+SEGMENT_WINDOW = float(os.environ.get("SEGMENT_WINDOW", 2.0))
+SEGMENT_MIN_DURATION = float(os.environ.get("SEGMENT_MIN_DURATION", 4.0))
+
+# Контрольные точки долгого анализа: папка, шаг в кадрах видео и время хранения (сек).
+# Повторная отправка того же видео с теми же параметрами продолжает с последней точки
+CHECKPOINT_DIR = os.environ.get("CHECKPOINT_DIR", os.path.join(tempfile.gettempdir(), "diplom_checkpoints"))
+CHECKPOINT_FRAMES = int(os.environ.get("CHECKPOINT_FRAMES", 900))
+CHECKPOINT_TTL = int(os.environ.get("CHECKPOINT_TTL", 24 * 3600))
+CHECKPOINTS_ENABLED = os.environ.get("CHECKPOINTS", "1") == "1"
+
+def count_pushups(landmarks, prev_state, counter, band=0.0):
+    """Алгоритм подсчета отжиманий; band - полоса гистерезиса вокруг порога"""
+    left_shoulder = landmarks.landmark[mp_pose.PoseLandmark.LEFT_SHOULDER]
+    right_shoulder = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_SHOULDER]
+    left_elbow = landmarks.landmark[mp_pose.PoseLandmark.LEFT_ELBOW]
+    right_elbow = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_ELBOW]
+    
+    shoulder_y = (left_shoulder.y + right_shoulder.y) / 2
+    elbow_y = (left_elbow.y + right_elbow.y) / 2
+    
+    if elbow_y > shoulder_y + band:
+        current_state = "down"
+    elif elbow_y <= shoulder_y - band:
+        current_state = "up"
+    else:
+        # Внутри полосы гистерезиса фаза не меняется
+        current_state = prev_state
+    
+    if prev_state == "up" and current_state == "down":
+        counter += 1
+        prev_state = "down"
+    elif current_state == "up":
+        prev_state = "up"
+    
+    return counter, prev_state
+
+def count_squats(landmarks, prev_state, counter, band=0.0):
+    """Алгоритм подсчета приседаний; band - полоса гистерезиса вокруг порога"""
+    left_hip = landmarks.landmark[mp_pose.PoseLandmark.LEFT_HIP]
+    right_hip = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_HIP]
+    left_knee = landmarks.landmark[mp_pose.PoseLandmark.LEFT_KNEE]
+    right_knee = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_KNEE]
+    
+    hip_y = (left_hip.y + right_hip.y) / 2
+    knee_y = (left_knee.y + right_knee.y) / 2
+    
+    if knee_y > hip_y + band:
+        current_state = "down"
+    elif knee_y <= hip_y - band:
+        current_state = "up"
+    else:
+        current_state = prev_state
+    
+    if prev_state == "up" and current_state == "down":
+        counter += 1
+        prev_state = "down"
+    elif current_state == "up":
+        prev_state = "up"
+    
+    return counter, prev_state
+
+def count_pullups(landmarks, prev_state, counter, band=0.0):
+    """Алгоритм подсчета подтягиваний; band - полоса гистерезиса вокруг порога"""
+    left_shoulder = landmarks.landmark[mp_pose.PoseLandmark.LEFT_SHOULDER]
+    right_shoulder = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_SHOULDER]
+    left_elbow = landmarks.landmark[mp_pose.PoseLandmark.LEFT_ELBOW]
+    right_elbow = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_ELBOW]
+    
+    shoulder_y = (left_shoulder.y + right_shoulder.y) / 2
+    elbow_y = (left_elbow.y + right_elbow.y) / 2
+    
+    if elbow_y < shoulder_y - band:
+        current_state = "up"
+    elif elbow_y >= shoulder_y + band:
+        current_state = "down"
+    else:
+        current_state = prev_state
+    
+    if prev_state == "down" and current_state == "up":
+        counter += 1
+        prev_state = "up"
+    elif current_state == "down":
+        prev_state = "down"
+    
+    return counter, prev_state
+
+def count_plank(landmarks, duration, frame_duration=1):
+    """Алгоритм подсчета времени планки: кадр с ровным корпусом добавляет frame_duration"""
+    # Проверяем правильность положения тела
+    left_shoulder = landmarks.landmark[mp_pose.PoseLandmark.LEFT_SHOULDER]
+    right_shoulder = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_SHOULDER]
+    left_hip = landmarks.landmark[mp_pose.PoseLandmark.LEFT_HIP]
+    right_hip = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_HIP]
+    
+    # Проверяем, что плечи и бедра находятся примерно на одной линии
+    shoulder_hip_diff = abs((left_shoulder.y + right_shoulder.y)/2 - (left_hip.y + right_hip.y)/2)
+    
+    if shoulder_hip_diff < 0.1:  # Эмпирически подобранное значение
+        return duration + frame_duration
+    return duration
+
+def count_lunges(landmarks, prev_state, counter, band=0.0):
+    """Алгоритм подсчета выпадов; band - полоса гистерезиса вокруг порога"""
+    left_knee = landmarks.landmark[mp_pose.PoseLandmark.LEFT_KNEE]
+    right_knee = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_KNEE]
+    left_ankle = landmarks.landmark[mp_pose.PoseLandmark.LEFT_ANKLE]
+    right_ankle = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_ANKLE]
+    
+    # Определяем, какая нога впереди
+    if left_knee.x < right_knee.x:
+        front_knee = left_knee
+        back_knee = right_knee
+    else:
+        front_knee = right_knee
+        back_knee = left_knee
+    
+    knee_ankle_diff = abs(front_knee.x - (left_ankle.x if front_knee == left_knee else right_ankle.x))
+    
+    if knee_ankle_diff < 0.1 - band:
+        current_state = "down"
+    elif knee_ankle_diff >= 0.1 + band:
+        current_state = "up"
+    else:
+        current_state = prev_state
+    
+    if prev_state == "up" and current_state == "down":
+        counter += 1
+        prev_state = "down"
+    elif current_state == "up":
+        prev_state = "up"
+    
+    return counter, prev_state
+
+EXERCISE_COUNTERS = {
+    "Отжимания": count_pushups,
+    "Приседания": count_squats,
+    "Подтягивания": count_pullups,
+    "Выпады": count_lunges
+}
+
+# Векторные счетчики по массивам landmarks (см. vector_counters.py)
+VECTOR_COUNTERS = {
+    "Отжимания": vector_counters.count_pushups,
+    "Приседания": vector_counters.count_squats,
+    "Подтягивания": vector_counters.count_pullups,
+    "Выпады": vector_counters.count_lunges
+}
+
+COUNTING_ENGINES = ("scalar", "vector")
+
+# Рабочая фаза счетчика (в ней засчитывается повторение) и ее глубина для таблицы повторений
+REP_PHASES = {
+    "Отжимания": (vector_counters.pushups_down, vector_counters.pushups_depth),
+    "Приседания": (vector_counters.squats_down, vector_counters.squats_depth),
+    "Подтягивания": (vector_counters.pullups_up, vector_counters.pullups_depth),
+    "Выпады": (vector_counters.lunges_down, vector_counters.lunges_depth)
+}
+
+def exercise_phase(ex_type: str, landmarks) -> Tuple[bool, float]:
+    """Фаза кадра для счетчика упражнения и расстояние его сигнала до порога"""
+    lm = landmarks.landmark
+    if ex_type in ("Отжимания", "Подтягивания"):
+        shoulder_y = (lm[mp_pose.PoseLandmark.LEFT_SHOULDER].y + lm[mp_pose.PoseLandmark.RIGHT_SHOULDER].y) / 2
+        elbow_y = (lm[mp_pose.PoseLandmark.LEFT_ELBOW].y + lm[mp_pose.PoseLandmark.RIGHT_ELBOW].y) / 2
+        signal = elbow_y - shoulder_y
+    elif ex_type == "Приседания":
+        hip_y = (lm[mp_pose.PoseLandmark.LEFT_HIP].y + lm[mp_pose.PoseLandmark.RIGHT_HIP].y) / 2
+        knee_y = (lm[mp_pose.PoseLandmark.LEFT_KNEE].y + lm[mp_pose.PoseLandmark.RIGHT_KNEE].y) / 2
+        signal = knee_y - hip_y
+    elif ex_type == "Планка":
+        shoulder_y = (lm[mp_pose.PoseLandmark.LEFT_SHOULDER].y + lm[mp_pose.PoseLandmark.RIGHT_SHOULDER].y) / 2
+        hip_y = (lm[mp_pose.PoseLandmark.LEFT_HIP].y + lm[mp_pose.PoseLandmark.RIGHT_HIP].y) / 2
+        signal = 0.1 - abs(shoulder_y - hip_y)
+    else:
+        left_knee = lm[mp_pose.PoseLandmark.LEFT_KNEE]
+        right_knee = lm[mp_pose.PoseLandmark.RIGHT_KNEE]
+        front_knee = left_knee if left_knee.x < right_knee.x else right_knee
+        ankle = lm[mp_pose.PoseLandmark.LEFT_ANKLE if front_knee == left_knee else mp_pose.PoseLandmark.RIGHT_ANKLE]
+        signal = 0.1 - abs(front_knee.x - ankle.x)
+    return signal > 0, abs(signal)
+
+def parse_exercise_ranges(raw) -> List[Tuple[float, float, str]]:
+    """Преобразует exercise_ranges из строки в список кортежей (начало, конец, упражнение)"""
+    try:
+        ranges = ast.literal_eval(raw) if raw else []
+    except (ValueError, SyntaxError):
+        return []
+    parsed = []
+    for item in ranges:
+        try:
+            start, end, ex_type = item
+            parsed.append((float(start), float(end), str(ex_type)))
+        except (TypeError, ValueError):
+            continue
+    return [r for r in parsed if r[2] in EXERCISE_TYPES]
+
+def build_range_segments(exercise_ranges_frames: List[Tuple[int, int, str]],
+                         total_frames: int) -> List[Tuple[int, int, Tuple[str, ...]]]:
+    """Разбивает интервалы (в т.ч. неотсортированные и пересекающиеся) на непересекающиеся отрезки кадров.
+
+    Каждый отрезок - (первый кадр, последний кадр, упражнения, активные на нем).
+    Пересечения одного упражнения объединяются, чтобы время не считалось дважды.
+    """
+    clipped = []
+    for start, end, ex_type in exercise_ranges_frames:
+        start = max(start, 0)
+        if total_frames > 0:
+            end = min(end, total_frames - 1)
+        if start <= end:
+            clipped.append((start, end, ex_type))
+    
+    bounds = sorted({start for start, _, _ in clipped} | {end + 1 for _, end, _ in clipped})
+    segments = []
+    for seg_start, next_start in zip(bounds, bounds[1:]):
+        active = tuple(
+            ex for ex in EXERCISE_TYPES
+            if any(start <= seg_start <= end and ex_type == ex for start, end, ex_type in clipped)
+        )
+        if not active:
+            continue
+        if segments and segments[-1][1] == seg_start - 1 and segments[-1][2] == active:
+            segments[-1] = (segments[-1][0], next_start - 1, active)
+        else:
+            segments.append((seg_start, next_start - 1, active))
+    return segments
+
+def segments_from(segments: List[Tuple[int, int, Tuple[str, ...]]], frame_index: int) -> List[Tuple]:
+    """Части отрезков начиная с кадра frame_index"""
+    return [(max(start, frame_index), end, active) for start, end, active in segments if end >= frame_index]
+
+def segments_before(segments: List[Tuple[int, int, Tuple[str, ...]]], frame_index: int) -> List[Tuple]:
+    """Части отрезков до кадра frame_index (не включая его)"""
+    return [(start, min(end, frame_index - 1), active) for start, end, active in segments if start < frame_index]
+
+def iter_video_frames(cap, segments: List[Tuple[int, int, Tuple[str, ...]]], only_ranges: bool = True,
+                      start_frame: int = 0):
+    """Генератор кадров (номер кадра, кадр, активные упражнения).
+
+    В режиме only_ranges декодируются только кадры внутри отрезков: к далекому отрезку
+    перематываем через CAP_PROP_POS_FRAMES, короткие промежутки пропускаем через grab().
+    Кадры до start_frame не отдаются (продолжение с контрольной точки).
+    """
+    if not only_ranges:
+        frame_index = 0
+        segment_index = 0
+        while cap.isOpened():
+            if frame_index < start_frame:
+                if not cap.grab():
+                    return
+                frame_index += 1
+                continue
+            success, frame = cap.read()
+            if not success:
+                return
+            while segment_index < len(segments) and frame_index > segments[segment_index][1]:
+                segment_index += 1
+            active = ()
+            if segment_index < len(segments) and segments[segment_index][0] <= frame_index:
+                active = segments[segment_index][2]
+            yield frame_index, frame, active
+            frame_index += 1
+        return
+    
+    position = 0
+    for start, end, active in segments_from(segments, start_frame):
+        if start - position > SEEK_THRESHOLD_FRAMES:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+            if position > start:
+                # Контейнер перемотал мимо нужного кадра - начинаем с начала
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                position = 0
+        while position < start:
+            if not cap.grab():
+                return
+            position += 1
+        while position <= end:
+            success, frame = cap.read()
+            if not success:
+                return
+            yield position, frame, active
+            position += 1
+
+def iter_segment_frames(segments: List[Tuple[int, int, Tuple[str, ...]]], only_ranges: bool,
+                        total_frames: int):
+    """Те же номера кадров, что и iter_video_frames, но без декодирования (кадр - None)"""
+    if not only_ranges:
+        segments = fill_segment_gaps(segments, total_frames)
+    for start, end, active in segments:
+        for frame_index in range(start, end + 1):
+            yield frame_index, None, active
+
+def create_exercise_state() -> Tuple[Dict, Dict]:
+    """Начальное состояние счетчиков и статистики упражнений.
+
+    Время ведется по часам видео, а не сервера: elapsed - время внутри интервалов
+    упражнения, duration планки - время только на кадрах с ровным корпусом.
+    В анализе видео единица часов - кадр (целые числа, номер кадра / fps дает
+    секунды), поэтому время не зависит от скорости и способа обработки.
+    """
+    exercise_stats = {ex_type: {"count": 0, "time": 0} for ex_type in EXERCISE_TYPES}
+    exercise_states = {
+        "Отжимания": {"prev_state": "up", "counter": 0, "elapsed": 0},
+        "Приседания": {"prev_state": "up", "counter": 0, "elapsed": 0},
+        "Подтягивания": {"prev_state": "down", "counter": 0, "elapsed": 0},
+        "Планка": {"duration": 0, "elapsed": 0},
+        "Выпады": {"prev_state": "up", "counter": 0, "elapsed": 0}
+    }
+    return exercise_states, exercise_stats
+
+def advance_clock(active: Iterable[str], exercise_states: Dict, frame_duration=1):
+    """Добавляет длительность кадра ко времени активных упражнений"""
+    for ex_type in active:
+        exercise_states[ex_type]["elapsed"] += frame_duration
+
+def clock_stats(exercise_states: Dict, exercise_stats: Dict, ticks_per_second: float) -> Dict:
+    """Переводит время из единиц часов в секунды: для видео ticks_per_second = fps"""
+    for ex_type, state in exercise_states.items():
+        ticks = state["duration"] if ex_type == "Планка" else state["elapsed"]
+        exercise_stats[ex_type]["time"] = ticks / ticks_per_second
+    return exercise_stats
+
+class CounterTuning:
+    """Устойчивый подсчет: сглаживание landmarks, гистерезис и минимальная длительность повторения.
+
+    Фильтр (см. smoothing.py) сглаживает только COUNTER_JOINTS по времени кадра
+    в секундах и начинает заново после паузы длиннее SMOOTHING_MAX_GAP. band -
+    полоса гистерезиса порогов count_*. Повторение, начавшееся раньше чем через
+    min_rep_duration секунд после предыдущего, считается дребезгом фазы;
+    ticks_per_second переводит секунды в единицы часов (fps для видео).
+    Настройки по умолчанию дают в точности исходные счетчики.
+    """
+    
+    def __init__(self, smoothing: str = "none", band: float = 0.0, min_rep_duration: float = 0.0,
+                 ticks_per_second: float = 1.0):
+        self.smoothing = smoothing if smoothing in SMOOTHING_METHODS else "none"
+        self.band = max(0.0, band)
+        self.min_rep_duration = max(0.0, min_rep_duration)
+        self.min_rep_ticks = self.min_rep_duration * ticks_per_second
+        self.filter = create_filter(self.smoothing, SMOOTHING_MIN_CUTOFF, SMOOTHING_BETA, SMOOTHING_TAU)
+        self.last_time = None
+    
+    @property
+    def stateless(self) -> bool:
+        """Счет зависит только от landmarks кадра и фазы: отрезки можно считать параллельно"""
+        return self.filter is None and self.min_rep_ticks == 0
+    
+    @property
+    def default(self) -> bool:
+        return self.stateless and self.band == 0
+    
+    def smooth(self, pose_landmarks, t: float):
+        """Сглаженная копия landmarks кадра в момент t (сек); без фильтра - те же landmarks"""
+        if self.filter is None or not pose_landmarks:
+            return pose_landmarks
+        if self.last_time is not None and t - self.last_time > SMOOTHING_MAX_GAP:
+            self.filter.reset()
+        self.last_time = t
+        joints = np.array([(pose_landmarks.landmark[j].x, pose_landmarks.landmark[j].y) for j in COUNTER_JOINTS])
+        smoothed = landmark_pb2.NormalizedLandmarkList()
+        smoothed.CopyFrom(pose_landmarks)
+        for j, (x, y) in zip(COUNTER_JOINTS, self.filter(joints, t).tolist()):
+            smoothed.landmark[j].x = x
+            smoothed.landmark[j].y = y
+        return smoothed
+    
+    def restart(self):
+        """Фильтр начинает заново (контрольная точка)"""
+        if self.filter is not None:
+            self.filter.reset()
+        self.last_time = None
+    
+    def report(self) -> Dict:
+        return {"smoothing": self.smoothing, "hysteresis": self.band, "min_rep_duration": self.min_rep_duration}
+
+def update_exercise(ex_type: str, landmarks, exercise_states: Dict, exercise_stats: Dict,
+                    frame_duration=1, tuning: Optional[CounterTuning] = None):
+    """Обновляет счетчик упражнения по landmarks одного кадра"""
+    state = exercise_states[ex_type]
+    if ex_type == "Планка":
+        state["duration"] = count_plank(landmarks, state["duration"], frame_duration)
+        return
+    band = tuning.band if tuning is not None else 0.0
+    counter, state["prev_state"] = EXERCISE_COUNTERS[ex_type](
+        landmarks, state["prev_state"], state["counter"], band)
+    if counter > state["counter"] and tuning is not None and tuning.min_rep_ticks:
+        last_rep = state.get("last_rep")
+        if last_rep is not None and state["elapsed"] - last_rep < tuning.min_rep_ticks:
+            # Слишком быстрое повторение - дребезг фазы, не засчитываем
+            counter = state["counter"]
+        else:
+            state["last_rep"] = state["elapsed"]
+    state["counter"] = counter
+    exercise_stats[ex_type]["count"] = state["counter"]
+
+def annotate_frame(image, pose_landmarks, active: Tuple[str, ...]):
+    """Рисует скелет и название текущего упражнения на BGR кадре"""
+    mp_drawing.draw_landmarks(
+        image,
+        pose_landmarks,
+        mp_pose.POSE_CONNECTIONS,
+        landmark_drawing_spec=LANDMARK_DRAWING_SPEC,
+        connection_drawing_spec=CONNECTION_DRAWING_SPEC
+    )
+    
+    display_text = ", ".join(active) if active else "No exercise"
+    cv2.putText(image, f"Exercise: {display_text}", (10, 30),
+          cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+
+def probe_video(input_path: str) -> Dict:
+    """Читает fps, размер кадра и число кадров видео"""
+    cap = cv2.VideoCapture(input_path)
+    info = {
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "total_frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    }
+    cap.release()
+    return info
+
+def range_segments(exercise_ranges: List[Tuple[float, float, str]],
+                   info: Dict) -> List[Tuple[int, int, Tuple[str, ...]]]:
+    """Отрезки кадров для интервалов в секундах (см. build_range_segments)"""
+    exercise_ranges_frames = [
+        (int(start * info["fps"]), int(end * info["fps"]), ex_type)
+        for start, end, ex_type in exercise_ranges
+    ]
+    return build_range_segments(exercise_ranges_frames, info["total_frames"])
+
+def fill_segment_gaps(segments: List[Tuple[int, int, Tuple[str, ...]]],
+                      total_frames: int) -> List[Tuple[int, int, Tuple[str, ...]]]:
+    """Дополняет отрезки кадрами вне интервалов, чтобы покрыть все видео"""
+    filled = []
+    position = 0
+    for start, end, active in segments:
+        if start > position:
+            filled.append((position, start - 1, ()))
+        filled.append((start, end, active))
+        position = end + 1
+    if position < total_frames:
+        filled.append((position, total_frames - 1, ()))
+    return filled
+
+def split_spans(segments: List[Tuple[int, int, Tuple[str, ...]]],
+                chunk_frames: int) -> List[Tuple[int, int, Tuple[str, ...]]]:
+    """Режет длинные отрезки на куски не длиннее chunk_frames кадров"""
+    spans = []
+    for start, end, active in segments:
+        for chunk_start in range(start, end + 1, chunk_frames):
+            spans.append((chunk_start, min(chunk_start + chunk_frames - 1, end), active))
+    return spans
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+landmark_cache = LandmarkCache(LANDMARK_CACHE_DIR, LANDMARK_CACHE_MAX_BYTES)
+checkpoint_store = CheckpointStore(CHECKPOINT_DIR, CHECKPOINT_TTL)
+
+def count_exercises_vectorized(landmarks: np.ndarray, status: np.ndarray,
+                               segments: List[Tuple[int, int, Tuple[str, ...]]], fps: float) -> Dict:
+    """Считает exercise_stats по landmarks всех кадров векторно, без покадрового цикла.
+
+    landmarks - массив кадры×33×4, status - статусы кадров как в кеше landmarks.
+    Повторения и время (в кадрах часов видео) совпадают с покадровым проходом.
+    """
+    exercise_states, exercise_stats = create_exercise_state()
+    for ex_type in EXERCISE_TYPES:
+        ranges = [(start, end) for start, end, active in segments if ex_type in active]
+        if not ranges:
+            continue
+        frames = np.concatenate([np.arange(start, min(end + 1, len(status))) for start, end in ranges])
+        state = exercise_states[ex_type]
+        state["elapsed"] = len(frames)
+        
+        detected = frames[status[frames] == FRAME_POSE]
+        if len(detected) == 0:
+            continue
+        series = landmarks[detected]
+        if ex_type == "Планка":
+            state["duration"] = int(np.count_nonzero(vector_counters.plank_aligned(series)))
+        else:
+            state["counter"], state["prev_state"] = VECTOR_COUNTERS[ex_type](
+                series, state["prev_state"], state["counter"])
+            exercise_stats[ex_type]["count"] = state["counter"]
+    return clock_stats(exercise_states, exercise_stats, fps)
+
+def export_frames(cache_entry: LandmarkCacheEntry, frames: np.ndarray,
+                  inferred_mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """landmarks и статусы кадров frames такими, какими их видели счетчики.
+
+    При адаптивной выборке у пропущенных кадров нет своих landmarks: им, как и
+    в AdaptiveSampler, достаются landmarks следующего кадра с инференсом.
+    inferred_mask - кадры видео, прошедшие через модель в этом анализе: в кеше
+    могут быть и кадры от других анализов, которых счетчики не видели.
+    Возвращает (landmarks, status, inferred).
+    """
+    landmarks = np.asarray(cache_entry.landmarks[frames])
+    status = np.asarray(cache_entry.status[frames])
+    inferred = status != FRAME_MISSING
+    if inferred_mask is not None:
+        inferred &= inferred_mask[frames]
+    positions = np.arange(len(frames))
+    # Для каждой позиции - ближайшая позиция с данными справа (len(frames), если нет)
+    source = np.minimum.accumulate(np.where(inferred, positions, len(frames))[::-1])[::-1]
+    filled = ~inferred & (source < len(frames))
+    landmarks[filled] = landmarks[source[filled]]
+    status[filled] = status[source[filled]]
+    return landmarks, status, inferred
+
+def rep_events_vectorized(landmarks: np.ndarray, status: np.ndarray, frames: np.ndarray,
+                          segments: List[Tuple[int, int, Tuple[str, ...]]], fps: float) -> Dict[str, np.ndarray]:
+    """Таблица повторений по landmarks кадров frames (колонки см. landmark_export.py).
+
+    Повторение - серия кадров в рабочей фазе счетчика, начавшаяся с перехода;
+    их ровно столько, сколько насчитает count_exercises_vectorized. У планки
+    событие - серия кадров с ровным корпусом, ее длительность - время удержания.
+    """
+    exercise_states, _ = create_exercise_state()
+    columns = {column: [] for column in landmark_export.REP_COLUMNS}
+    for ex_index, ex_type in enumerate(EXERCISE_TYPES):
+        ranges = [(start, end) for start, end, active in segments if ex_type in active]
+        if not ranges:
+            continue
+        ex_frames = np.concatenate([np.arange(start, end + 1) for start, end in ranges])
+        rows = np.searchsorted(frames, ex_frames)
+        rows = rows[(rows < len(frames)) & (frames[np.minimum(rows, len(frames) - 1)] == ex_frames)]
+        rows = rows[status[rows] == FRAME_POSE]
+        if len(rows) == 0:
+            continue
+        series = landmarks[rows].astype(np.float32)
+        if ex_type == "Планка":
+            aligned = vector_counters.plank_aligned(series)
+            starts, ends = vector_counters.transition_runs(aligned, False)
+            bottoms = np.full(len(starts), -1)
+            durations = (ends - starts + 1) / fps
+        else:
+            target, depth = REP_PHASES[ex_type]
+            prev_state = exercise_states[ex_type]["prev_state"]
+            starts, ends = vector_counters.transition_runs(
+                target(series), prev_state == ("up" if ex_type == "Подтягивания" else "down"))
+            phase_depth = depth(series)
+            bottoms = np.array([frames[rows[start + np.argmax(phase_depth[start:end + 1])]]
+                                for start, end in zip(starts, ends)], dtype=np.int64)
+            durations = (frames[rows[ends]] - frames[rows[starts]] + 1) / fps
+        columns["rep_exercise"].append(np.full(len(starts), ex_index))
+        columns["rep_start_frame"].append(frames[rows[starts]])
+        columns["rep_end_frame"].append(frames[rows[ends]])
+        columns["rep_bottom_frame"].append(bottoms)
+        columns["rep_duration"].append(durations)
+    return rep_table(columns)
+
+def rep_table(columns: Dict[str, List]) -> Dict[str, np.ndarray]:
+    """Колонки таблицы повторений из списков кусков в массивы нужных типов"""
+    dtypes = {"rep_exercise": np.uint8, "rep_start_frame": np.int32, "rep_end_frame": np.int32,
+              "rep_bottom_frame": np.int32, "rep_duration": np.float32}
+    return {
+        column: np.concatenate(values).astype(dtypes[column]) if values else np.empty(0, dtype=dtypes[column])
+        for column, values in columns.items()
+    }
+
+# Состояние счетчика в рабочей фазе (см. REP_PHASES)
+WORKING_STATES = {"Отжимания": "down", "Приседания": "down", "Подтягивания": "up", "Выпады": "down"}
+
+def replay_counters(landmarks: np.ndarray, status: np.ndarray, frames: np.ndarray,
+                    segments: List[Tuple[int, int, Tuple[str, ...]]], fps: float,
+                    tuning: CounterTuning, restart_every: int = 0) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """exercise_stats и таблица повторений покадровым подсчетом с настройками tuning.
+
+    Векторные пороги не знают сглаживания, гистерезиса и минимальной длительности,
+    поэтому кадры заново проходят через update_exercise, как при анализе, и
+    повторений столько же, сколько в exercise_stats. restart_every - период
+    контрольных точек, на которых фильтр при анализе начинал заново.
+    """
+    tuning = CounterTuning(tuning.smoothing, tuning.band, tuning.min_rep_duration, fps)
+    exercise_states, exercise_stats = create_exercise_state()
+    starts = np.array([start for start, _, _ in segments], dtype=np.int64)
+    ends = np.array([end for _, end, _ in segments], dtype=np.int64)
+    # Открытая серия упражнения: [первый кадр, последний кадр, нижний кадр, глубина, кадров с позой]
+    runs = {ex_type: [] for ex_type in EXERCISE_TYPES}
+    open_runs = {}
+    next_restart = restart_every
+    for row, frame_index in enumerate(frames.tolist()):
+        if restart_every and frame_index >= next_restart:
+            tuning.restart()
+            next_restart = (frame_index // restart_every + 1) * restart_every
+        segment = int(np.searchsorted(starts, frame_index, side="right")) - 1
+        active = segments[segment][2] if segment >= 0 and frame_index <= ends[segment] else ()
+        advance_clock(active, exercise_states)
+        if status[row] != FRAME_POSE:
+            continue
+        counted = tuning.smooth(landmarks_from_array(landmarks[row]), frame_index / fps if fps else frame_index)
+        series = landmarks_to_array(counted)[None] if active else None
+        for ex_type in active:
+            state = exercise_states[ex_type]
+            before = state["duration"] if ex_type == "Планка" else state["counter"]
+            update_exercise(ex_type, counted, exercise_states, exercise_stats, tuning=tuning)
+            run = open_runs.get(ex_type)
+            if ex_type == "Планка":
+                if state["duration"] == before:
+                    open_runs.pop(ex_type, None)
+                elif run is not None:
+                    run[1] = frame_index
+                    run[4] += 1
+                else:
+                    open_runs[ex_type] = [frame_index, frame_index, -1, 0.0, 1]
+                    runs[ex_type].append(open_runs[ex_type])
+                continue
+            depth = float(REP_PHASES[ex_type][1](series)[0])
+            if state["counter"] > before:
+                open_runs[ex_type] = [frame_index, frame_index, frame_index, depth, 1]
+                runs[ex_type].append(open_runs[ex_type])
+            elif run is not None and state["prev_state"] == WORKING_STATES[ex_type]:
+                run[1] = frame_index
+                run[4] += 1
+                if depth > run[3]:
+                    run[2], run[3] = frame_index, depth
+            else:
+                open_runs.pop(ex_type, None)
+
+    columns = {column: [] for column in landmark_export.REP_COLUMNS}
+    for ex_index, ex_type in enumerate(EXERCISE_TYPES):
+        if not runs[ex_type]:
+            continue
+        first, last, bottom, _, pose_frames = np.array(runs[ex_type], dtype=np.float64).T
+        columns["rep_exercise"].append(np.full(len(first), ex_index))
+        columns["rep_start_frame"].append(first)
+        columns["rep_end_frame"].append(last)
+        columns["rep_bottom_frame"].append(bottom)
+        # Как в rep_events_vectorized: у планки - время с ровным корпусом, у повторения - от первого кадра до последнего
+        columns["rep_duration"].append((pose_frames if ex_type == "Планка" else last - first + 1) / fps)
+    return clock_stats(exercise_states, exercise_stats, fps), rep_table(columns)
+
+def write_analysis_export(path: str, landmark_dtype: str, cache_entry: Optional[LandmarkCacheEntry],
+                          segments: List[Tuple[int, int, Tuple[str, ...]]], info: Dict,
+                          only_ranges: bool, model_complexity: int, tuning: Optional[CounterTuning] = None,
+                          restart_every: int = 0, inferred_mask: Optional[np.ndarray] = None) -> bool:
+    """Пишет экспорт landmarks обработанных кадров и таблицу повторений; False, если данных нет.
+
+    tuning и restart_every - настройки подсчета анализа (см. replay_counters),
+    inferred_mask - кадры с инференсом при адаптивной выборке (см. export_frames).
+    """
+    if cache_entry is None:
+        return False
+    if only_ranges:
+        frames = np.concatenate([np.arange(start, end + 1) for start, end, _ in segments]) if segments \
+            else np.empty(0, dtype=np.int64)
+    else:
+        frames = np.arange(info["total_frames"])
+    frames = frames[frames < len(cache_entry)]
+    landmarks, status, inferred = export_frames(cache_entry, frames, inferred_mask)
+    arrays = {
+        "frame": frames.astype(np.int32),
+        "landmarks": landmarks.astype(landmark_export.LANDMARK_DTYPES[landmark_dtype]),
+        "status": status,
+        "inferred": inferred,
+        "exercises": np.array(EXERCISE_TYPES)
+    }
+    # Повторения - по landmarks в полной точности, как их видели счетчики
+    if tuning is None or tuning.default:
+        arrays.update(rep_events_vectorized(landmarks, status, frames, segments, info["fps"]))
+    else:
+        arrays.update(replay_counters(landmarks, status, frames, segments, info["fps"], tuning, restart_every)[1])
+    meta = {
+        "fps": info["fps"],
+        "width": info["width"],
+        "height": info["height"],
+        "total_frames": info["total_frames"],
+        "model_complexity": model_complexity,
+        "landmarks_dtype": landmark_dtype,
+        "counting": tuning.report() if tuning is not None else CounterTuning().report(),
+        "segments": [[start, end, list(active)] for start, end, active in segments]
+    }
+    landmark_export.write_export(path, arrays, meta)
+    return True
+
+# Пул на процесс: в основном процессе прогревается при старте API,
+# в процессах параллельного анализа заполняется по мере надобности
+pose_pool = PosePool(parse_pool_sizes(POSE_POOL_SIZES))
+
+class InferenceInput:
+    """Готовит кадр для модели: уменьшение до max_side и вырез по человеку.
+
+    При crop=True кадр обрезается по рамке landmarks предыдущего кадра с запасом
+    CROP_PADDING; если человек потерян, модель снова получает весь кадр.
+    Landmarks переводятся обратно в нормированные координаты полного кадра,
+    поэтому счетчики и отрисовка работают как при полном разрешении.
+    """
+    
+    def __init__(self, max_side: int = 0, crop: bool = False, padding: float = CROP_PADDING):
+        self.max_side = max_side
+        self.crop = crop
+        self.padding = padding
+        self.roi = None
+    
+    def prepare(self, frame: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int, int, int]]:
+        """RGB изображение для модели и его рамка (x0, y0, x1, y1) в пикселях кадра"""
+        height, width = frame.shape[:2]
+        box = self.roi if self.crop and self.roi else (0, 0, width, height)
+        x0, y0, x1, y1 = box
+        image = frame[y0:y1, x0:x1]
+        if self.max_side and max(x1 - x0, y1 - y0) > self.max_side:
+            scale = self.max_side / max(x1 - x0, y1 - y0)
+            size = (max(1, round((x1 - x0) * scale)), max(1, round((y1 - y0) * scale)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB), box
+    
+    def process(self, pose, frame: np.ndarray, prepared=None):
+        """landmarks кадра в координатах полного кадра"""
+        height, width = frame.shape[:2]
+        image, box = prepared or self.prepare(frame)
+        pose_landmarks = pose.process(image).pose_landmarks
+        if pose_landmarks and box != (0, 0, width, height):
+            pose_landmarks = remap_landmarks(pose_landmarks, box, width, height)
+        if self.crop:
+            self.roi = landmarks_box(pose_landmarks, width, height, self.padding)
+        return pose_landmarks
+    
+    def reset(self):
+        """Забывает вырез по предыдущему кадру"""
+        self.roi = None
+    
+    def cache_variant(self) -> str:
+        """Суффикс ключа кеша: landmarks зависят от разрешения и выреза"""
+        variant = f"s{self.max_side}" if self.max_side else ""
+        return variant + ("c" if self.crop else "")
+
+def remap_landmarks(pose_landmarks, box: Tuple[int, int, int, int], width: int, height: int):
+    """Переводит landmarks из координат рамки в нормированные координаты полного кадра"""
+    x0, y0, x1, y1 = box
+    box_width, box_height = x1 - x0, y1 - y0
+    remapped = landmark_pb2.NormalizedLandmarkList()
+    for lm in pose_landmarks.landmark:
+        remapped.landmark.add(
+            x=(lm.x * box_width + x0) / width,
+            y=(lm.y * box_height + y0) / height,
+            # z в MediaPipe масштабируется как x
+            z=lm.z * box_width / width,
+            visibility=lm.visibility)
+    return remapped
+
+def landmarks_box(pose_landmarks, width: int, height: int,
+                  padding: float) -> Optional[Tuple[int, int, int, int]]:
+    """Рамка вокруг видимых landmarks с запасом padding или None, если человека нет"""
+    if not pose_landmarks:
+        return None
+    points = [(lm.x, lm.y) for lm in pose_landmarks.landmark if lm.visibility >= CROP_MIN_VISIBILITY]
+    if len(points) < 4:
+        points = [(lm.x, lm.y) for lm in pose_landmarks.landmark]
+    xs = [min(max(x, 0.0), 1.0) * width for x, _ in points]
+    ys = [min(max(y, 0.0), 1.0) * height for _, y in points]
+    pad_x = (max(xs) - min(xs)) * padding
+    pad_y = (max(ys) - min(ys)) * padding
+    x0, x1 = int(max(min(xs) - pad_x, 0)), int(min(max(xs) + pad_x, width))
+    y0, y1 = int(max(min(ys) - pad_y, 0)), int(min(max(ys) + pad_y, height))
+    if x1 - x0 < 16 or y1 - y0 < 16:
+        return None
+    return x0, y0, x1, y1
+
+class AdaptiveSampler:
+    """Адаптивная выборка кадров для модели.
+
+    Пока сигналы счетчиков активных упражнений далеко от порога, модель запускается
+    на каждом stride-м кадре; у порога и на краях интервалов (edges) - на каждом.
+    Если фаза какого-то счетчика (или наличие человека) между двумя кадрами
+    с инференсом изменилась, трекинг модели начинается заново (reset), и
+    пропущенные кадры вместе с этим кадром проходят через модель по порядку
+    времени. Иначе пропущенные кадры получают landmarks следующего кадра
+    с инференсом. Результат - приближение полного прохода: трекинг модели
+    видит не все кадры, и после перезапуска landmarks могут немного отличаться.
+    """
+    
+    def __init__(self, stride: int = SAMPLING_STRIDE, margin: float = SAMPLING_MARGIN,
+                 edges: Iterable[int] = (), reset: Optional[Callable] = None):
+        self.stride = max(1, stride)
+        self.margin = margin
+        self.edges = set(edges)
+        self.reset = reset
+        self.pending = []
+        self.last_key = None
+        self.dense = True
+        self.frames = 0
+        self.inferred_frames = 0
+    
+    def _infer(self, item, infer: Callable):
+        self.inferred_frames += 1
+        return infer(item)
+    
+    def step(self, frame_index: int, active: Tuple[str, ...], item, infer: Callable) -> List[Tuple]:
+        """Принимает кадр; возвращает по порядку (кадр, landmarks) для всех кадров, чья судьба решена"""
+        self.frames += 1
+        if not self.dense and frame_index not in self.edges and len(self.pending) + 1 < self.stride:
+            self.pending.append(item)
+            return []
+        
+        pose_landmarks = self._infer(item, infer)
+        key, phases = self._key(active, pose_landmarks)
+        if self.pending and key != self.last_key:
+            # Модель уже видела более поздний кадр: трекинг начинается заново, чтобы
+            # пропущенные кадры и этот кадр прошли через нее в порядке времени
+            if self.reset is not None:
+                self.reset()
+            resolved = [(pending, self._infer(pending, infer)) for pending in self.pending]
+            # Повторный инференс того же кадра не считается: inferred_frames - число кадров
+            # с landmarks в кеше, по нему проверяется продолжение с контрольной точки
+            pose_landmarks = infer(item)
+            key, phases = self._key(active, pose_landmarks)
+        else:
+            resolved = [(pending, pose_landmarks) for pending in self.pending]
+        resolved.append((item, pose_landmarks))
+        self.pending = []
+        self.last_key = key
+        self.dense = any(distance < self.margin for _, distance in phases)
+        return resolved
+    
+    @staticmethod
+    def _key(active: Tuple[str, ...], pose_landmarks) -> Tuple[Tuple, List[Tuple[bool, float]]]:
+        """Ключ кадра (упражнения, найден ли человек, фазы счетчиков) и фазы с расстоянием до порога"""
+        phases = [exercise_phase(ex_type, pose_landmarks) for ex_type in active] if pose_landmarks else []
+        return (active, pose_landmarks is not None, tuple(phase for phase, _ in phases)), phases
+    
+    def flush(self, infer: Callable) -> List[Tuple]:
+        """Оставшиеся пропущенные кадры (если видео кончилось раньше края интервала)"""
+        resolved = [(pending, self._infer(pending, infer)) for pending in self.pending]
+        self.pending = []
+        return resolved
+    
+    def restart(self):
+        """Выборка начинает заново с плотного режима; счетчики кадров сохраняются"""
+        self.pending = []
+        self.last_key = None
+        self.dense = True
+    
+    def report(self) -> Dict:
+        return {
+            "mode": "adaptive",
+            "stride": self.stride,
+            "frames": self.frames,
+            "inferred_frames": self.inferred_frames,
+            "inferred_fraction": round(self.inferred_frames / self.frames, 4) if self.frames else 0.0
+        }
+
+def sampling_edges(segments: List[Tuple[int, int, Tuple[str, ...]]], total_frames: int) -> set:
+    """Кадры, на которых модель запускается всегда: края отрезков и последний кадр видео"""
+    edges = {total_frames - 1}
+    for start, end, _ in segments:
+        edges.update((start - 1, start, end))
+    return edges
+
+class AutoSegmentation:
+    """Автоматическая разметка: ExerciseSegmenter по landmarks кадров прохода (см. analyze_video_auto)"""
+
+    def __init__(self, info: Dict):
+        self.info = info
+        fps = info["fps"]
+        aspect = info["width"] / info["height"] if info["height"] else 1.0
+        self.segmenter = ExerciseSegmenter(max(1, round(SEGMENT_WINDOW * fps)),
+                                           max(1, round(SEGMENT_MIN_DURATION * fps)), aspect)
+
+    def observe(self, frame_index: int, pose_landmarks) -> Tuple[str, ...]:
+        """Следующий кадр прохода; возвращает текущую метку для надписи на видео"""
+        label = self.segmenter.update(frame_index, landmarks_to_array(pose_landmarks) if pose_landmarks else None)
+        return () if label == REST else (label,)
+
+    def finish(self) -> Tuple[List[Dict], List[Tuple[int, int, Tuple[str, ...]]]]:
+        """Отрезки в секундах с уверенностью и те же отрезки в кадрах.
+
+        Кадры берутся из округленных секунд, как при ручной разметке: принятая без
+        правок разметка дает тот же счет, что и автоматический проход.
+        """
+        fps = self.info["fps"]
+        suggested = [{"start": round(first / fps, 2), "end": round(last / fps, 2), "exercise": ex_type,
+                      "confidence": round(float(confidence), 3)}
+                     for first, last, ex_type, confidence in self.segmenter.finish()]
+        segments = range_segments([(r["start"], r["end"], r["exercise"]) for r in suggested], self.info)
+        return suggested, segments
+
+def analyze_video(input_path: str, output_path: str, exercise_ranges: List[Tuple[float, float, str]],
+                  model_complexity: int = 1, only_ranges: bool = True, workers: int = 1,
+                  use_cache: bool = True, video_hash: Optional[str] = None,
+                  counting_engine: str = "scalar", render: bool = True,
+                  inference_max_side: int = 0, inference_crop: bool = False,
+                  sampling: str = "full", sample_stride: int = SAMPLING_STRIDE,
+                  export: str = "none", export_path: Optional[str] = None,
+                  smoothing: str = "none", hysteresis: float = 0.0, min_rep_duration: float = 0.0,
+                  checkpoints: bool = False, people: int = 0,
+                  cache_entry: Optional[LandmarkCacheEntry] = None,
+                  label_frame: Optional[Callable[[int, object], Tuple[str, ...]]] = None,
+                  progress: Optional[Callable[[int, int], None]] = None,
+                  recorder: Optional[StageRecorder] = None) -> Dict:
+    """Анализирует видео и пишет размеченное видео в output_path.
+
+    В режиме only_ranges модель запускается только на кадрах внутри exercise_ranges,
+    и в выходное видео попадают только эти кадры. label_frame(кадр, landmarks)
+    дает надпись кадра на видео вместо упражнений разметки (см. analyze_video_auto).
+    cache_entry - уже открытая запись кеша: вызывающий читает ее после прохода,
+    даже если за это время запись вытеснят из кеша.
+    """
+    if recorder is None:
+        recorder = StageRecorder()
+    if people > 0:
+        return analyze_video_people(input_path, output_path, exercise_ranges, model_complexity,
+                                    only_ranges, render, people, smoothing, hysteresis, min_rep_duration,
+                                    progress, recorder)
+    info = probe_video(input_path)
+    fps = info["fps"]
+    segments = range_segments(exercise_ranges, info)
+    tuning = CounterTuning(smoothing, hysteresis, min_rep_duration, fps)
+    
+    inference_input = InferenceInput(inference_max_side, inference_crop)
+    cache_hit = False
+    exporting = export != "none" and export_path is not None
+    # Контрольные точки хранят landmarks в кеше, поэтому он нужен и при use_cache=False
+    if use_cache or exporting or checkpoints or cache_entry is not None:
+        video_hash = video_hash or file_sha256(input_path)
+        if cache_entry is None:
+            cache_entry = landmark_cache.open(video_hash, model_complexity,
+                                              info["total_frames"], inference_input.cache_variant())
+        if cache_entry is not None and use_cache:
+            needed = segments if only_ranges else [(0, info["total_frames"] - 1, ())]
+            cache_hit = cache_entry.covers(needed)
+            landmark_cache.record(cache_hit)
+    adaptive = sampling == "adaptive" and not cache_hit
+    # Векторный подсчет идет по landmarks из кеша, без кеша - обычные счетчики.
+    # При адаптивной выборке в кеш попадают не все кадры, поэтому счетчики покадровые.
+    # Векторные счетчики знают только исходные пороги
+    vectorized = counting_engine == "vector" and cache_entry is not None and not adaptive and tuning.default
+    checkpointing = checkpoints and cache_entry is not None and not cache_hit
+    # Все, от чего зависит результат: точка от других параметров не подходит
+    checkpoint_key = {
+        "video": video_hash, "model_complexity": model_complexity,
+        "inference": inference_input.cache_variant(), "segments": segments, "only_ranges": only_ranges,
+        "counting_engine": counting_engine, "sampling": sampling, "sample_stride": sample_stride,
+        "counting": tuning.report(), "interval": CHECKPOINT_FRAMES
+    }
+    
+    if workers > 1 and not cache_hit and not adaptive and tuning.stateless:
+        spans_segments = segments if only_ranges else fill_segment_gaps(segments, info["total_frames"])
+        spans = split_spans(spans_segments, CHUNK_FRAMES)
+        if len(spans) > 1:
+            checkpoint = checkpoint_store.open(dict(checkpoint_key, mode="parallel", spans=spans,
+                                                    overlap=CHUNK_OVERLAP_FRAMES)) if checkpointing else None
+            with checkpoint or contextlib.nullcontext():
+                result = analyze_video_parallel(input_path, output_path, spans, info, model_complexity,
+                                                only_ranges, workers, cache_entry, render,
+                                                inference_max_side, inference_crop, tuning.band,
+                                                checkpoint, progress, recorder)
+            result['cache_hit'] = False
+            result['counting'] = tuning.report()
+            result['sampling'] = full_sampling_report(result['processed_frames'], result['processed_frames'])
+            if vectorized:
+                with recorder.time("counting"):
+                    result['exercise_stats'] = filter_exercise_stats(count_exercises_vectorized(
+                        cache_entry.landmarks, cache_entry.status, segments, fps))
+            result['exported'] = False
+            if exporting:
+                with recorder.time("export"):
+                    result['exported'] = write_analysis_export(
+                        export_path, export, cache_entry, segments, info, only_ranges, model_complexity, tuning)
+            if checkpoint is not None:
+                checkpoint.discard()
+            return result
+    
+    total_frames = info["total_frames"]
+    if only_ranges:
+        total_frames = sum(end - start + 1 for start, end, _ in segments)
+    processed_frames = 0
+    inferred_frames = 0
+    counted_frames = 0
+    
+    exercise_states, exercise_stats = create_exercise_state()
+    
+    checkpoint = checkpoint_store.open(dict(checkpoint_key, mode="sequential")) if checkpointing else None
+    resume = checkpoint.load() if checkpoint is not None else None
+    needed = segments if only_ranges else [(0, info["total_frames"] - 1, ())]
+    # Кадры с инференсом в этом анализе: при адаптивной выборке экспорт берет только их
+    inferred_mask = np.zeros(info["total_frames"], dtype=bool) if adaptive else None
+    if resume is not None and adaptive:
+        try:
+            inferred_mask[:] = np.load(os.path.join(checkpoint.directory("sampling"), "inferred.npy"))
+        except (OSError, ValueError):
+            resume = None
+    if resume is not None:
+        prefix = segments_before(needed, resume["frame_index"])
+        if not (cache_entry.covers_sampled(prefix, inferred_mask, resume["sampled_frames"][1]) if adaptive
+                else cache_entry.covers(prefix)):
+            # Landmarks до точки вытеснены из кеша - анализ заново
+            resume = None
+    # Пропущенный выборкой кадр до точки берет landmarks ближайшего следующего
+    # кадра с инференсом этого анализа (по inferred_mask, а не по всему кешу)
+    next_inferred = None
+    if resume is not None and adaptive:
+        positions = np.arange(len(inferred_mask))
+        next_inferred = np.minimum.accumulate(
+            np.where(inferred_mask, positions, len(inferred_mask) - 1)[::-1])[::-1]
+    resume_from = 0
+    if resume is not None:
+        resume_from = resume["frame_index"]
+        counted_frames = resume["processed_frames"]
+        inferred_frames = resume["inferred_frames"]
+        exercise_states, exercise_stats = resume["exercise_states"], resume["exercise_stats"]
+        if not render:
+            # Кадры до точки не нужны ни модели, ни видео
+            processed_frames = counted_frames
+    next_checkpoint = (resume_from // CHECKPOINT_FRAMES + 1) * CHECKPOINT_FRAMES
+    
+    # Без отрисовки и при попадании в кеш видео не декодируется
+    decode = render or not cache_hit
+    cap = cv2.VideoCapture(input_path) if decode else None
+    out = None
+    if render:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        out = cv2.VideoWriter(output_path, fourcc, fps, (info["width"], info["height"]))
+    if decode:
+        frames = iter_video_frames(cap, segments, only_ranges, 0 if render else resume_from)
+    elif vectorized:
+        # Все посчитает count_exercises_vectorized, покадровый цикл не нужен
+        frames = iter(())
+        processed_frames = total_frames
+    else:
+        frames = iter_segment_frames(segments, only_ranges, info["total_frames"])
+    
+    # При попадании в кеш модель не нужна: landmarks читаются из кеша. Модель берется
+    # без checkout(): restart_tracking может ее пересоздать, и в пул вернется новая
+    pose = None if cache_hit else pose_pool.acquire(model_complexity)
+    # Внутри полосы гистерезиса фаза может смениться, поэтому запас у порога шире на полосу
+    sampler = AdaptiveSampler(sample_stride, SAMPLING_MARGIN + tuning.band,
+                              edges=sampling_edges(segments, info["total_frames"]),
+                              reset=lambda: restart_tracking()) if adaptive else None
+    if sampler is not None and resume is not None:
+        sampler.frames, sampler.inferred_frames = resume["sampled_frames"]
+    
+    def decode_frames():
+        """Стадия декодирования: кадр для модели готовится здесь же, если не нужен вырез по человеку"""
+        clock = time.perf_counter
+        started = clock()
+        for frame_index, frame, active in frames:
+            prepared = None
+            if frame is not None:
+                recorder.observe("decode", clock() - started)
+                if not cache_hit and not inference_input.crop and frame_index >= resume_from:
+                    started = clock()
+                    prepared = inference_input.prepare(frame)
+                    recorder.observe("preprocess", clock() - started)
+            yield frame_index, frame, prepared, active
+            started = clock()
+    
+    def restart_tracking():
+        """Трекинг модели и вырез по человеку начинают заново со следующего кадра"""
+        nonlocal pose
+        if pose is not None:
+            pose = pose_pool.reset(pose, model_complexity)
+        inference_input.reset()
+    
+    def infer_landmarks(item):
+        """landmarks кадра из кеша или от модели"""
+        nonlocal inferred_frames
+        frame_index, frame, prepared, _ = item
+        started = time.perf_counter()
+        if cache_hit:
+            pose_landmarks = cache_entry.get(frame_index)
+            recorder.observe("cache_read", time.perf_counter() - started)
+        else:
+            pose_landmarks = inference_input.process(pose, frame, prepared)
+            recorder.observe("inference", time.perf_counter() - started)
+            inferred_frames += 1
+            if cache_entry is not None:
+                cache_entry.put(frame_index, pose_landmarks)
+            if inferred_mask is not None and frame_index < len(inferred_mask):
+                inferred_mask[frame_index] = True
+        recorder.frame(pose_landmarks is not None)
+        return pose_landmarks
+    
+    def count_frame(item, pose_landmarks):
+        """Часы и счетчики по landmarks кадра"""
+        nonlocal counted_frames
+        frame_index, frame, prepared, active = item
+        counted_frames += 1
+        advance_clock(active, exercise_states)
+        if pose_landmarks and not vectorized:
+            started = time.perf_counter()
+            # Счетчики видят сглаженные landmarks, на видео рисуются исходные
+            counted = tuning.smooth(pose_landmarks, frame_index / fps if fps else frame_index)
+            for ex_type in active:
+                update_exercise(ex_type, counted, exercise_states, exercise_stats, tuning=tuning)
+            recorder.observe("counting", time.perf_counter() - started)
+        if label_frame is not None:
+            started = time.perf_counter()
+            active = label_frame(frame_index, pose_landmarks)
+            recorder.observe("segmentation", time.perf_counter() - started)
+        return frame, pose_landmarks, active
+    
+    def checkpoint_boundary(frame_index: int) -> List[Tuple]:
+        """Контрольная точка перед кадром frame_index.
+
+        Все кадры до него досчитываются, состояние сохраняется, а трекинг модели,
+        выборка и сглаживание начинают заново - так же, как в продолжении с этой
+        точки, поэтому результат не зависит от того, был ли перерыв.
+        """
+        nonlocal next_checkpoint
+        resolved = []
+        if sampler is not None:
+            resolved = [count_frame(pending, pose_landmarks)
+                        for pending, pose_landmarks in sampler.flush(infer_landmarks)]
+            sampler.restart()
+        if counted_frames:
+            started = time.perf_counter()
+            cache_entry.flush()
+            if inferred_mask is not None:
+                np.save(os.path.join(checkpoint.directory("sampling"), "inferred.npy"), inferred_mask)
+            checkpoint.save({
+                "frame_index": frame_index,
+                "segment_index": sum(1 for start, _, _ in segments if start <= frame_index) - 1,
+                "processed_frames": counted_frames,
+                "inferred_frames": inferred_frames,
+                "sampled_frames": [sampler.frames, sampler.inferred_frames] if sampler is not None else None,
+                "exercise_states": exercise_states,
+                "exercise_stats": exercise_stats
+            })
+            recorder.observe("checkpoint", time.perf_counter() - started)
+        restart_tracking()
+        tuning.restart()
+        next_checkpoint = (frame_index // CHECKPOINT_FRAMES + 1) * CHECKPOINT_FRAMES
+        return resolved
+    
+    def infer(item):
+        """Стадия инференса: кадры, чья судьба решена, с landmarks и обновленными счетчиками"""
+        frame_index = item[0]
+        if frame_index < resume_from:
+            # Кадр до контрольной точки уже посчитан: landmarks для разметки из кеша,
+            # у пропущенного выборкой кадра - как при счете, от следующего кадра с инференсом
+            cached = int(next_inferred[frame_index]) if next_inferred is not None else frame_index
+            return [(item[1], cache_entry.get(cached), item[3])]
+        resolved = []
+        if checkpoint is not None and frame_index >= next_checkpoint:
+            resolved = checkpoint_boundary(frame_index)
+        if sampler is None:
+            return resolved + [count_frame(item, infer_landmarks(item))]
+        return resolved + [count_frame(pending, pose_landmarks)
+                           for pending, pose_landmarks in sampler.step(frame_index, item[3], item, infer_landmarks)]
+    
+    def encode(items):
+        """Стадия разметки и кодирования кадров"""
+        nonlocal processed_frames
+        for frame, pose_landmarks, active in items:
+            if render:
+                started = time.perf_counter()
+                if pose_landmarks:
+                    annotate_frame(frame, pose_landmarks, active)
+                drawn = time.perf_counter()
+                out.write(frame)
+                recorder.observe("drawing", drawn - started)
+                recorder.observe("encode", time.perf_counter() - drawn)
+            processed_frames += 1
+            if progress:
+                progress(processed_frames, total_frames)
+    
+    try:
+        with checkpoint or contextlib.nullcontext():
+            if progress:
+                progress(0, total_frames)
+            pipeline_report = FramePipeline(PIPELINE_QUEUE_SIZE).run(decode_frames(), infer, encode)
+            if sampler is not None:
+                encode([count_frame(item, pose_landmarks)
+                        for item, pose_landmarks in sampler.flush(infer_landmarks)])
+    finally:
+        if pose is not None:
+            pose_pool.release(pose, model_complexity)
+    
+    if cap is not None:
+        cap.release()
+    if out is not None:
+        out.release()
+    if cache_entry is not None:
+        cache_entry.flush()
+    if vectorized:
+        with recorder.time("counting"):
+            exercise_stats = count_exercises_vectorized(
+                cache_entry.landmarks, cache_entry.status, segments, fps)
+    else:
+        exercise_stats = clock_stats(exercise_states, exercise_stats, fps)
+    exported = False
+    if exporting:
+        with recorder.time("export"):
+            exported = write_analysis_export(
+                export_path, export, cache_entry, segments, info, only_ranges, model_complexity, tuning,
+                CHECKPOINT_FRAMES if checkpoint is not None else 0, inferred_mask)
+    checkpoint_report = None
+    if checkpoint is not None:
+        checkpoint_report = {"resumed_from_frame": resume_from if resume is not None else None,
+                             "saved": checkpoint.saves}
+        checkpoint.discard()
+    
+    return {
+        'exercise_stats': filter_exercise_stats(exercise_stats),
+        'processed_frames': processed_frames,
+        'total_frames': total_frames,
+        'cache_hit': cache_hit,
+        'rendered': render,
+        'exported': exported,
+        'counting': tuning.report(),
+        'checkpoint': checkpoint_report,
+        'people': None,
+        'exercise_ranges': None,
+        'pipeline_report': pipeline_report,
+        'sampling': sampler.report() if sampler is not None else full_sampling_report(processed_frames, inferred_frames)
+    }
+
+def analyze_video_auto(input_path: str, output_path: str, model_complexity: int = 1,
+                       video_hash: Optional[str] = None, render: bool = True,
+                       inference_max_side: int = 0, inference_crop: bool = False,
+                       export: str = "none", export_path: Optional[str] = None,
+                       smoothing: str = "none", hysteresis: float = 0.0, min_rep_duration: float = 0.0,
+                       progress: Optional[Callable[[int, int], None]] = None,
+                       recorder: Optional[StageRecorder] = None) -> Dict:
+    """Размечает упражнения автоматически и считает их в найденных отрезках.
+
+    Видео проходит через модель один раз (analyze_video по всем кадрам),
+    счетчики затем идут по landmarks этого прохода из той же записи кеша.
+    Запись открыта на все время анализа: memmap-массивы остаются доступны, даже
+    если кеш вытеснит ее папку. Счет идет по всем кадрам, как при only_ranges=False.
+    """
+    if recorder is None:
+        recorder = StageRecorder()
+    info = probe_video(input_path)
+    fps = info["fps"]
+    video_hash = video_hash or file_sha256(input_path)
+    auto = AutoSegmentation(info)
+    cache_entry = landmark_cache.open(video_hash, model_complexity, info["total_frames"],
+                                      InferenceInput(inference_max_side, inference_crop).cache_variant())
+    if cache_entry is None:
+        raise RuntimeError("Видео без кадров: автоматическая разметка невозможна")
+    result = analyze_video(input_path, output_path, [], model_complexity, only_ranges=False,
+                           use_cache=True, video_hash=video_hash, render=render,
+                           inference_max_side=inference_max_side, inference_crop=inference_crop,
+                           cache_entry=cache_entry, label_frame=auto.observe,
+                           progress=progress, recorder=recorder)
+    suggested_ranges, segments = auto.finish()
+    # Без landmarks кадра счетчики молча насчитали бы меньше повторений.
+    # Проверяются кадры, которые прошел проход: счетчик кадров контейнера бывает завышен
+    passed = result["processed_frames"]
+    if passed > 0 and not cache_entry.covers([(0, passed - 1, ())]):
+        raise RuntimeError("Не все кадры прохода попали в кеш landmarks")
+    tuning = CounterTuning(smoothing, hysteresis, min_rep_duration, fps)
+    with recorder.time("counting"):
+        if tuning.default:
+            exercise_stats = count_exercises_vectorized(cache_entry.landmarks, cache_entry.status, segments, fps)
+        else:
+            frames = np.arange(min(info["total_frames"], len(cache_entry)))
+            exercise_stats, _ = replay_counters(np.asarray(cache_entry.landmarks[frames]),
+                                                np.asarray(cache_entry.status[frames]),
+                                                frames, segments, fps, tuning)
+    exported = False
+    if export != "none" and export_path is not None:
+        with recorder.time("export"):
+            exported = write_analysis_export(export_path, export, cache_entry, segments, info,
+                                             False, model_complexity, tuning)
+    result.update({
+        'exercise_stats': filter_exercise_stats(exercise_stats),
+        'exported': exported,
+        'counting': tuning.report(),
+        'exercise_ranges': suggested_ranges
+    })
+    return result
+
+def full_sampling_report(frames: int, inferred_frames: int) -> Dict:
+    """Доля кадров с инференсом при полном проходе (меньше 1 только за счет кеша)"""
+    return {
+        "mode": "full",
+        "stride": 1,
+        "frames": frames,
+        "inferred_frames": inferred_frames,
+        "inferred_fraction": round(inferred_frames / frames, 4) if frames else 0.0
+    }
+
+def filter_exercise_stats(exercise_stats: Dict) -> Dict:
+    """Убирает упражнения с нулевыми счетчиками"""
+    return {
+        ex: stats for ex, stats in exercise_stats.items()
+        if stats["count"] > 0 or stats["time"] > 0
+    }
+
+def analyze_span(input_path: str, output_path: str, span: Tuple[int, int, Tuple[str, ...]],
+                 warmup_start: int, model_complexity: int,
+                 cache_path: Optional[str] = None, render: bool = True,
+                 inference_max_side: int = 0, inference_crop: bool = False,
+                 band: float = 0.0) -> Dict:
+    """Обрабатывает один отрезок кадров в отдельном процессе моделью из его пула.
+
+    Кадры с warmup_start до начала отрезка только прогревают трекинг. Счетчики
+    повторений ведутся сразу для обоих возможных начальных состояний ("up" и "down"),
+    чтобы при слиянии выбрать ветку по состоянию на конце предыдущего отрезка.
+    Время планки возвращается в кадрах и при слиянии складывается. band - полоса
+    гистерезиса счетчиков. Landmarks кадров отрезка записываются в запись кеша cache_path.
+    Замеры стадий возвращаются в "metrics" и сливаются с замерами запроса.
+    """
+    start, end, active = span
+    recorder = StageRecorder()
+    cache_entry = LandmarkCacheEntry(cache_path) if cache_path else None
+    info = probe_video(input_path)
+    cap = cv2.VideoCapture(input_path)
+    out = None
+    if render:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        out = cv2.VideoWriter(output_path, fourcc, info["fps"], (info["width"], info["height"]))
+    
+    branches = {
+        ex_type: {initial: [0, initial] for initial in ("up", "down")}
+        for ex_type in active if ex_type in EXERCISE_COUNTERS
+    }
+    plank_duration = 0
+    processed_frames = 0
+    inference_input = InferenceInput(inference_max_side, inference_crop)
+    
+    with pose_pool.checkout(model_complexity) as pose:
+        
+        started = time.perf_counter()
+        for frame_index, frame, _ in iter_video_frames(cap, [(warmup_start, end, active)]):
+            recorder.observe("decode", time.perf_counter() - started)
+            started = time.perf_counter()
+            pose_landmarks = inference_input.process(pose, frame)
+            recorder.observe("inference", time.perf_counter() - started)
+            if frame_index < start:
+                started = time.perf_counter()
+                continue
+            if cache_entry is not None:
+                cache_entry.put(frame_index, pose_landmarks)
+            recorder.frame(pose_landmarks is not None)
+            
+            if pose_landmarks:
+                started = time.perf_counter()
+                for ex_type, ex_branches in branches.items():
+                    for branch in ex_branches.values():
+                        branch[0], branch[1] = EXERCISE_COUNTERS[ex_type](
+                            pose_landmarks, branch[1], branch[0], band)
+                if "Планка" in active:
+                    plank_duration = count_plank(pose_landmarks, plank_duration)
+                recorder.observe("counting", time.perf_counter() - started)
+                if render:
+                    started = time.perf_counter()
+                    annotate_frame(frame, pose_landmarks, active)
+                    recorder.observe("drawing", time.perf_counter() - started)
+            
+            if render:
+                started = time.perf_counter()
+                out.write(frame)
+                recorder.observe("encode", time.perf_counter() - started)
+            processed_frames += 1
+            started = time.perf_counter()
+    
+    cap.release()
+    if out is not None:
+        out.release()
+    if cache_entry is not None:
+        cache_entry.flush()
+    
+    return {
+        "processed_frames": processed_frames,
+        "branches": branches,
+        "plank_duration": plank_duration,
+        "metrics": recorder
+    }
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Общий для всех запросов пул процессов (создается при первом обращении).
+
+    Процесс пула импортирует этот модуль (analyze_span), а не сервис api.py.
+    Только при запуске "python api.py" spawn выполняет в процессе и api.py (как
+    __mp_main__), поэтому его объекты не трогают диск при создании.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=PARALLEL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _process_pool
+
+def analyze_video_parallel(input_path: str, output_path: str, spans: List[Tuple[int, int, Tuple[str, ...]]],
+                           info: Dict, model_complexity: int, only_ranges: bool, workers: int,
+                           cache_entry: Optional[LandmarkCacheEntry] = None, render: bool = True,
+                           inference_max_side: int = 0, inference_crop: bool = False,
+                           band: float = 0.0, checkpoint: Optional[Checkpoint] = None,
+                           progress: Optional[Callable[[int, int], None]] = None,
+                           recorder: Optional[StageRecorder] = None) -> Dict:
+    """Параллельный анализ: отрезки обрабатываются в пуле процессов и сливаются по порядку.
+
+    Одновременно выполняется не больше workers отрезков. Каждый отрезок прогревает
+    трекинг на CHUNK_OVERLAP_FRAMES предыдущих кадрах. Счетчики сливаются точно,
+    но landmarks в начале отрезка могут немного отличаться от последовательного
+    прохода, где трекинг идет без перерыва, поэтому по умолчанию workers=1.
+    Отрезок не зависит от остальных, поэтому контрольная точка - это результаты
+    готовых отрезков (и их видео в папке точки): после перезапуска они не пересчитываются.
+    """
+    pool = get_process_pool()
+    if checkpoint is not None:
+        span_dir = checkpoint.directory("spans")
+    else:
+        span_dir = tempfile.mkdtemp(dir=os.path.dirname(output_path) or None)
+    span_paths = [os.path.join(span_dir, f"span_{i:05d}.mp4") for i in range(len(spans))]
+    
+    total_frames = sum(end - start + 1 for start, end, _ in spans)
+    processed_frames = 0
+    
+    results = [None] * len(spans)
+    saved = {}
+    state = checkpoint.load() if checkpoint is not None else None
+    for index, span_result in (state or {}).get("spans", {}).items():
+        index = int(index)
+        # Готовый отрезок годится, если его landmarks еще в кеше и есть нужное видео
+        if (render and not span_result["rendered"]) or (
+                cache_entry is not None and not cache_entry.covers([spans[index]])):
+            continue
+        saved[str(index)] = span_result
+        results[index] = dict(span_result, metrics=None)
+        processed_frames += span_result["processed_frames"]
+    resumed_spans = len(saved)
+    if progress:
+        progress(processed_frames, total_frames)
+    
+    pending = {}
+    next_span = 0
+    try:
+        while next_span < len(spans) or pending:
+            while next_span < len(spans) and results[next_span] is not None:
+                next_span += 1
+            while next_span < len(spans) and len(pending) < workers:
+                span = spans[next_span]
+                warmup_start = max(0, span[0] - CHUNK_OVERLAP_FRAMES)
+                future = pool.submit(analyze_span, input_path, span_paths[next_span], span,
+                                     warmup_start, model_complexity,
+                                     cache_entry.path if cache_entry is not None else None, render,
+                                     inference_max_side, inference_crop, band)
+                pending[future] = next_span
+                next_span += 1
+                while next_span < len(spans) and results[next_span] is not None:
+                    next_span += 1
+            if not pending:
+                break
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                results[index] = future.result()
+                processed_frames += results[index]["processed_frames"]
+                if recorder is not None:
+                    recorder.merge(results[index]["metrics"])
+                if checkpoint is not None:
+                    saved[str(index)] = {
+                        "processed_frames": results[index]["processed_frames"],
+                        "branches": results[index]["branches"],
+                        "plank_duration": results[index]["plank_duration"],
+                        "rendered": render
+                    }
+                    started = time.perf_counter()
+                    if cache_entry is not None:
+                        cache_entry.flush()
+                    checkpoint.save({"spans": saved})
+                    if recorder is not None:
+                        recorder.observe("checkpoint", time.perf_counter() - started)
+                if progress:
+                    progress(processed_frames, total_frames)
+        
+        # Слияние в порядке отрезков дает те же счетчики, что и последовательный проход по тем же landmarks
+        exercise_states, exercise_stats = create_exercise_state()
+        for (start, end, active), result in zip(spans, results):
+            advance_clock(active, exercise_states, result["processed_frames"])
+            for ex_type, ex_branches in result["branches"].items():
+                state = exercise_states[ex_type]
+                counter, state["prev_state"] = ex_branches[state["prev_state"]]
+                state["counter"] += counter
+                exercise_stats[ex_type]["count"] = state["counter"]
+            exercise_states["Планка"]["duration"] += result["plank_duration"]
+        clock_stats(exercise_states, exercise_stats, info["fps"])
+        
+        # Склеиваем размеченные отрезки в одно видео
+        if render:
+            concat_started = time.perf_counter()
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            out = cv2.VideoWriter(output_path, fourcc, info["fps"], (info["width"], info["height"]))
+            for span_path in span_paths:
+                cap = cv2.VideoCapture(span_path)
+                while True:
+                    success, frame = cap.read()
+                    if not success:
+                        break
+                    out.write(frame)
+                cap.release()
+            out.release()
+            if recorder is not None:
+                recorder.observe("concat", time.perf_counter() - concat_started)
+    finally:
+        for future in pending:
+            future.cancel()
+        # Видео отрезков из контрольной точки удаляются вместе с ней
+        if checkpoint is None:
+            shutil.rmtree(span_dir, ignore_errors=True)
+    
+    return {
+        'exercise_stats': filter_exercise_stats(exercise_stats),
+        'processed_frames': processed_frames,
+        'total_frames': total_frames,
+        'rendered': render,
+        'checkpoint': {"resumed_spans": resumed_spans, "saved": checkpoint.saves} if checkpoint is not None else None
+    }
+
+def analyze_video_people(input_path: str, output_path: str, exercise_ranges: List[Tuple[float, float, str]],
+                         model_complexity: int = 1, only_ranges: bool = True, render: bool = True,
+                         max_people: int = PEOPLE_MAX, smoothing: str = "none",
+                         hysteresis: float = 0.0, min_rep_duration: float = 0.0,
+                         progress: Optional[Callable[[int, int], None]] = None,
+                         recorder: Optional[StageRecorder] = None) -> Dict:
+    """Групповой режим: повторения каждого человека в кадре за один проход по видео.
+
+    Кадр декодируется и переводится в RGB один раз для всех. Людей находит
+    PersonDetector (каждые PEOPLE_DETECT_INTERVAL кадров и пока в кадре никого нет),
+    сопровождает PersonTracker. У каждого человека своя модель Pose (из пула,
+    сверх пула - временная), которая работает на вырезе вокруг него, и свои
+    exercise_states/exercise_stats, поэтому стоимость растет с числом людей,
+    а не с числом загрузок. Результаты по людям - в people (найденные меньше
+    PEOPLE_MIN_SECONDS не попадают), exercise_stats - у человека, найденного
+    на большем числе кадров. Устойчивый подсчет (см. CounterTuning) - свой
+    у каждого человека. Кеш landmarks, выборка кадров и экспорт здесь не используются.
+    """
+    if recorder is None:
+        recorder = StageRecorder()
+    info = probe_video(input_path)
+    fps, width, height = info["fps"], info["width"], info["height"]
+    segments = range_segments(exercise_ranges, info)
+    total_frames = sum(end - start + 1 for start, end, _ in segments) if only_ranges else info["total_frames"]
+    processed_frames = 0
+    
+    detector = PersonDetector(PEOPLE_DETECT_MAX_SIDE)
+    tracker = PersonTracker(max_people, max_misses=max(1, round(PEOPLE_LOST_SECONDS * fps)))
+    people = {}
+    finished = []
+    
+    def start_person(track: Track):
+        pose = pose_pool.acquire(model_complexity, block=False)
+        pooled = pose is not None
+        if not pooled:
+            pose = create_pose(model_complexity)
+        states, stats = create_exercise_state()
+        people[track.id] = {"track": track, "pose": pose, "pooled": pooled, "states": states, "stats": stats,
+                            "tuning": CounterTuning(smoothing, hysteresis, min_rep_duration, fps),
+                            "pose_frames": 0}
+    
+    def finish_person(track: Track):
+        person = people.pop(track.id)
+        if person["pooled"]:
+            pose_pool.release(person["pose"], model_complexity)
+        else:
+            person["pose"].close()
+        finished.append(person)
+    
+    def decode_frames():
+        started = time.perf_counter()
+        for item in iter_video_frames(cap, segments, only_ranges):
+            recorder.observe("decode", time.perf_counter() - started)
+            yield item
+            started = time.perf_counter()
+    
+    def infer(item):
+        """Стадия инференса: детектор, модель на каждом человеке и счетчики каждого"""
+        frame_index, frame, active = item
+        started = time.perf_counter()
+        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        recorder.observe("preprocess", time.perf_counter() - started)
+        if frame_index % PEOPLE_DETECT_INTERVAL == 0 or not tracker.tracks:
+            started = time.perf_counter()
+            for track in tracker.match(detector.detect(frame), frame_index):
+                start_person(track)
+            recorder.observe("detection", time.perf_counter() - started)
+        
+        found = []
+        ended = []
+        for track in tracker.tracks:
+            person = people[track.id]
+            box = expand_box(track.box, PEOPLE_BOX_PADDING, width, height)
+            x0, y0, x1, y1 = box
+            pose_landmarks = None
+            started = time.perf_counter()
+            if x1 - x0 >= 16 and y1 - y0 >= 16:
+                pose_landmarks = person["pose"].process(np.ascontiguousarray(image[y0:y1, x0:x1])).pose_landmarks
+                if pose_landmarks:
+                    pose_landmarks = remap_landmarks(pose_landmarks, box, width, height)
+            recorder.observe("inference", time.perf_counter() - started)
+            
+            advance_clock(active, person["states"])
+            if pose_landmarks:
+                started = time.perf_counter()
+                person["pose_frames"] += 1
+                counted = person["tuning"].smooth(pose_landmarks, frame_index / fps if fps else frame_index)
+                for ex_type in active:
+                    update_exercise(ex_type, counted, person["states"], person["stats"], tuning=person["tuning"])
+                recorder.observe("counting", time.perf_counter() - started)
+            if tracker.update(track, landmarks_box(pose_landmarks, width, height, PEOPLE_BOX_PADDING), frame_index):
+                ended.append(track)
+            elif pose_landmarks:
+                found.append((track.id, track.box, pose_landmarks))
+        ended += [track for track in tracker.duplicates() if track not in ended]
+        tracker.remove(ended)
+        for track in ended:
+            finish_person(track)
+        recorder.frame(bool(found))
+        return [(frame, found, active)]
+    
+    def encode(items):
+        nonlocal processed_frames
+        for frame, found, active in items:
+            if render:
+                started = time.perf_counter()
+                for person_id, (x0, y0, _, _), pose_landmarks in found:
+                    annotate_frame(frame, pose_landmarks, active)
+                    cv2.putText(frame, f"#{person_id}", (x0, max(y0 - 8, 20)),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+                drawn = time.perf_counter()
+                out.write(frame)
+                recorder.observe("drawing", drawn - started)
+                recorder.observe("encode", time.perf_counter() - drawn)
+            processed_frames += 1
+            if progress:
+                progress(processed_frames, total_frames)
+    
+    cap = cv2.VideoCapture(input_path)
+    out = None
+    if render:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    try:
+        if progress:
+            progress(0, total_frames)
+        pipeline_report = FramePipeline(PIPELINE_QUEUE_SIZE).run(decode_frames(), infer, encode)
+    finally:
+        for track in list(tracker.tracks):
+            finish_person(track)
+        cap.release()
+        if out is not None:
+            out.release()
+    
+    results = []
+    for person in sorted(finished, key=lambda person: person["track"].id):
+        track = person["track"]
+        if person["pose_frames"] < PEOPLE_MIN_SECONDS * fps:
+            continue
+        results.append({
+            "id": track.id,
+            "first_time": track.first_frame / fps,
+            "last_time": track.last_frame / fps,
+            "pose_frames": person["pose_frames"],
+            "exercise_stats": filter_exercise_stats(clock_stats(person["states"], person["stats"], fps))
+        })
+    main_person = max(results, key=lambda person: person["pose_frames"], default=None)
+    
+    return {
+        'exercise_stats': main_person["exercise_stats"] if main_person else {},
+        'people': results,
+        'processed_frames': processed_frames,
+        'total_frames': total_frames,
+        'cache_hit': False,
+        'rendered': render,
+        'exported': False,
+        'counting': CounterTuning(smoothing, hysteresis, min_rep_duration).report(),
+        'checkpoint': None,
+        'pipeline_report': pipeline_report,
+        'sampling': full_sampling_report(processed_frames, processed_frames)
+    }
+
+def inference_resolution_report(input_path: str, exercise_ranges: List[Tuple[float, float, str]],
+                                model_complexity: int = 1, inference_max_side: int = 0,
+                                inference_crop: bool = False) -> Dict:
+    """Сравнивает уменьшенное разрешение для модели с полным: ускорение и совпадение счетчиков"""
+    runs = {}
+    for name, max_side, crop in (("full", 0, False), ("reduced", inference_max_side, inference_crop)):
+        started = time.perf_counter()
+        result = analyze_video(input_path, os.devnull, exercise_ranges, model_complexity,
+                               use_cache=False, render=False,
+                               inference_max_side=max_side, inference_crop=crop)
+        runs[name] = {"seconds": time.perf_counter() - started, "exercise_stats": result["exercise_stats"]}
+    
+    agreement = {}
+    for ex_type in EXERCISE_TYPES:
+        full = runs["full"]["exercise_stats"].get(ex_type, {"count": 0})["count"]
+        reduced = runs["reduced"]["exercise_stats"].get(ex_type, {"count": 0})["count"]
+        if full or reduced:
+            agreement[ex_type] = {"full": full, "reduced": reduced, "match": full == reduced}
+    return {
+        "inference_max_side": inference_max_side,
+        "inference_crop": inference_crop,
+        "full_seconds": runs["full"]["seconds"],
+        "reduced_seconds": runs["reduced"]["seconds"],
+        "speedup": runs["full"]["seconds"] / runs["reduced"]["seconds"] if runs["reduced"]["seconds"] else None,
+        "count_agreement": agreement,
+        "all_counts_match": all(item["match"] for item in agreement.values())
+    }
+
+def analyze_batch_item(item: Dict) -> Dict:
+    """Анализ одной строки пакета: только статистика, без видео с разметкой"""
+    return analyze_video(item["video"], os.devnull, item["exercise_ranges"], item["model_complexity"],
+                         render=False)
+
@@ -1,289 +1,907 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify, send_file
 import cv2
 import numpy as np
 import tempfile
+import re
+import json
+import hashlib
+import shutil
+import threading
+import uuid
 import os
 import time
-import mediapipe as mp
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Callable, Iterable
+
+import landmark_export
+from metrics import MetricsRegistry, StageRecorder, directory_size
+from scratch import ScratchStorage, ScratchDir, ScratchQuotaError
+from smoothing import SMOOTHING_METHODS
+from batch import ManifestError, parse_manifest, results_table, run_batch
+from admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from pose_pool import MODEL_COMPLEXITIES
+from live import LiveSessionManager
+from jobs import JobManager
+from analysis import (
+    CHECKPOINTS_ENABLED, COUNTING_ENGINES, EXERCISE_TYPES, HYSTERESIS_BAND, MIN_REP_DURATION,
+    PARALLEL_WORKERS, PEOPLE_MAX, SAMPLING_MODES, SAMPLING_STRIDE, SEGMENTATION_MODES, SMOOTHING,
+    CounterTuning, analyze_batch_item, analyze_video, analyze_video_auto, file_sha256,
+    landmark_cache, parse_exercise_ranges, pose_pool, probe_video, range_segments
+)
 
 app = Flask(__name__)
 
-# Инициализация MediaPipe
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+# Папка для размеченных видео, которые отдаются отдельным запросом
+VIDEO_DIR = os.environ.get("VIDEO_DIR", os.path.join(tempfile.gettempdir(), "diplom_videos"))
 
-# Настройки по умолчанию
-DEFAULT_LANDMARK_COLOR = (0, 255, 0)
-DEFAULT_CONNECTION_COLOR = (255, 0, 0)
+# Папка для экспорта landmarks и повторений (.npz, см. landmark_export.py) и форматы экспорта
+EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "diplom_exports"))
+EXPORT_FORMATS = ("none",) + tuple(landmark_export.LANDMARK_DTYPES)
 
-def count_pushups(landmarks, prev_state, counter):
-    """Алгоритм подсчета отжиманий"""
-    left_shoulder = landmarks.landmark[mp_pose.PoseLandmark.LEFT_SHOULDER]
-    right_shoulder = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_SHOULDER]
-    left_elbow = landmarks.landmark[mp_pose.PoseLandmark.LEFT_ELBOW]
-    right_elbow = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_ELBOW]
-    
-    shoulder_y = (left_shoulder.y + right_shoulder.y) / 2
-    elbow_y = (left_elbow.y + right_elbow.y) / 2
-    
-    current_state = "down" if elbow_y > shoulder_y else "up"
-    
-    if prev_state == "up" and current_state == "down":
-        counter += 1
-        prev_state = "down"
-    elif current_state == "up":
-        prev_state = "up"
-    
-    return counter, prev_state
-
-def count_squats(landmarks, prev_state, counter):
-    """Алгоритм подсчета приседаний"""
-    left_hip = landmarks.landmark[mp_pose.PoseLandmark.LEFT_HIP]
-    right_hip = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_HIP]
-    left_knee = landmarks.landmark[mp_pose.PoseLandmark.LEFT_KNEE]
-    right_knee = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_KNEE]
-    
-    hip_y = (left_hip.y + right_hip.y) / 2
-    knee_y = (left_knee.y + right_knee.y) / 2
-    
-    current_state = "down" if knee_y > hip_y else "up"
-    
-    if prev_state == "up" and current_state == "down":
-        counter += 1
-        prev_state = "down"
-    elif current_state == "up":
-        prev_state = "up"
-    
-    return counter, prev_state
-
-def count_pullups(landmarks, prev_state, counter):
-    """Алгоритм подсчета подтягиваний"""
-    left_shoulder = landmarks.landmark[mp_pose.PoseLandmark.LEFT_SHOULDER]
-    right_shoulder = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_SHOULDER]
-    left_elbow = landmarks.landmark[mp_pose.PoseLandmark.LEFT_ELBOW]
-    right_elbow = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_ELBOW]
-    
-    shoulder_y = (left_shoulder.y + right_shoulder.y) / 2
-    elbow_y = (left_elbow.y + right_elbow.y) / 2
-    
-    current_state = "up" if elbow_y < shoulder_y else "down"
-    
-    if prev_state == "down" and current_state == "up":
-        counter += 1
-        prev_state = "up"
-    elif current_state == "down":
-        prev_state = "down"
-    
-    return counter, prev_state
-
-def count_plank(landmarks, start_time, duration):
-    """Алгоритм подсчета времени планки"""
-    # Проверяем правильность положения тела
-    left_shoulder = landmarks.landmark[mp_pose.PoseLandmark.LEFT_SHOULDER]
-    right_shoulder = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_SHOULDER]
-    left_hip = landmarks.landmark[mp_pose.PoseLandmark.LEFT_HIP]
-    right_hip = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_HIP]
-    
-    # Проверяем, что плечи и бедра находятся примерно на одной линии
-    shoulder_hip_diff = abs((left_shoulder.y + right_shoulder.y)/2 - (left_hip.y + right_hip.y)/2)
-    
-    if shoulder_hip_diff < 0.1:  # Эмпирически подобранное значение
-        return time.time() - start_time
-    return duration
-
-def count_lunges(landmarks, prev_state, counter):
-    """Алгоритм подсчета выпадов"""
-    left_knee = landmarks.landmark[mp_pose.PoseLandmark.LEFT_KNEE]
-    right_knee = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_KNEE]
-    left_ankle = landmarks.landmark[mp_pose.PoseLandmark.LEFT_ANKLE]
-    right_ankle = landmarks.landmark[mp_pose.PoseLandmark.RIGHT_ANKLE]
+# Загрузки для повторного анализа без повторной передачи: папка и время хранения (сек)
+# с последнего обращения. Идентификатор загрузки - SHA-256 содержимого
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "diplom_uploads"))
+UPLOAD_TTL = int(os.environ.get("UPLOAD_TTL", 24 * 3600))
+
+# Пакетный анализ по манифесту (см. batch.py): папка на сервере, от которой считаются пути
+# видео в манифестах /batches (пусто - только upload_id), папка журналов и таблиц пакетов
+# и сколько видео пакета анализируется одновременно
+BATCH_ROOT = os.environ.get("BATCH_ROOT", "")
+BATCH_DIR = os.environ.get("BATCH_DIR", os.path.join(tempfile.gettempdir(), "diplom_batches"))
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 2))
+
+# Число фоновых потоков для очереди задач и время хранения готовых задач
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_RESULT_TTL = int(os.environ.get("JOB_RESULT_TTL", 3600))
+
+# Временное место под загрузки: максимальный размер загрузки, квота задачи
+# и общая квота в байтах; неактивные папки старше SCRATCH_TTL (сек) удаляются
+SCRATCH_DIR = os.environ.get("SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "diplom_scratch"))
+SCRATCH_MAX_UPLOAD_BYTES = int(os.environ.get("SCRATCH_MAX_UPLOAD_BYTES", 2 * 1024 ** 3))
+SCRATCH_JOB_QUOTA_BYTES = int(os.environ.get("SCRATCH_JOB_QUOTA_BYTES", 6 * 1024 ** 3))
+SCRATCH_TOTAL_QUOTA_BYTES = int(os.environ.get("SCRATCH_TOTAL_QUOTA_BYTES", 20 * 1024 ** 3))
+SCRATCH_TTL = int(os.environ.get("SCRATCH_TTL", 3600))
+
+# Контроль нагрузки: бюджет взвешенных кадров в работе (кадры под модель с учетом
+# сложности модели, выборки и отрисовки), допустимый loadavg на ядро, доли давления,
+# с которых параметры понижаются и запросы отклоняются, и Retry-After (сек)
+ADMISSION_MAX_FRAMES = float(os.environ.get("ADMISSION_MAX_FRAMES", 20000))
+ADMISSION_MAX_LOAD = float(os.environ.get("ADMISSION_MAX_LOAD", 1.5))
+ADMISSION_DEGRADE_AT = float(os.environ.get("ADMISSION_DEGRADE_AT", 0.6))
+ADMISSION_SHED_AT = float(os.environ.get("ADMISSION_SHED_AT", 1.0))
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", 30))
+ADMISSION_MAX_STRIDE = int(os.environ.get("ADMISSION_MAX_STRIDE", 6))
+
+# Онлайн-подсчет: число одновременных сессий, закрытие после простоя (сек),
+# максимальная сторона кадра для модели и качество JPEG в MJPEG-потоке
+LIVE_MAX_SESSIONS = int(os.environ.get("LIVE_MAX_SESSIONS", 4))
+LIVE_SESSION_TTL = int(os.environ.get("LIVE_SESSION_TTL", 60))
+LIVE_MAX_SIDE = int(os.environ.get("LIVE_MAX_SIDE", 480))
+LIVE_JPEG_QUALITY = int(os.environ.get("LIVE_JPEG_QUALITY", 70))
+# Папка, внутри которой сессия может читать файлы и pipe (source); пусто - только камеры
+LIVE_SOURCE_ROOT = os.environ.get("LIVE_SOURCE_ROOT", "")
+
+def store_video(output_path: str) -> str:
+    """Переносит размеченное видео в VIDEO_DIR и возвращает его идентификатор"""
+    purge_videos()
+    os.makedirs(VIDEO_DIR, exist_ok=True)
+    video_id = uuid.uuid4().hex
+    shutil.move(output_path, os.path.join(VIDEO_DIR, f"{video_id}.mp4"))
+    return video_id
+
+def store_export(export_path: str) -> str:
+    """Переносит экспорт landmarks в EXPORT_DIR и возвращает его идентификатор"""
+    purge_expired_files(EXPORT_DIR)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    export_id = uuid.uuid4().hex
+    shutil.move(export_path, os.path.join(EXPORT_DIR, f"{export_id}.npz"))
+    return export_id
+
+def stored_upload_path(upload_id: str) -> Optional[str]:
+    """Путь сохраненной загрузки или None; обращение продлевает срок хранения"""
+    if not re.fullmatch(r'[0-9a-f]{64}', upload_id or ''):
+        return None
+    path = os.path.join(UPLOAD_DIR, f"{upload_id}.mp4")
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+def store_upload(input_path: str) -> Tuple[str, bool]:
+    """Переносит загрузку в UPLOAD_DIR под ее SHA-256; (upload_id, было ли такое видео раньше)"""
+    purge_expired_files(UPLOAD_DIR, UPLOAD_TTL)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    upload_id = file_sha256(input_path)
+    if stored_upload_path(upload_id):
+        return upload_id, True
+    # Через временное имя: по upload_id никогда не виден недописанный файл
+    tmp_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}.tmp")
+    shutil.move(input_path, tmp_path)
+    os.replace(tmp_path, os.path.join(UPLOAD_DIR, f"{upload_id}.mp4"))
+    return upload_id, False
+
+def purge_videos():
+    """Удаляет видео старше JOB_RESULT_TTL"""
+    purge_expired_files(VIDEO_DIR)
+
+def purge_expired_files(directory: str, ttl: int = JOB_RESULT_TTL):
+    """Удаляет файлы папки старше ttl секунд"""
+    if not os.path.isdir(directory):
+        return
+    now = time.time()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > ttl:
+                os.remove(path)
+        except OSError:
+            pass
+
+def result_response(result: Dict, processing_time: float, video_id: Optional[str],
+                    recorder: Optional[StageRecorder] = None,
+                    ticket: Optional[AdmissionTicket] = None) -> Dict:
+    """JSON ответа с результатами анализа; видео отдается по ссылке /videos/<id>.
+
+    В admission - давление при допуске и понижения параметров из-за нагрузки.
+    """
+    return {
+        'processing_time': processing_time,
+        'exercise_stats': result['exercise_stats'],
+        'cache_hit': result['cache_hit'],
+        'video_url': f'/videos/{video_id}' if video_id else None,
+        'export_url': f"/exports/{result['export_id']}" if result.get('export_id') else None,
+        'pipeline_report': result.get('pipeline_report'),
+        'sampling': result.get('sampling'),
+        'counting': result.get('counting'),
+        'checkpoint': result.get('checkpoint'),
+        'people': result.get('people'),
+        'exercise_ranges': result.get('exercise_ranges'),
+        'metrics': recorder.summary() if recorder is not None else None,
+        'admission': ticket.summary() if ticket is not None else None
+    }
+
+def resolve_batch_video(video: str) -> Optional[str]:
+    """Путь видео строки пакета: upload_id из /uploads или файл внутри BATCH_ROOT"""
+    stored_path = stored_upload_path(video)
+    if stored_path:
+        return stored_path
+    if not BATCH_ROOT:
+        return None
+    root = os.path.realpath(BATCH_ROOT)
+    path = os.path.realpath(os.path.join(root, video))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
+
+class BatchManager:
+    """Пакеты по манифесту в фоне: журнал и таблица пакета лежат в root/<batch_id>.
+
+    Идентификатор пакета - хеш манифеста, поэтому повторная отправка того же
+    манифеста (например, после перезапуска сервера) продолжает пакет по журналу,
+    а пока пакет идет, возвращает его же.
+    """
+    
+    def __init__(self, root: str, workers: int):
+        self.root = root
+        self.workers = workers
+        self.batches = {}
+        self.lock = threading.Lock()
+    
+    def paths(self, batch_id: str) -> Tuple[str, str]:
+        """Журнал и сводная таблица пакета"""
+        directory = os.path.join(self.root, batch_id)
+        return os.path.join(directory, "results.jsonl"), os.path.join(directory, "results.csv")
+    
+    def submit(self, manifest: str, items: List[Dict]) -> str:
+        batch_id = hashlib.sha256(manifest.encode("utf-8")).hexdigest()[:32]
+        with self.lock:
+            entry = self.batches.get(batch_id)
+            if entry is not None and entry["status"] == "running":
+                return batch_id
+            self.batches[batch_id] = {
+                "status": "running",
+                "videos": len(items),
+                "finished": 0,
+                "errors": 0,
+                "started_at": time.time(),
+                "finished_at": None,
+                "report": None,
+                "error": None
+            }
+        threading.Thread(target=self._run, args=(batch_id, items), daemon=True,
+                         name=f"batch-{batch_id[:8]}").start()
+        return batch_id
+    
+    def _run(self, batch_id: str, items: List[Dict]):
+        entry = self.batches[batch_id]
+        journal_path, table_path = self.paths(batch_id)
+        os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+        
+        def on_record(record):
+            entry["finished"] += 1
+            entry["errors"] += record["status"] != "done"
+            metrics.inc("batch_videos_total", {"outcome": record["status"]})
+        
+        try:
+            entry["report"] = run_batch(items, analyze_batch_item, journal_path, self.workers, on_record)
+            results_table(items, journal_path).to_csv(table_path, index=False, encoding="utf-8")
+            entry["status"] = "done"
+        except Exception as e:
+            entry["error"] = str(e)
+            entry["status"] = "error"
+        finally:
+            entry["finished_at"] = time.time()
+    
+    def status(self, batch_id: str) -> Optional[Dict]:
+        """Состояние пакета; готовый пакет прошлого запуска сервера - по таблице на диске"""
+        entry = self.batches.get(batch_id)
+        if entry is None:
+            if not os.path.exists(self.paths(batch_id)[1]):
+                return None
+            return {"batch_id": batch_id, "status": "done"}
+        return dict(entry, batch_id=batch_id)
+
+batch_manager = BatchManager(BATCH_DIR, BATCH_WORKERS)
+
+scratch_storage = ScratchStorage(SCRATCH_DIR, SCRATCH_MAX_UPLOAD_BYTES, SCRATCH_JOB_QUOTA_BYTES,
+                                 SCRATCH_TOTAL_QUOTA_BYTES, SCRATCH_TTL)
+
+class ScratchRequest(Request):
+    """Запрос, у которого файлы multipart пишутся кусками сразу во временное хранилище"""
     
-    # Определяем, какая нога впереди
-    if left_knee.x < right_knee.x:
-        front_knee = left_knee
-        back_knee = right_knee
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return scratch_storage.incoming_file()
+
+app.request_class = ScratchRequest
+# Больше - сразу 413, не читая тело (запас на поля формы)
+app.config['MAX_CONTENT_LENGTH'] = SCRATCH_MAX_UPLOAD_BYTES + 1024 ** 2
+
+# Метрики процесса API для /metrics
+metrics = MetricsRegistry()
+# Синхронные запросы /process_video в работе
+inflight_requests = 0
+inflight_lock = threading.Lock()
+
+metrics.gauge("jobs", "Задачи анализа по состояниям",
+              lambda: {(("status", status),): count for status, count in job_manager.counts().items()})
+metrics.gauge("job_workers", "Размер пула фоновых задач", lambda: {(): JOB_WORKERS})
+metrics.gauge("requests_in_progress", "Синхронные запросы /process_video в работе",
+              lambda: {(): inflight_requests})
+metrics.gauge("temp_disk_bytes", "Занятое место на диске по областям",
+              lambda: {
+                  (("area", "scratch"),): scratch_storage.stats()["used_bytes"],
+                  (("area", "videos"),): directory_size(VIDEO_DIR),
+                  (("area", "landmark_cache"),): landmark_cache.stats()["size_bytes"]
+              })
+
+metrics.gauge("scratch_quota_bytes", "Общая квота временного места", lambda: {(): SCRATCH_TOTAL_QUOTA_BYTES})
+
+admission = AdmissionController(ADMISSION_MAX_FRAMES, ADMISSION_MAX_LOAD, ADMISSION_DEGRADE_AT,
+                                ADMISSION_SHED_AT, ADMISSION_RETRY_AFTER, SAMPLING_STRIDE,
+                                ADMISSION_MAX_STRIDE)
+
+metrics.gauge("admission_inflight_frames", "Взвешенные кадры допущенных запросов и задач",
+              lambda: {(): admission.inflight_frames()})
+metrics.gauge("admission_pressure", "Давление нагрузки (1.0 - бюджет кадров или CPU исчерпан)",
+              lambda: {(): admission.pressure()})
+
+live_sessions = LiveSessionManager(LIVE_MAX_SESSIONS, LIVE_SESSION_TTL, LIVE_MAX_SIDE, LIVE_JPEG_QUALITY)
+metrics.gauge("live_sessions", "Открытые онлайн-сессии", lambda: {(): len(live_sessions.sessions)})
+
+def read_live_exercises() -> Optional[Tuple[str, ...]]:
+    """Упражнения сессии из формы: одно или несколько через запятую"""
+    raw = request.form.get('exercise', '')
+    exercises = tuple(ex.strip() for ex in raw.split(',') if ex.strip())
+    if not exercises or any(ex not in EXERCISE_TYPES for ex in exercises):
+        return None
+    return exercises
+
+def form_flag(name: str, default: bool) -> bool:
+    """Булев параметр формы: 0/false/no - выключено"""
+    value = request.values.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ('0', 'false', 'no', 'off', '')
+
+class BadParameter(ValueError):
+    """Параметр запроса не разбирается; ответ - 400 с именем поля"""
+
+    def __init__(self, field: str, message: str):
+        super().__init__(message)
+        self.field = field
+
+def read_int(name: str, default: int) -> int:
+    """Целый параметр из формы или строки запроса; нечисло - BadParameter"""
+    try:
+        return int(request.values.get(name, default))
+    except ValueError:
+        raise BadParameter(name, f"{name} must be an integer") from None
+
+def read_float(name: str, default: float) -> float:
+    """Вещественный параметр из формы или строки запроса; нечисло - BadParameter"""
+    try:
+        value = float(request.values.get(name, default))
+    except ValueError:
+        raise BadParameter(name, f"{name} must be a number") from None
+    if not np.isfinite(value):
+        raise BadParameter(name, f"{name} must be a number")
+    return value
+
+def read_model_complexity() -> int:
+    """model_complexity из формы; вне 0..2 - BadParameter"""
+    model_complexity = read_int('model_complexity', 1)
+    if model_complexity not in MODEL_COMPLEXITIES:
+        raise BadParameter('model_complexity', f"model_complexity must be one of {list(MODEL_COMPLEXITIES)}")
+    return model_complexity
+
+def read_counter_tuning() -> Dict:
+    """Настройки устойчивого подсчета из формы; по умолчанию - из окружения сервера.
+
+    Заданные в запросе значения не подменяются: неизвестное сглаживание,
+    полоса вне 0..0.2 или отрицательная длительность - BadParameter.
+    """
+    smoothing = request.values.get('smoothing', SMOOTHING)
+    if 'smoothing' in request.values and smoothing not in SMOOTHING_METHODS:
+        raise BadParameter('smoothing', f"smoothing must be one of {list(SMOOTHING_METHODS)}")
+    hysteresis = read_float('hysteresis', HYSTERESIS_BAND)
+    # Полоса шире 0.2 превращает любые пороги в "фаза не меняется"
+    if not 0.0 <= hysteresis <= 0.2:
+        raise BadParameter('hysteresis', "hysteresis must be between 0 and 0.2")
+    min_rep_duration = read_float('min_rep_duration', MIN_REP_DURATION)
+    if min_rep_duration < 0:
+        raise BadParameter('min_rep_duration', "min_rep_duration must not be negative")
+    return {
+        "smoothing": smoothing if smoothing in SMOOTHING_METHODS else 'none',
+        "hysteresis": hysteresis,
+        "min_rep_duration": min_rep_duration
+    }
+
+def read_analysis_params() -> Dict:
+    """Параметры анализа из формы или строки запроса (при загрузке телом запроса)"""
+    params = {
+        "exercise_ranges": parse_exercise_ranges(request.values.get('exercise_ranges')),
+        "model_complexity": read_model_complexity(),
+        # only_ranges=0 - старый режим: модель на каждом кадре видео
+        "only_ranges": form_flag('only_ranges', True),
+        "use_cache": form_flag('use_cache', True),
+        "counting_engine": (request.values.get('counting_engine', 'scalar')
+                            if request.values.get('counting_engine') in COUNTING_ENGINES else 'scalar'),
+        # workers > 1 - параллельный анализ отрезков (приближение последовательного прохода)
+        "workers": max(1, min(read_int('workers', 1), PARALLEL_WORKERS)),
+        # render=0 - только статистика, без размеченного видео
+        "render": form_flag('render', True),
+        # Уменьшенное разрешение для модели: 0 - полный кадр
+        "inference_max_side": max(0, read_int('inference_max_side', 0)),
+        "inference_crop": form_flag('inference_crop', False),
+        # sampling=adaptive - модель не на каждом кадре, плотно только у порогов счетчиков
+        "sampling": request.values.get('sampling') if request.values.get('sampling') in SAMPLING_MODES else 'full',
+        "sample_stride": max(1, read_int('sample_stride', SAMPLING_STRIDE)),
+        # export=float16/float32 - landmarks и таблица повторений отдельным файлом /exports/<id>
+        "export": request.values.get('export') if request.values.get('export') in EXPORT_FORMATS else 'none',
+        # upload_id - видео из /uploads, его хеш уже известен
+        "video_hash": request.values.get('upload_id') or None,
+        # segmentation=auto - упражнения размечаются автоматически, exercise_ranges не нужны
+        "segmentation": (request.values.get('segmentation')
+                         if request.values.get('segmentation') in SEGMENTATION_MODES else 'manual'),
+        # people=N - групповой режим: до N человек в кадре, результаты по каждому в people
+        "people": max(0, min(read_int('people', 0), PEOPLE_MAX)),
+        # checkpoints=0 - без контрольных точек (анализ после падения начнется заново)
+        "checkpoints": form_flag('checkpoints', CHECKPOINTS_ENABLED),
+        # smoothing, hysteresis, min_rep_duration - устойчивый подсчет (см. CounterTuning)
+        **read_counter_tuning()
+    }
+    if params["segmentation"] == "auto":
+        check_auto_segmentation(params)
+    elif params["people"] > 0:
+        check_people_mode(params)
+    return params
+
+def reject_conflicts(mode: str, conflicts: Iterable[Tuple[str, bool]]):
+    """BadParameter на первый параметр, явно заданный несовместимо с режимом mode"""
+    for name, conflict in conflicts:
+        if conflict:
+            raise BadParameter(name, f"{name} is not supported with {mode}")
+
+def check_auto_segmentation(params: Dict):
+    """Автоматическая разметка идет одним проходом по всем кадрам (см. analyze_video_auto).
+
+    Явно заданные несовместимые с ней параметры - BadParameter, остальные
+    приводятся к значениям этого прохода.
+    """
+    conflicts = (
+        ("exercise_ranges", bool(params["exercise_ranges"])),
+        ("only_ranges", 'only_ranges' in request.values and params["only_ranges"]),
+        # Запрошенное число процессов, а не урезанное до PARALLEL_WORKERS
+        ("workers", read_int('workers', 1) > 1),
+        ("counting_engine", params["counting_engine"] == "vector"),
+        ("sampling", params["sampling"] == "adaptive"),
+        ("checkpoints", 'checkpoints' in request.values and params["checkpoints"]),
+        ("people", params["people"] > 0),
+        ("use_cache", not params["use_cache"])
+    )
+    reject_conflicts("segmentation=auto", conflicts)
+    params.update(only_ranges=False, workers=1, checkpoints=False)
+
+def check_people_mode(params: Dict):
+    """Групповой режим (см. analyze_video_people): один последовательный проход без кеша landmarks.
+
+    Явно заданные несовместимые с ним параметры - BadParameter, остальные
+    приводятся к значениям этого прохода.
+    """
+    conflicts = (
+        ("workers", read_int('workers', 1) > 1),
+        ("use_cache", 'use_cache' in request.values and params["use_cache"]),
+        ("counting_engine", params["counting_engine"] == "vector"),
+        ("inference_max_side", params["inference_max_side"] > 0),
+        ("sampling", params["sampling"] == "adaptive"),
+        ("export", params["export"] != "none"),
+        ("checkpoints", 'checkpoints' in request.values and params["checkpoints"])
+    )
+    reject_conflicts("people > 0", conflicts)
+    params.update(workers=1, use_cache=False, checkpoints=False)
+
+def run_analysis(input_path: str, output_path: str, params: Dict,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 recorder: Optional[StageRecorder] = None) -> Dict:
+    """Анализ с параметрами read_analysis_params: по разметке или с автоматической разметкой"""
+    params = dict(params)
+    if params.pop("segmentation") != "auto":
+        return analyze_video(input_path, output_path, progress=progress, recorder=recorder, **params)
+    auto_params = ("model_complexity", "video_hash", "render", "inference_max_side", "inference_crop",
+                   "export", "export_path", "smoothing", "hysteresis", "min_rep_duration")
+    return analyze_video_auto(input_path, output_path, progress=progress, recorder=recorder,
+                              **{name: params[name] for name in auto_params})
+
+def run_job(input_path: str, output_path: str, params: Dict,
+            progress: Callable[[int, int], None], recorder: StageRecorder) -> Tuple[Dict, Optional[str]]:
+    """Работа фоновой задачи: анализ и перенос видео и экспорта в хранилища"""
+    result = run_analysis(input_path, output_path, params, progress, recorder)
+    video_id = None
+    if result["rendered"]:
+        with recorder.time("store"):
+            video_id = store_video(output_path)
+    if result["exported"]:
+        result["export_id"] = store_export(params["export_path"])
+    return result, video_id
+
+def job_finished(job: Dict):
+    metrics.record(job["recorder"])
+    metrics.inc("jobs_total", {"outcome": job["status"]})
+
+job_manager = JobManager(JOB_WORKERS, JOB_RESULT_TTL, run_job, job_finished)
+
+def is_raw_upload() -> bool:
+    """Видео передано телом запроса (video/* или application/octet-stream)"""
+    return request.mimetype == 'application/octet-stream' or request.mimetype.startswith('video/')
+
+def has_upload() -> bool:
+    return is_raw_upload() or 'video' in request.files or 'upload_id' in request.values
+
+def unknown_upload() -> bool:
+    """Запрос ссылается на загрузку, которой нет (не было или истек срок хранения)"""
+    return 'upload_id' in request.values and stored_upload_path(request.values['upload_id']) is None
+
+def save_upload(scratch: ScratchDir, render: bool) -> Tuple[str, str]:
+    """Кладет загруженное видео в папку задачи; возвращает пути входного и выходного видео.
+
+    Поле формы video уже записано в хранилище при разборе запроса и переносится
+    без копирования, тело запроса пишется потоком кусками. Видео по upload_id
+    связывается с папкой задачи жесткой ссылкой (на другом диске - копируется),
+    поэтому истечение срока загрузки не мешает идущему анализу.
+    """
+    if 'upload_id' in request.values:
+        input_path = scratch.file("input.mp4")
+        stored_path = os.path.join(UPLOAD_DIR, f"{request.values['upload_id']}.mp4")
+        try:
+            os.link(stored_path, input_path)
+        except OSError:
+            shutil.copyfile(stored_path, input_path)
+        scratch.reserve(os.path.getsize(input_path))
+    elif is_raw_upload():
+        input_path = scratch.save_stream(request.stream, "input.mp4")
     else:
-        front_knee = right_knee
-        back_knee = left_knee
-    
-    knee_ankle_diff = abs(front_knee.x - (left_ankle.x if front_knee == left_knee else right_ankle.x))
-    
-    current_state = "down" if knee_ankle_diff < 0.1 else "up"
-    
-    if prev_state == "up" and current_state == "down":
-        counter += 1
-        prev_state = "down"
-    elif current_state == "up":
-        prev_state = "up"
-    
-    return counter, prev_state
+        input_path = scratch.adopt(request.files['video'].stream, "input.mp4")
+    if render:
+        # Размеченное видео пишет OpenCV, место под него резервируется по размеру исходного
+        scratch.reserve(os.path.getsize(input_path))
+    return input_path, scratch.file("output.mp4")
+
+def planned_frames(input_path: str, params: Dict) -> int:
+    """Сколько кадров пройдет через модель при полной выборке"""
+    info = probe_video(input_path)
+    if not params["only_ranges"]:
+        return info["total_frames"]
+    return sum(end - start + 1 for start, end, _ in range_segments(params["exercise_ranges"], info))
+
+def plan_export(scratch: ScratchDir, input_path: str, params: Dict):
+    """Путь экспорта в папке задачи и резерв места под него (landmarks всех обрабатываемых кадров)"""
+    if params["export"] == "none":
+        params["export_path"] = None
+        return
+    itemsize = np.dtype(landmark_export.LANDMARK_DTYPES[params["export"]]).itemsize
+    scratch.reserve(planned_frames(input_path, params) * (33 * 4 * itemsize + 8) + 64 * 1024)
+    params["export_path"] = scratch.file("export.npz")
+
+def check_admission():
+    """429 до чтения загрузки, если сервер уже перегружен"""
+    try:
+        admission.check()
+    except AdmissionRejected:
+        metrics.inc("admission_total", {"decision": "rejected"})
+        raise
+
+def admit_upload(input_path: str, params: Dict) -> Tuple[Dict, AdmissionTicket]:
+    """Допуск загруженного видео: параметры, пониженные под нагрузку, и билет"""
+    try:
+        params, ticket = admission.admit(params, planned_frames(input_path, params))
+    except AdmissionRejected:
+        metrics.inc("admission_total", {"decision": "rejected"})
+        raise
+    metrics.inc("admission_total", {"decision": "degraded" if ticket.degradations else "admitted"})
+    return params, ticket
 
 @app.route('/process_video', methods=['POST'])
 def process_video_api():
     """API endpoint для обработки видео"""
-    if 'video' not in request.files:
-        return jsonify({'error': 'No video file provided'}), 400
-    
-    video_file = request.files['video']
-    exercise_ranges = request.form.get('exercise_ranges', [])
-    model_complexity = int(request.form.get('model_complexity', 1))
-    
-    # Сохраняем временный файл
-    temp_dir = tempfile.mkdtemp()
-    input_path = os.path.join(temp_dir, "input.mp4")
-    output_path = os.path.join(temp_dir, "output.mp4")
-    
-    video_file.save(input_path)
-    
-    # Преобразуем exercise_ranges из строки в список кортежей
-    try:
-        exercise_ranges = eval(exercise_ranges) if exercise_ranges else []
-    except:
-        exercise_ranges = []
-    
-    # Обработка видео
-    cap = cv2.VideoCapture(input_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-    
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    processed_frames = 0
+    global inflight_requests
     start_time = time.time()
-    
-    # Переводим интервалы из секунд в номера кадров
-    exercise_ranges_frames = [
-        (int(start * fps), int(end * fps), ex_type)
-        for start, end, ex_type in exercise_ranges
-    ]
-    
-    # Счетчики для упражнений
-    exercise_types = ["Отжимания", "Приседания", "Подтягивания", "Планка", "Выпады"]
-    exercise_stats = {ex_type: {"count": 0, "time": 0} for ex_type in exercise_types}
-    current_exercise = None
-    current_range_index = 0
-    
-    exercise_states = {
-        "Отжимания": {"prev_state": "up", "counter": 0},
-        "Приседания": {"prev_state": "up", "counter": 0},
-        "Подтягивания": {"prev_state": "down", "counter": 0},
-        "Планка": {"start_time": time.time(), "duration": 0},
-        "Выпады": {"prev_state": "up", "counter": 0}
-    }
-    
-    custom_drawing_spec = mp_drawing.DrawingSpec(
-        color=DEFAULT_LANDMARK_COLOR, thickness=2, circle_radius=2)
-    custom_connection_spec = mp_drawing.DrawingSpec(
-        color=DEFAULT_CONNECTION_COLOR, thickness=2)
-    
-    with mp_pose.Pose(
-        model_complexity=model_complexity,
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5) as pose:
-        
-        while cap.isOpened():
-            success, frame = cap.read()
-            if not success:
-                break
+    recorder = StageRecorder()
+    check_admission()
+    with recorder.time("upload"):
+        if not has_upload():
+            return jsonify({'error': 'No video file provided'}), 400
+    if unknown_upload():
+        return jsonify({'error': 'Unknown upload'}), 404
+    params = read_analysis_params()
+    
+    with inflight_lock:
+        inflight_requests += 1
+    outcome = "error"
+    try:
+        # Папка задачи удаляется при выходе из with, в том числе при ошибке
+        with scratch_storage.allocate() as scratch:
+            with recorder.time("upload"):
+                input_path, output_path = save_upload(scratch, params["render"])
+            params, ticket = admit_upload(input_path, params)
+            with ticket:
+                plan_export(scratch, input_path, params)
+                result = run_analysis(input_path, output_path, params, recorder=recorder)
+                video_id = None
+                if result['rendered']:
+                    with recorder.time("store"):
+                        video_id = store_video(output_path)
+                if result['exported']:
+                    result['export_id'] = store_export(params["export_path"])
+        outcome = "done"
+    finally:
+        with inflight_lock:
+            inflight_requests -= 1
+        recorder.observe("request", time.time() - start_time)
+        metrics.record(recorder)
+        metrics.inc("requests_total", {"outcome": outcome})
+    
+    return jsonify(result_response(result, time.time() - start_time, video_id, recorder, ticket))
 
-            if current_range_index < len(exercise_ranges_frames):
-                start_frame, end_frame, ex_type = exercise_ranges_frames[current_range_index]
-                
-                if start_frame <= processed_frames <= end_frame:
-                    current_exercise = ex_type
-                    exercise_stats[ex_type]["time"] += 1 / fps
-                elif processed_frames > end_frame:
-                    current_range_index += 1
-                    current_exercise = None
-            
-            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = pose.process(image)
-            
-            if results.pose_landmarks:
-                if current_exercise == "Отжимания":
-                    exercise_states["Отжимания"]["counter"], exercise_states["Отжимания"]["prev_state"] = count_pushups(
-                        results.pose_landmarks,
-                        exercise_states["Отжимания"]["prev_state"],
-                        exercise_states["Отжимания"]["counter"]
-                    )
-                    exercise_stats["Отжимания"]["count"] = exercise_states["Отжимания"]["counter"]
-                
-                elif current_exercise == "Приседания":
-                    exercise_states["Приседания"]["counter"], exercise_states["Приседания"]["prev_state"] = count_squats(
-                        results.pose_landmarks,
-                        exercise_states["Приседания"]["prev_state"],
-                        exercise_states["Приседания"]["counter"]
-                    )
-                    exercise_stats["Приседания"]["count"] = exercise_states["Приседания"]["counter"]
-                
-                elif current_exercise == "Подтягивания":
-                    exercise_states["Подтягивания"]["counter"], exercise_states["Подтягивания"]["prev_state"] = count_pullups(
-                        results.pose_landmarks,
-                        exercise_states["Подтягивания"]["prev_state"],
-                        exercise_states["Подтягивания"]["counter"]
-                    )
-                    exercise_stats["Подтягивания"]["count"] = exercise_states["Подтягивания"]["counter"]
-                
-                elif current_exercise == "Планка":
-                    exercise_states["Планка"]["duration"] = count_plank(
-                        results.pose_landmarks,
-                        exercise_states["Планка"]["start_time"],
-                        exercise_states["Планка"]["duration"]
-                    )
-                    exercise_stats["Планка"]["time"] = exercise_states["Планка"]["duration"]
-                
-                elif current_exercise == "Выпады":
-                    exercise_states["Выпады"]["counter"], exercise_states["Выпады"]["prev_state"] = count_lunges(
-                        results.pose_landmarks,
-                        exercise_states["Выпады"]["prev_state"],
-                        exercise_states["Выпады"]["counter"]
-                    )
-                    exercise_stats["Выпады"]["count"] = exercise_states["Выпады"]["counter"]
-                
-                mp_drawing.draw_landmarks(
-                    image,
-                    results.pose_landmarks,
-                    mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=custom_drawing_spec,
-                    connection_drawing_spec=custom_connection_spec
-                )
-                
-                display_text = current_exercise if current_exercise else "No exercise"
-                cv2.putText(image, f"Exercise: {display_text}", (10, 30),
-                      cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            
-            out.write(cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
-            processed_frames += 1
-    
-    cap.release()
-    out.release()
-    
-    # Читаем результат и удаляем временные файлы
-    with open(output_path, 'rb') as f:
-        video_data = f.read()
+@app.route('/jobs', methods=['POST'])
+def submit_job_api():
+    """Ставит видео в очередь на анализ и сразу возвращает идентификатор задачи"""
+    recorder = StageRecorder()
+    check_admission()
+    with recorder.time("upload"):
+        if not has_upload():
+            return jsonify({'error': 'No video file provided'}), 400
+    if unknown_upload():
+        return jsonify({'error': 'Unknown upload'}), 404
+    params = read_analysis_params()
+    
+    # Папку и билет дальше ведет задача: они освобождаются в JobManager._run по выходе из with
+    scratch = scratch_storage.allocate()
+    ticket = None
+    try:
+        with recorder.time("upload"):
+            input_path, output_path = save_upload(scratch, params["render"])
+        params, ticket = admit_upload(input_path, params)
+        plan_export(scratch, input_path, params)
+    except Exception:
+        scratch.release()
+        if ticket is not None:
+            ticket.release()
+        raise
+    job_id = job_manager.submit(scratch, ticket, input_path, output_path, params, recorder)
     
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/jobs/{job_id}',
+        'result_url': f'/jobs/{job_id}/result',
+        'admission': ticket.summary()
+    }), 202
+
+@app.route('/uploads', methods=['POST'])
+def upload_api():
+    """Сохраняет видео для анализа по ссылке: /jobs и /process_video принимают upload_id вместо файла"""
+    if not (is_raw_upload() or 'video' in request.files):
+        return jsonify({'error': 'No video file provided'}), 400
+    with scratch_storage.allocate() as scratch:
+        input_path, _ = save_upload(scratch, False)
+        size = os.path.getsize(input_path)
+        upload_id, existed = store_upload(input_path)
+    return jsonify({
+        'upload_id': upload_id,
+        'upload_url': f'/uploads/{upload_id}',
+        'size': size
+    }), 200 if existed else 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status_api(upload_id):
+    """Есть ли загрузка (клиент проверяет по своему хешу, прежде чем передавать видео)"""
+    path = stored_upload_path(upload_id)
+    if path is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    return jsonify({'upload_id': upload_id, 'size': os.path.getsize(path), 'ttl': UPLOAD_TTL})
+
+@app.route('/batches', methods=['POST'])
+def submit_batch_api():
+    """Пакетный анализ по манифесту (CSV/JSONL телом запроса или полем manifest).
+
+    Видео в манифесте - пути относительно BATCH_ROOT на сервере или upload_id из /uploads.
+    """
+    if 'manifest' in request.files:
+        manifest = request.files['manifest'].read().decode('utf-8')
+    else:
+        manifest = request.get_data(as_text=True)
+    try:
+        items = parse_manifest(manifest)
+    except ManifestError as e:
+        return jsonify({'error': str(e)}), 400
+    if not items:
+        return jsonify({'error': 'Manifest is empty'}), 400
+    for item in items:
+        path = resolve_batch_video(item["video"])
+        if path is None:
+            return jsonify({'error': f'Unknown video {item["video"]}'}), 400
+        item["video"] = path
+    
+    batch_id = batch_manager.submit(manifest, items)
+    return jsonify({
+        'batch_id': batch_id,
+        'status_url': f'/batches/{batch_id}',
+        'result_url': f'/batches/{batch_id}/results'
+    }), 202
+
+@app.route('/batches/<batch_id>', methods=['GET'])
+def batch_status_api(batch_id):
+    """Прогресс пакета, а после завершения - пропускная способность (минут видео на минуту работы)"""
+    status = batch_manager.status(batch_id) if re.fullmatch(r'[0-9a-f]{32}', batch_id) else None
+    if status is None:
+        return jsonify({'error': 'Unknown batch'}), 404
+    return jsonify(status)
+
+@app.route('/batches/<batch_id>/results', methods=['GET'])
+def batch_results_api(batch_id):
+    """Сводная таблица пакета (CSV): статистика, процент и оценка по плану для каждого видео"""
+    status = batch_manager.status(batch_id) if re.fullmatch(r'[0-9a-f]{32}', batch_id) else None
+    if status is None:
+        return jsonify({'error': 'Unknown batch'}), 404
+    if status["status"] != "done":
+        return jsonify(status), 409 if status["status"] == "running" else 500
+    return send_file(batch_manager.paths(batch_id)[1], mimetype='text/csv', as_attachment=True,
+                     download_name=f"batch_{batch_id}.csv")
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status_api(job_id):
+    """Прогресс задачи: обработано/всего кадров и оценка оставшегося времени"""
+    status = job_manager.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result_api(job_id):
+    """Результат готовой задачи: статистика и ссылка на размеченное видео"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job["status"] == "error":
+        return jsonify({'error': job["error"]}), 500
+    if job["status"] != "done":
+        return jsonify(job_manager.status(job_id)), 409
+    
+    return jsonify(result_response(job["result"], job["finished_at"] - job["started_at"], job["video_id"],
+                                   job["recorder"], job["admission"]))
+
+@app.route('/videos/<video_id>', methods=['GET'])
+def video_api(video_id):
+    """Размеченное видео потоком video/mp4 с поддержкой HTTP Range"""
+    path = os.path.join(VIDEO_DIR, f"{video_id}.mp4")
+    if not re.fullmatch(r'[0-9a-f]{32}', video_id) or not os.path.exists(path):
+        return jsonify({'error': 'Unknown video'}), 404
+    return send_file(path, mimetype='video/mp4', conditional=True)
+
+@app.route('/exports/<export_id>', methods=['GET'])
+def export_api(export_id):
+    """Экспорт landmarks и повторений (.npz, читается landmark_export.read_export)"""
+    path = os.path.join(EXPORT_DIR, f"{export_id}.npz")
+    if not re.fullmatch(r'[0-9a-f]{32}', export_id) or not os.path.exists(path):
+        return jsonify({'error': 'Unknown export'}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{export_id}.npz", conditional=True)
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats_api():
+    """Попадания/промахи и размер кеша landmarks"""
+    return jsonify(landmark_cache.stats())
+
+def resolve_live_source(source: str) -> Optional[str]:
+    """Источник сессии: номер камеры или путь внутри LIVE_SOURCE_ROOT; иначе None"""
+    if source.isascii() and source.isdigit():
+        return source
+    if not LIVE_SOURCE_ROOT:
+        return None
+    root = os.path.realpath(LIVE_SOURCE_ROOT)
+    path = os.path.realpath(os.path.join(root, source))
+    if os.path.commonpath([root, path]) != root or not os.path.exists(path):
+        return None
+    return path
+
+@app.route('/live/sessions', methods=['POST'])
+def live_session_create_api():
+    """Открывает онлайн-сессию подсчета; source - номер камеры или файл/pipe внутри LIVE_SOURCE_ROOT"""
+    exercises = read_live_exercises()
+    if exercises is None:
+        return jsonify({'error': f'exercise must be one of {EXERCISE_TYPES}'}), 400
+    source = request.form.get('source') or None
+    if source is not None:
+        # Один ответ на любой отклоненный источник: по нему не узнать, есть ли файл
+        source = resolve_live_source(source)
+        if source is None:
+            return jsonify({'error': 'Source not allowed; push frames to frames_url instead'}), 400
+    
+    tuning = read_counter_tuning()
+    model_complexity = read_model_complexity()
     try:
-        os.remove(input_path)
-        os.remove(output_path)
-        os.rmdir(temp_dir)
+        session = live_sessions.create(exercises, model_complexity, source,
+                                       CounterTuning(tuning["smoothing"], tuning["hysteresis"],
+                                                     tuning["min_rep_duration"]))
     except Exception as e:
-        print(f"Ошибка очистки: {str(e)}")
+        return jsonify({'error': f'Pose model is not available: {e}'}), 503
+    if session is None:
+        return jsonify({'error': 'Too many live sessions'}), 429
+    base = f'/live/sessions/{session.id}'
+    return jsonify({
+        'session_id': session.id,
+        'frames_url': f'{base}/frames',
+        'stream_url': f'{base}/stream',
+        'events_url': f'{base}/events',
+        'state_url': base
+    }), 201
+
+@app.route('/live/sessions/<session_id>/frames', methods=['POST'])
+def live_frame_api(session_id):
+    """Принимает JPEG кадр (тело запроса или поле frame) и сразу возвращает текущие счетчики"""
+    received_at = time.time()
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    data = request.files['frame'].read() if 'frame' in request.files else request.get_data()
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) if data else None
+    if frame is None:
+        return jsonify({'error': 'Frame is not a valid image'}), 400
+    if not session.push(frame, received_at):
+        return jsonify(session.state()), 409
+    return jsonify(session.state()), 202
+
+@app.route('/live/sessions/<session_id>/exercise', methods=['POST'])
+def live_exercise_api(session_id):
+    """Меняет текущее упражнение сессии"""
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    exercises = read_live_exercises()
+    if exercises is None:
+        return jsonify({'error': f'exercise must be one of {EXERCISE_TYPES}'}), 400
+    session.set_exercises(exercises)
+    return jsonify(session.state())
+
+@app.route('/live/sessions/<session_id>', methods=['GET'])
+def live_state_api(session_id):
+    """Счетчики, число пропущенных кадров и задержка сессии"""
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    session.touch()
+    return jsonify(session.state())
+
+@app.route('/live/sessions/<session_id>', methods=['DELETE'])
+def live_close_api(session_id):
+    """Закрывает сессию и возвращает итоговые счетчики"""
+    session = live_sessions.remove(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    return jsonify(session.state())
+
+@app.route('/live/sessions/<session_id>/stream', methods=['GET'])
+def live_stream_api(session_id):
+    """Размеченные кадры сессии потоком MJPEG (multipart/x-mixed-replace)"""
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    
+    def generate():
+        seq = 0
+        while True:
+            new_seq, jpeg = session.wait_frame(seq)
+            if new_seq > seq and jpeg is not None:
+                seq = new_seq
+                yield (b'--frame\r\nContent-Type: image/jpeg\r\n'
+                       b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+            elif session.status != "running":
+                break
     
-    # Убираем упражнения с нулевыми счетчиками
-    filtered_stats = {
-        ex: stats for ex, stats in exercise_stats.items()
-        if stats["count"] > 0 or stats["time"] > 0
-    }
+    return app.response_class(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/live/sessions/<session_id>/events', methods=['GET'])
+def live_events_api(session_id):
+    """Счетчики сессии потоком Server-Sent Events после каждого обработанного кадра"""
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    
+    def generate():
+        seq = 0
+        while True:
+            new_seq, _ = session.wait_frame(seq)
+            running = session.status == "running"
+            if new_seq > seq or not running:
+                seq = new_seq
+                yield f"data: {json.dumps(session.state(), ensure_ascii=False)}\n\n"
+            if not running:
+                break
     
-    return jsonify({
-        'processing_time': time.time() - start_time,
-        'exercise_stats': filtered_stats,
-        'video': video_data.decode('latin1')
-    })
+    return app.response_class(generate(), mimetype='text/event-stream')
+
+@app.route('/scratch/stats', methods=['GET'])
+def scratch_stats_api():
+    """Занятое временное место и квоты"""
+    return jsonify(scratch_storage.stats())
+
+@app.errorhandler(BadParameter)
+def bad_parameter_error(e):
+    """400 с именем поля, которое не разбирается"""
+    return jsonify({'error': str(e), 'field': e.field}), 400
+
+@app.errorhandler(ScratchQuotaError)
+def scratch_quota_error(e):
+    """413 - загрузка или задача больше своей квоты, 507 - временное место закончилось"""
+    return jsonify({'error': str(e)}), e.status
+
+@app.route('/admission/stats', methods=['GET'])
+def admission_stats_api():
+    """Бюджет кадров в работе, загрузка CPU и текущее давление"""
+    return jsonify(admission.stats())
+
+@app.errorhandler(AdmissionRejected)
+def admission_rejected_error(e):
+    """429 с Retry-After, когда нагрузка выше ADMISSION_SHED_AT"""
+    return (jsonify({'error': str(e), 'retry_after': e.retry_after, 'pressure': round(e.pressure, 3)}),
+            429, {'Retry-After': str(e.retry_after)})
+
+@app.errorhandler(413)
+def request_too_large_error(e):
+    return jsonify({'error': f'Upload exceeds {SCRATCH_MAX_UPLOAD_BYTES} bytes'}), 413
+
+@app.route('/metrics', methods=['GET'])
+def metrics_api():
+    """Метрики в текстовом формате Prometheus"""
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/ready', methods=['GET'])
+def ready_api():
+    """Готовность API: 200, когда пул моделей прогрет, иначе 503"""
+    pose_pool.warm_async()
+    status = pose_pool.status()
+    return jsonify(status), 200 if status["ready"] else 503
 
 if __name__ == '__main__':
+    pose_pool.warm_async()
+    scratch_storage.start_reaper()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -4,7 +4,11 @@ import os
 import requests
 import pandas as pd
 import cv2
-from typing import Dict 
+import time
+import hashlib
+from collections import OrderedDict
+
+from grading import PLANS, calculate_workout_score, plan_steps
 
 # Настройки Streamlit
 st.set_page_config(
@@ -17,87 +21,28 @@ st.set_page_config(
 # Глобальные переменные
 if 'exercise_ranges' not in st.session_state:
     st.session_state.exercise_ranges = []
+    # Уверенность автоматической разметки по отрезку и версия таблицы разметки
+    # (новая версия - новая таблица, без правок, сделанных в старой)
+    st.session_state.range_confidence = {}
+    st.session_state.ranges_version = 0
     
 exercise_types = ["Отжимания", "Приседания", "Подтягивания", "Планка", "Выпады"]
 
-def calculate_workout_score(plan_name: str, stats_df: pd.DataFrame) -> Dict:
-    """Рассчитывает процент выполнения и оценку тренировки"""
-    plan_stats = {
-        "Новичок – 1 круг": {
-            "Отжимания": 10,
-            "Приседания": 20,
-            "Планка": 30 
-        },
-        "Классика – 2 круга": {
-            "Отжимания": 15,
-            "Приседания": 30,
-            "Подтягивания": 10,
-            "Планка": 45
-        },
-        "Полная тренировка": {
-            "Отжимания": 20,
-            "Приседания": 30,
-            "Подтягивания": 15,
-            "Планка": 60,
-            "Выпады": 20
-        },
-        "Силовая": {
-            "Отжимания": 30,
-            "Подтягивания": 20,
-            "Планка": 90
-        },
-        "Ноги и корпус": {
-            "Приседания": 40,
-            "Выпады": 30,
-            "Планка": 60
-        }
-    }
-    
-    if plan_name not in plan_stats:
-        return {"error": "Unknown plan"}
-    
-    results = {}
-    total_percent = 0
-    exercise_count = 0
-    
-    for exercise, target in plan_stats[plan_name].items():
-        # Для планки учитываем время, для остальных - количество
-        if exercise == "Планка":
-            actual = stats_df.loc[exercise, "Время (сек)"] if exercise in stats_df.index else 0
-        else:
-            actual = stats_df.loc[exercise, "Количество"] if exercise in stats_df.index else 0
-        
-        percent = min(100, round((actual / target) * 100)) if target > 0 else 0
-        results[exercise] = {
-            "target": target,
-            "actual": actual,
-            "percent": percent
-        }
-        total_percent += percent
-        exercise_count += 1
-    
-    if exercise_count > 0:
-        overall_percent = total_percent / exercise_count
-        # Оценка от 1 до 5
-        if overall_percent >= 90:
-            grade = "5 (Отлично)"
-        elif overall_percent >= 70:
-            grade = "4 (Хорошо)"
-        elif overall_percent >= 50:
-            grade = "3 (Удовлетворительно)"
-        elif overall_percent >= 30:
-            grade = "2 (Плохо)"
-        else:
-            grade = "1 (Очень плохо)"
-    else:
-        overall_percent = 0
-        grade = "Нет данных"
-    
-    return {
-        "exercises": results,
-        "overall_percent": overall_percent,
-        "grade": grade
-    }
+API_URL = os.environ.get("API_URL", "http://localhost:5000")
+# Таймауты запросов к API: (подключение, ответ) в секундах
+UPLOAD_TIMEOUT = (5, 300)
+POLL_TIMEOUT = (5, 30)
+POLL_INTERVAL = 1.0
+# Период обновления счетчиков в онлайн-режиме (сек)
+LIVE_REFRESH_INTERVAL = 0.5
+# Устойчивый подсчет для дрожащих landmarks (лёгкая модель, низкий fps): сглаживание,
+# полоса гистерезиса порогов и минимальная длительность повторения (сек)
+STABLE_COUNTING = {'smoothing': 'one_euro', 'hysteresis': 0.02, 'min_rep_duration': 0.3}
+# Кеш клиента по хешу видео: сколько описаний видео и результатов анализа держать
+# и сколько секунд результат годен (ссылки на видео с разметкой живут на сервере час)
+PROBE_CACHE_SIZE = 32
+RESULT_CACHE_SIZE = 8
+RESULT_CACHE_TTL = 3600
 
 def show_workout_summary(plan_name: str, stats_df: pd.DataFrame):
     """Показывает сводку выполнения плана тренировки"""
@@ -142,16 +87,156 @@ def show_workout_summary(plan_name: str, stats_df: pd.DataFrame):
     else:
         st.error("💪 Слишком мало! Вам нужно серьезнее подойти к тренировке!")
 
-def extract_exercise_ranges(video_path: str) -> list:
+def ensure_uploaded(video: dict) -> str:
+    """upload_id видео на сервере; файл передается, только если сервер его еще не видел или уже удалил"""
+    if requests.get(f"{API_URL}/uploads/{video['hash']}", timeout=POLL_TIMEOUT).status_code == 200:
+        return video['hash']
+    # Файл уходит телом запроса, без сборки multipart
+    video['file'].seek(0)
+    response = requests.post(f'{API_URL}/uploads', data=video['file'], timeout=UPLOAD_TIMEOUT,
+                             headers={'Content-Type': 'application/octet-stream'})
+    response.raise_for_status()
+    return response.json()['upload_id']
+
+def run_analysis_job(video: dict, exercise_ranges: list, model_complexity: int = 1,
+                     render: bool = False, export: str = "none",
+                     stable_counting: bool = False, people: int = 0,
+                     segmentation: str = "manual", only_ranges: bool = True) -> requests.Response:
+    """Ставит видео в очередь API по upload_id и ждет результат, показывая прогресс"""
+    params = {
+        'upload_id': ensure_uploaded(video),
+        'exercise_ranges': str(exercise_ranges),
+        'model_complexity': model_complexity,
+        'render': int(render),
+        'export': export,
+        'people': people,
+        'segmentation': segmentation,
+        'only_ranges': int(only_ranges)
+    }
+    if stable_counting:
+        params.update(STABLE_COUNTING)
+    response = requests.post(f'{API_URL}/jobs', params=params, timeout=UPLOAD_TIMEOUT)
+    if response.status_code != 202:
+        return response
+    
+    job = response.json()
+    progress_bar = st.progress(0.0, text="⏳ Видео в очереди на анализ...")
+    while True:
+        status = requests.get(f"{API_URL}{job['status_url']}", timeout=POLL_TIMEOUT).json()
+        if status["status"] in ("done", "error"):
+            break
+        if status["status"] == "running":
+            text = f"⏳ Анализ упражнений: {status['processed_frames']} из {status['total_frames']} кадров"
+            if status["eta"] is not None:
+                text += f", осталось ~{status['eta']:.0f} сек"
+            progress_bar.progress(min(status["progress"], 1.0), text=text)
+        time.sleep(POLL_INTERVAL)
+    progress_bar.empty()
+    
+    return requests.get(f"{API_URL}{job['result_url']}", timeout=UPLOAD_TIMEOUT)
+
+def receive_result(response: requests.Response):
+    """Результат анализа из ответа API (с файлом экспорта) или None с сообщением об ошибке"""
+    if response.status_code == 200:
+        result = response.json()
+        if result.get('export_url'):
+            # Экспорт скачивается один раз и хранится вместе с результатом
+            result['export_data'] = requests.get(f"{API_URL}{result['export_url']}",
+                                                 timeout=UPLOAD_TIMEOUT).content
+        return result
+    if response.status_code == 429:
+        st.error(f"⏳ Сервер перегружен, повторите через {response.headers.get('Retry-After', '?')} сек")
+    else:
+        st.error(f"Ошибка API: {response.text}")
+    return None
+
+def save_uploaded_video(uploaded_file) -> dict:
+    """SHA-256 загрузки, посчитанный один раз на загруженный файл, а не на каждый перезапуск скрипта.
+
+    Ключ - file_id загрузки Streamlit: другой файл с тем же именем и размером
+    получает свой хеш, а значит, и свои upload_id и результаты в кеше.
+    """
+    saved = st.session_state.get("uploaded_video")
+    if not saved or saved["key"] != uploaded_file.file_id:
+        digest = hashlib.sha256()
+        uploaded_file.seek(0)
+        for chunk in iter(lambda: uploaded_file.read(1024 * 1024), b""):
+            digest.update(chunk)
+        saved = {"key": uploaded_file.file_id, "hash": digest.hexdigest()}
+        st.session_state.uploaded_video = saved
+    return dict(saved, file=uploaded_file)
+
+@st.cache_data(max_entries=PROBE_CACHE_SIZE)
+def probe_video(video_hash: str, _uploaded_file) -> dict:
+    """fps и число кадров; кешируется по хешу содержимого (файл в ключ не входит).
+
+    OpenCV читает только файлы, поэтому загрузка пишется во временную папку,
+    которая удаляется сразу после чтения.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, "input.mp4")
+        _uploaded_file.seek(0)
+        with open(input_path, "wb") as f:
+            for chunk in iter(lambda: _uploaded_file.read(1024 * 1024), b""):
+                f.write(chunk)
+        cap = cv2.VideoCapture(input_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+    return {"fps": fps, "total_frames": total_frames}
+
+def result_cache_key(video_hash: str, exercise_ranges: list, options: dict) -> tuple:
+    """Ключ результата: то же видео с той же разметкой и параметрами дает тот же результат"""
+    return video_hash, tuple(map(tuple, exercise_ranges)), tuple(sorted(options.items()))
+
+def cached_result(key: tuple):
+    """Результат из кеша сессии или None; устаревшие результаты вытесняются"""
+    cache = st.session_state.setdefault("result_cache", OrderedDict())
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if time.time() - entry["cached_at"] > RESULT_CACHE_TTL:
+        del cache[key]
+        return None
+    cache.move_to_end(key)
+    return entry["result"]
+
+def remember_result(key: tuple, result: dict):
+    """Кладет результат в кеш сессии, вытесняя самые давно использованные сверх RESULT_CACHE_SIZE"""
+    cache = st.session_state.setdefault("result_cache", OrderedDict())
+    cache[key] = {"result": result, "cached_at": time.time()}
+    cache.move_to_end(key)
+    while len(cache) > RESULT_CACHE_SIZE:
+        cache.popitem(last=False)
+
+def reset_ranges(exercise_ranges: list, confidence: dict = None):
+    """Новая разметка: таблица строится заново, правки старой таблицы отбрасываются"""
+    st.session_state.exercise_ranges = exercise_ranges
+    st.session_state.edited_ranges = exercise_ranges
+    st.session_state.range_confidence = confidence or {}
+    st.session_state.ranges_version += 1
+
+def parse_edited_ranges(df_ranges: pd.DataFrame) -> list:
+    """Отрезки из таблицы разметки; пустые и неверные строки пропускаются"""
+    ranges = []
+    for row in df_ranges.itertuples(index=False):
+        start, end, exercise_type = row[0], row[1], row[2]
+        if pd.isna(start) or pd.isna(end) or exercise_type not in exercise_types:
+            continue
+        if start >= end:
+            st.warning(f"Интервал {exercise_type} {start:.2f} - {end:.2f} сек пропущен: начало не меньше конца")
+            continue
+        ranges.append((float(start), float(end), exercise_type))
+    return ranges
+
+def extract_exercise_ranges(video: dict) -> list:
     """Форма для ввода временных отрезков для каждого упражнения"""
     st.subheader("📝 Разметка упражнений")
     
-    # Получаем длительность видео
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = total_frames / fps
-    cap.release()
+    # Длительность видео из кеша: перезапуск скрипта не открывает файл заново
+    info = probe_video(video["hash"], video["file"])
+    total_frames = info["total_frames"]
+    duration = total_frames / info["fps"]
     
     st.info(f"Длительность видео: {duration:.2f} сек ({total_frames} кадров)")
     
@@ -166,30 +251,55 @@ def extract_exercise_ranges(video_path: str) -> list:
     with col4:
         if st.button("Добавить интервал"):
             if start_sec < end_sec:
-                st.session_state.exercise_ranges.append((start_sec, end_sec, exercise_type))
+                # Интервал добавляется к разметке вместе с правками в таблице
+                base = st.session_state.get("edited_ranges", st.session_state.exercise_ranges)
+                reset_ranges(base + [(start_sec, end_sec, exercise_type)], st.session_state.range_confidence)
                 st.success(f"Интервал для {exercise_type}: {start_sec:.2f} сек - {end_sec:.2f} сек добавлен")
             else:
                 st.error("Время начала должно быть меньше времени конца")
     
     st.subheader("📋 Текущая разметка")
     if st.session_state.exercise_ranges:
+        # Разметку можно править прямо в таблице: менять время и упражнение, удалять и добавлять строки.
+        # У отрезков автоматической разметки показана уверенность классификатора
+        confidence = st.session_state.range_confidence
         df_ranges = pd.DataFrame(
             st.session_state.exercise_ranges,
             columns=["Начало (сек)", "Конец (сек)", "Тип упражнения"]
         )
-        df_ranges["Длительность (сек)"] = df_ranges["Конец (сек)"] - df_ranges["Начало (сек)"]
-        st.dataframe(df_ranges)
+        df_ranges["Уверенность"] = [confidence.get(tuple(r)) for r in st.session_state.exercise_ranges]
+        edited = st.data_editor(
+            df_ranges,
+            key=f"ranges_{st.session_state.ranges_version}",
+            num_rows="dynamic",
+            hide_index=True,
+            disabled=["Уверенность"],
+            column_config={
+                "Начало (сек)": st.column_config.NumberColumn(min_value=0.0, max_value=float(duration), step=0.1),
+                "Конец (сек)": st.column_config.NumberColumn(min_value=0.0, max_value=float(duration), step=0.1),
+                "Тип упражнения": st.column_config.SelectboxColumn(options=exercise_types, required=True),
+                "Уверенность": st.column_config.ProgressColumn(min_value=0.0, max_value=1.0, format="%.2f")
+            }
+        )
+        st.session_state.edited_ranges = parse_edited_ranges(edited)
         if st.button("❌ Очистить разметку"):
-            st.session_state.exercise_ranges = []
+            reset_ranges([])
             st.rerun()
     else:
-        st.info("Интервалы для упражнений еще не заданы")
+        st.session_state.edited_ranges = []
+        st.info("Интервалы для упражнений еще не заданы или разметьте видео автоматически")
     
-    return st.session_state.exercise_ranges
+    return st.session_state.edited_ranges
 
 def show_results(result: dict, plan_name: str):
     """Отображение результатов анализа"""
     st.success(f"✅ Анализ завершен за {result['processing_time']:.2f} сек")
+    admission = result.get('admission') or {}
+    if admission.get('degradations'):
+        # Понижения из-за нагрузки сервера показываются, чтобы оценку можно было перепроверить
+        changes = "; ".join(f"{d['reason']} ({d['param']}: {d['requested']} → {d['applied']})"
+                            for d in admission['degradations'])
+        st.warning(f"⚠️ Сервер был загружен, анализ выполнен с упрощениями: {changes}")
     st.markdown("---")
     
     st.subheader("📊 Результаты анализа")
@@ -217,6 +327,98 @@ def show_results(result: dict, plan_name: str):
             st.caption("Время выполнения (сек)")
     else:
         st.warning("⛔ Упражнения не были распознаны или не выполнены.")
+    
+    if result.get('people'):
+        # Групповая запись: выше - человек, найденный дольше всех, здесь - все
+        st.subheader("👥 Результаты по участникам")
+        rows = [
+            {"Участник": f"#{person['id']}", "Упражнение": ex,
+             "Количество": stats["count"], "Время (сек)": round(stats["time"], 1),
+             "В кадре (сек)": f"{person['first_time']:.1f}–{person['last_time']:.1f}"}
+            for person in result['people'] for ex, stats in person['exercise_stats'].items()
+        ]
+        st.dataframe(pd.DataFrame(rows), hide_index=True)
+    
+    if result.get('video_url'):
+        st.subheader("🎥 Видео с разметкой")
+        st.video(f"{API_URL}{result['video_url']}")
+
+def show_live_view(plan_name: str):
+    """Онлайн-подсчет: размеченное видео MJPEG-потоком и счетчики по мере выполнения"""
+    st.subheader("📡 Онлайн-подсчет повторений")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        exercise = st.selectbox("Упражнение", exercise_types, key="live_exercise")
+    with col2:
+        source_kind = st.radio("Откуда кадры", ["Камера этого компьютера", "Источник на сервере API"],
+                               key="live_source_kind")
+    # Камера сервера API - не камера пользователя: источник на сервере задается только явно
+    source = None
+    if source_kind == "Источник на сервере API":
+        source = st.text_input("Номер камеры сервера API или путь к файлу/pipe на сервере",
+                               value="", key="live_source").strip() or None
+    
+    session_id = st.session_state.get("live_session_id")
+    if session_id is None:
+        if st.button("▶️ НАЧАТЬ", use_container_width=True):
+            if source_kind == "Источник на сервере API" and source is None:
+                st.error("Укажите источник на сервере API")
+                return
+            data = {"exercise": exercise}
+            if source is not None:
+                data["source"] = source
+            response = requests.post(f"{API_URL}/live/sessions", timeout=POLL_TIMEOUT, data=data)
+            if response.status_code != 201:
+                st.error(f"Ошибка API: {response.text}")
+                return
+            st.session_state.live_session_id = response.json()["session_id"]
+            st.session_state.live_pushed = source is None
+            st.rerun()
+        return
+    
+    session_url = f"{API_URL}/live/sessions/{session_id}"
+    if st.session_state.get("live_pushed"):
+        # Браузер не отдает поток камеры серверу: кадры отправляет клиент на этом компьютере
+        st.info("Запустите на компьютере с камерой отправку кадров в сессию:")
+        st.code(f"python live_client.py 0 --session {session_id} --api {API_URL}", language="bash")
+    if st.button("⏹️ ОСТАНОВИТЬ", use_container_width=True):
+        del st.session_state.live_session_id
+        response = requests.delete(session_url, timeout=POLL_TIMEOUT)
+        if response.status_code == 200 and response.json()["exercise_stats"]:
+            stats_df = pd.DataFrame.from_dict(response.json()["exercise_stats"], orient='index')
+            stats_df.columns = ["Количество", "Время (сек)"]
+            st.dataframe(stats_df)
+            show_workout_summary(plan_name, stats_df)
+        else:
+            st.warning("⛔ Упражнения не были распознаны или не выполнены.")
+        return
+    
+    # Смена упражнения в selectbox перезапускает скрипт, сессия продолжает счет
+    requests.post(f"{session_url}/exercise", data={"exercise": exercise}, timeout=POLL_TIMEOUT)
+    st.markdown(f'<img src="{session_url}/stream" style="width: 100%">', unsafe_allow_html=True)
+    
+    placeholder = st.empty()
+    while True:
+        response = requests.get(session_url, timeout=POLL_TIMEOUT)
+        if response.status_code != 200:
+            del st.session_state.live_session_id
+            st.error("Сессия закрыта сервером")
+            return
+        state = response.json()
+        with placeholder.container():
+            col1, col2, col3 = st.columns(3)
+            stats = state["exercise_stats"].get(exercise, {"count": 0, "time": 0})
+            if exercise == "Планка":
+                col1.metric(exercise, f"{stats['time']:.0f} сек")
+            else:
+                col1.metric(exercise, stats["count"])
+            col2.metric("Задержка", f"{state['latency_ms']['last'] or 0:.0f} мс")
+            col3.metric("Пропущено кадров", state["dropped_frames"])
+        if state["status"] != "running":
+            st.info("Источник кадров закончился. Нажмите «Остановить», чтобы увидеть итог.")
+            return
+        time.sleep(LIVE_REFRESH_INTERVAL)
 
 # Интерфейс приложения
 st.title("🏋️ Физкультура онлайн")
@@ -224,36 +426,7 @@ st.title("🏋️ Физкультура онлайн")
 # Программы тренировок
 st.subheader("🧩 Выберите план тренировки")
 
-plans = {
-    "Новичок – 1 круг": [
-        "10 отжиманий",
-        "20 приседаний",
-        "30 секунд планки"
-    ],
-    "Классика – 2 круга": [
-        "15 отжиманий",
-        "30 приседаний",
-        "10 подтягиваний",
-        "45 секунд планки"
-    ],
-    "Полная тренировка": [
-        "20 отжиманий",
-        "30 приседаний",
-        "15 подтягиваний",
-        "60 секунд планки",
-        "20 выпадов"
-    ],
-    "Силовая": [
-        "30 отжиманий",
-        "20 подтягиваний",
-        "90 секунд планки"
-    ],
-    "Ноги и корпус": [
-        "40 приседаний",
-        "30 выпадов",
-        "60 секунд планки"
-    ]
-}
+plans = {name: plan_steps(name) for name in PLANS}
 
 plan_name = st.selectbox("План тренировки", list(plans.keys()), index=0)
 
@@ -261,10 +434,16 @@ st.markdown("**Программа тренировки:**")
 for i, step in enumerate(plans[plan_name], 1):
     st.markdown(f"{i}. {step}")
 
+mode = st.sidebar.radio("Режим", ["Анализ видео", "Онлайн-подсчет"])
+if mode == "Онлайн-подсчет":
+    show_live_view(plan_name)
+    st.stop()
+
 st.markdown("""
     ### Инструкция:
     1. Загрузите видео тренировки.
-    2. Задайте интервалы (в секундах) для каждого упражнения.
+    2. Задайте интервалы (в секундах) для каждого упражнения или разметьте видео автоматически
+       и поправьте предложенные интервалы.
     3. Запустите анализ.
     4. Получите статистику по каждому упражнению.
 """)
@@ -277,51 +456,87 @@ uploaded_file = st.file_uploader(
 )
 
 if uploaded_file:
-    temp_dir = tempfile.mkdtemp()
-    input_path = os.path.join(temp_dir, "input.mp4")
-    
-    with open(input_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    video = save_uploaded_video(uploaded_file)
     
     st.subheader("🎬 Предпросмотр видео")
-    st.video(input_path)
+    st.video(video["file"])
 
-    exercise_ranges = extract_exercise_ranges(input_path)
+    exercise_ranges = extract_exercise_ranges(video)
+    render_video = st.checkbox("Получить видео с разметкой скелета", value=False)
+    stable_counting = st.checkbox("Устойчивый подсчет (для видео с дрожанием или низким fps)", value=False)
+    people = st.number_input("Участников в кадре (групповая запись, 0 - один человек)",
+                             min_value=0, max_value=6, value=0, step=1)
+    # Групповой режим не ведет кеш landmarks, экспортировать нечего
+    export_landmarks = st.checkbox("Сохранить landmarks и повторения для аналитики (.npz)", value=False,
+                                   disabled=people > 0,
+                                   help="Для групповой записи экспорт недоступен" if people > 0 else None)
+    export_landmarks = export_landmarks and people == 0
     
-    if exercise_ranges and st.button("🚀 НАЧАТЬ АНАЛИЗ УПРАЖНЕНИЙ", use_container_width=True):
-        with st.spinner("⏳ Анализ упражнений..."):
-            try:
-                with open(input_path, 'rb') as f:
-                    files = {'video': f}
-                    data = {
-                        'exercise_ranges': str(exercise_ranges),
-                        'model_complexity': 1
-                    }
-                    response = requests.post('http://localhost:5000/process_video', files=files, data=data)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    show_results(result, plan_name)
-                    
-                    # Кнопка скачивания результатов
-                    csv = pd.DataFrame.from_dict(result['exercise_stats'], orient='index').to_csv(index=True).encode('utf-8')
-                    st.download_button(
-                        label="📊 СКАЧАТЬ СТАТИСТИКУ",
-                        data=csv,
-                        file_name="workout_stats.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
-                else:
-                    st.error(f"Ошибка API: {response.text}")
-            except Exception as e:
-                st.error(f"Ошибка соединения с API: {str(e)}")
-        
+    options = {
+        'model_complexity': 1,
+        'render': render_video,
+        'export': "float16" if export_landmarks else "none",
+        'stable_counting': stable_counting,
+        'people': int(people)
+    }
+    # Авторазметка считает повторения проходом по всем кадрам (only_ranges=0). Принятая
+    # без правок разметка анализируется так же, иначе счет мог бы разойтись с кешем
+    only_ranges = st.session_state.get("auto_ranges") != (video["hash"], exercise_ranges)
+    cache_key = result_cache_key(video["hash"], exercise_ranges, dict(options, only_ranges=only_ranges))
+    result = cached_result(cache_key)
+    
+    if st.button("🤖 РАЗМЕТИТЬ АВТОМАТИЧЕСКИ", use_container_width=True, disabled=people > 0,
+                 help="Групповая запись размечается только вручную" if people > 0 else None):
         try:
-            os.remove(input_path)
-            os.rmdir(temp_dir)
+            response = run_analysis_job(video, [], segmentation="auto", only_ranges=False, **options)
+            auto_result = receive_result(response)
+            if auto_result is not None:
+                # Повторения уже посчитаны в том же проходе: результат сразу кладется
+                # в кеш под предложенную разметку, и анализ без правок не повторяется
+                suggested = [(float(r['start']), float(r['end']), r['exercise'])
+                             for r in auto_result['exercise_ranges']]
+                reset_ranges(suggested, {(float(r['start']), float(r['end']), r['exercise']): r['confidence']
+                                         for r in auto_result['exercise_ranges']})
+                st.session_state.auto_ranges = (video["hash"], suggested)
+                remember_result(result_cache_key(video["hash"], suggested, dict(options, only_ranges=False)),
+                                auto_result)
+                st.rerun()
         except Exception as e:
-            st.error(f"🚨 Ошибка очистки: {str(e)}")
+            st.error(f"Ошибка соединения с API: {str(e)}")
+    
+    if exercise_ranges and st.button("🚀 НАЧАТЬ АНАЛИЗ УПРАЖНЕНИЙ", use_container_width=True) and result is None:
+        try:
+            response = run_analysis_job(video, exercise_ranges, only_ranges=only_ranges, **options)
+            result = receive_result(response)
+            if result is not None:
+                remember_result(cache_key, result)
+        except Exception as e:
+            st.error(f"Ошибка соединения с API: {str(e)}")
+    
+    if result is not None:
+        # Результат из кеша: смена плана только пересчитывает оценку, без повторного анализа
+        show_results(result, plan_name)
+        
+        # Кнопка скачивания результатов
+        csv = pd.DataFrame.from_dict(result['exercise_stats'], orient='index').to_csv(index=True).encode('utf-8')
+        st.download_button(
+            label="📊 СКАЧАТЬ СТАТИСТИКУ",
+            data=csv,
+            file_name="workout_stats.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+        if result.get('export_data'):
+            st.download_button(
+                label="🧬 СКАЧАТЬ LANDMARKS И ПОВТОРЕНИЯ",
+                data=result['export_data'],
+                file_name="workout_landmarks.npz",
+                mime="application/octet-stream",
+                use_container_width=True
+            )
+elif "uploaded_video" in st.session_state:
+    # Видео убрали из формы - его хеш больше не нужен
+    del st.session_state.uploaded_video
 
 st.markdown("---")
 st.markdown("🛠️ Created with Streamlit & Flask API | Физкультура Онлайн")
\ No newline at end of file
@@ -0,0 +1,233 @@
+"""Пакетный анализ записанных тренировок по манифесту: сотни видео за один запуск.
+
+Манифест - CSV или JSONL, строка - видео: video, exercise_ranges, plan,
+model_complexity (plan и model_complexity необязательны). Видео раздаются
+пулу рабочих, начиная с самых длинных, чтобы в конце не ждать одно большое
+видео. Каждый результат сразу дописывается в журнал, и перезапуск с тем же
+журналом пропускает уже обработанные строки (строки с ошибкой повторяются).
+Итог - одна таблица (повторения и время по упражнениям, процент и оценка по
+плану, как в grading.py) и пропускная способность в минутах видео на минуту работы.
+
+Пример:
+    python batch.py manifest.csv --output results.csv --workers 4
+    python batch.py manifest.jsonl --output results.csv --journal results.jsonl
+"""
+import argparse
+import ast
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import pandas as pd
+
+from grading import PLANS, STEP_TEMPLATES, TIMED_EXERCISES, score_sessions
+
+# Допустимые model_complexity (как MODEL_COMPLEXITIES в pose_pool.py; MediaPipe здесь не подключается)
+MODEL_COMPLEXITIES = (0, 1, 2)
+
+class ManifestError(ValueError):
+    """Строка манифеста не разбирается; в сообщении - номер строки"""
+
+def parse_ranges(raw) -> List[tuple]:
+    """exercise_ranges строки манифеста: список из JSONL или строка вида [(0, 30, 'Отжимания')]"""
+    ranges = ast.literal_eval(raw) if isinstance(raw, str) else raw
+    parsed = [(float(start), float(end), str(ex_type)) for start, end, ex_type in ranges or []]
+    unknown = {ex_type for _, _, ex_type in parsed if ex_type not in STEP_TEMPLATES}
+    if unknown:
+        raise ValueError(f"unknown exercises {sorted(unknown)}")
+    return parsed
+
+def parse_model_complexity(raw) -> int:
+    """model_complexity строки манифеста; пусто - 1, вне 0..2 - ошибка"""
+    if raw is None or raw == "":
+        return 1
+    try:
+        # 1.5 или true из JSONL - ошибка, а не молча 1
+        model_complexity = int(raw) if isinstance(raw, (str, int)) and not isinstance(raw, bool) else None
+    except ValueError:
+        model_complexity = None
+    if model_complexity not in MODEL_COMPLEXITIES:
+        raise ValueError(f"model_complexity must be one of {list(MODEL_COMPLEXITIES)}")
+    return model_complexity
+
+def parse_manifest(text: str) -> List[Dict]:
+    """Строки манифеста; JSONL определяется по первой непустой строке, иначе CSV с заголовком"""
+    first = next((line.strip() for line in text.splitlines() if line.strip()), "")
+    if first.startswith("{"):
+        rows = [(number, line) for number, line in enumerate(text.splitlines(), 1) if line.strip()]
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        rows = [(number, row) for number, row in enumerate(reader, 2)]
+
+    items = []
+    for number, row in rows:
+        try:
+            if isinstance(row, str):
+                row = json.loads(row)
+                if not isinstance(row, dict):
+                    raise ValueError(f"expected a JSON object, got {type(row).__name__}")
+            if not row.get("video"):
+                raise ValueError("video is empty")
+            plan = row.get("plan") or ""
+            if plan and plan not in PLANS:
+                raise ValueError(f"unknown plan {plan!r}")
+            items.append({
+                "video": row["video"],
+                "exercise_ranges": parse_ranges(row.get("exercise_ranges")),
+                "plan": plan,
+                "model_complexity": parse_model_complexity(row.get("model_complexity"))
+            })
+        except (ValueError, SyntaxError, TypeError) as e:
+            raise ManifestError(f"Manifest line {number}: {e}") from e
+    return items
+
+def read_manifest(path: str) -> List[Dict]:
+    """Манифест из файла; относительные пути видео - от папки манифеста"""
+    with open(path, encoding="utf-8") as f:
+        items = parse_manifest(f.read())
+    root = os.path.dirname(os.path.abspath(path))
+    for item in items:
+        item["video"] = os.path.join(root, item["video"])
+    return items
+
+def item_key(item: Dict) -> str:
+    """Ключ строки в журнале: то же видео с той же разметкой и моделью - та же строка"""
+    raw = json.dumps([item["video"], item["exercise_ranges"], item["model_complexity"]], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+def video_duration(path: str) -> float:
+    """Длительность видео в секундах; 0 - видео не открывается (ошибка будет при анализе)"""
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    cap.release()
+    return frames / fps if fps > 0 else 0.0
+
+def load_journal(path: str) -> Dict[str, Dict]:
+    """Последняя запись журнала по ключу; недописанная последняя строка (падение) пропускается"""
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record["key"]] = record
+    return records
+
+def analyze_item(item: Dict, analyze: Callable[[Dict], Dict]) -> Dict:
+    """Запись журнала для одной строки: результат или текст ошибки"""
+    record = {"key": item_key(item), "video": item["video"], "duration": item["duration"]}
+    started = time.perf_counter()
+    try:
+        result = analyze(item)
+        record.update(status="done", exercise_stats=result["exercise_stats"])
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    record["seconds"] = time.perf_counter() - started
+    return record
+
+def run_batch(items: List[Dict], analyze: Callable[[Dict], Dict], journal_path: str, workers: int = 1,
+              progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """Анализирует строки манифеста пулом из workers потоков; возвращает отчет о пропускной способности.
+
+    analyze(item) - анализ одного видео (см. analysis.analyze_batch_item). Уже готовые
+    по журналу строки пропускаются, остальные идут от самого длинного видео.
+    progress(record) вызывается после каждой строки.
+    """
+    for item in items:
+        item["duration"] = video_duration(item["video"])
+    done = {key for key, record in load_journal(journal_path).items() if record["status"] == "done"}
+    pending = {item_key(item): item for item in items if item_key(item) not in done}
+    order = sorted(pending.values(), key=lambda item: item["duration"], reverse=True)
+
+    report = {"videos": len(items), "skipped": len(items) - len(order), "processed": 0, "errors": 0,
+              "video_minutes": 0.0}
+    started = time.perf_counter()
+    with open(journal_path, "a", encoding="utf-8") as journal, \
+            ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+        futures = [pool.submit(analyze_item, item, analyze) for item in order]
+        for future in as_completed(futures):
+            record = future.result()
+            # Запись сразу на диск: после падения эта строка уже не повторится
+            journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+            if record["status"] == "done":
+                report["processed"] += 1
+                report["video_minutes"] += record["duration"] / 60
+            else:
+                report["errors"] += 1
+            if progress:
+                progress(record)
+
+    report["wall_minutes"] = (time.perf_counter() - started) / 60
+    report["video_minutes_per_wall_minute"] = (report["video_minutes"] / report["wall_minutes"]
+                                               if report["wall_minutes"] > 0 else None)
+    return report
+
+def results_table(items: List[Dict], journal_path: str) -> pd.DataFrame:
+    """Сводная таблица: строка манифеста - видео, факт по упражнениям, процент и оценка по плану"""
+    records = load_journal(journal_path)
+    rows = []
+    for item in items:
+        record = records.get(item_key(item), {"status": "missing"})
+        row = {"video": item["video"], "plan": item["plan"], "status": record["status"],
+               "error": record.get("error"), "duration_sec": item.get("duration"),
+               "processing_sec": record.get("seconds")}
+        stats = record.get("exercise_stats", {})
+        for exercise in STEP_TEMPLATES:
+            value = stats.get(exercise, {"count": 0, "time": 0})
+            row[exercise] = value["time"] if exercise in TIMED_EXERCISES else value["count"]
+        rows.append(row)
+    table = pd.DataFrame(rows, columns=["video", "plan", "status", "error", "duration_sec", "processing_sec"]
+                         + list(STEP_TEMPLATES))
+
+    # Оценки одним проходом score_sessions по всем планам, из них берется план строки
+    actual = table[list(STEP_TEMPLATES)].astype(float)
+    scores = score_sessions(actual)
+    graded = [(index, row.plan) for index, row in table.iterrows() if row.plan and row.status == "done"]
+    table["overall_percent"] = None
+    table["grade"] = None
+    if graded:
+        picked = scores.loc[graded]
+        table.loc[[index for index, _ in graded], "overall_percent"] = picked["overall_percent"].to_numpy()
+        table.loc[[index for index, _ in graded], "grade"] = picked["grade"].to_numpy()
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("manifest", help="Манифест CSV или JSONL")
+    parser.add_argument("--output", default="batch_results.csv", help="CSV со сводной таблицей")
+    parser.add_argument("--journal", help="Журнал готовых строк (по умолчанию - рядом с --output, .jsonl)")
+    parser.add_argument("--workers", type=int, default=2, help="Сколько видео анализировать одновременно")
+    args = parser.parse_args()
+
+    # analysis подключается здесь: разбор манифеста и таблица не требуют MediaPipe
+    import analysis
+    items = read_manifest(args.manifest)
+    journal_path = args.journal or os.path.splitext(args.output)[0] + ".jsonl"
+
+    def on_record(record):
+        mark = "ok" if record["status"] == "done" else f"ошибка: {record['error']}"
+        print(f"[{record['seconds']:.1f} сек] {record['video']} - {mark}", flush=True)
+
+    report = run_batch(items, analysis.analyze_batch_item, journal_path, args.workers, on_record)
+    results_table(items, journal_path).to_csv(args.output, index=False, encoding="utf-8")
+    print()
+    print(f"Видео: {report['videos']}, обработано: {report['processed']}, пропущено (готовы): "
+          f"{report['skipped']}, ошибок: {report['errors']}")
+    if report["video_minutes_per_wall_minute"] is not None:
+        print(f"Пропускная способность: {report['video_minutes_per_wall_minute']:.2f} мин видео "
+              f"на минуту работы ({report['video_minutes']:.1f} мин видео за {report['wall_minutes']:.1f} мин)")
+
+if __name__ == '__main__':
+    main()
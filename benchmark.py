@@ -0,0 +1,353 @@
+"""Бенчмарк стадий анализа на синтетических данных, без сети и без реальных видео.
+
+Генерирует видео заданного разрешения, fps и длины и синтетические landmarks
+отжиманий, приседаний, подтягиваний, выпадов и планки с известным числом
+повторений. Замеряет декодирование, перевод цвета, инференс, каждую count_*,
+векторные счетчики, отрисовку и кодирование. Результат - JSON со скоростью
+(кадров/сек), пиковой памятью и точностью счетчиков, чтобы сравнивать версии.
+
+Пример:
+    python benchmark.py --width 1280 --height 720 --fps 30 --seconds 10 --output bench.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import tempfile
+import time
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+import analysis
+import vector_counters
+
+PoseLandmark = analysis.mp_pose.PoseLandmark
+
+# Число повторений в синтетических landmarks по умолчанию
+DEFAULT_REPS = {"Отжимания": 12, "Приседания": 15, "Подтягивания": 8, "Выпады": 10}
+
+def make_synthetic_video(path: str, width: int, height: int, fps: float, seconds: float) -> int:
+    """Пишет видео с движущейся фигурой-схемой и возвращает число кадров"""
+    frames = int(round(fps * seconds))
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    background = np.tile(np.linspace(40, 200, width, dtype=np.uint8)[None, :, None], (height, 1, 3))
+    scale = min(width, height)
+    for i in range(frames):
+        frame = background.copy()
+        phase = math.sin(2 * math.pi * i / fps)
+        cx, cy = width // 2, height // 2
+        head = (cx, cy - int(0.3 * scale))
+        hip = (cx, cy + int(0.1 * scale))
+        cv2.circle(frame, head, int(0.06 * scale), (220, 190, 160), -1)
+        cv2.line(frame, head, hip, (60, 60, 200), max(2, scale // 40))
+        for side in (-1, 1):
+            hand = (cx + side * int(0.25 * scale), cy - int(0.1 * scale) + int(0.1 * scale * phase))
+            foot = (cx + side * int(0.12 * scale), cy + int(0.4 * scale))
+            cv2.line(frame, (cx, cy - int(0.2 * scale)), hand, (60, 160, 60), max(2, scale // 60))
+            cv2.line(frame, hip, foot, (160, 60, 60), max(2, scale // 50))
+        out.write(frame)
+    out.release()
+    return frames
+
+def neutral_pose(frames: int) -> np.ndarray:
+    """Стоящий человек: landmarks кадры×33×4 с видимостью 0.9"""
+    landmarks = np.zeros((frames, 33, 4), dtype=np.float32)
+    landmarks[:, :, 0] = 0.5
+    landmarks[:, :, 1] = 0.5
+    landmarks[:, :, 3] = 0.9
+    for point, (x, y) in {
+        PoseLandmark.LEFT_SHOULDER: (0.45, 0.30), PoseLandmark.RIGHT_SHOULDER: (0.55, 0.30),
+        PoseLandmark.LEFT_ELBOW: (0.42, 0.22), PoseLandmark.RIGHT_ELBOW: (0.58, 0.22),
+        PoseLandmark.LEFT_HIP: (0.47, 0.55), PoseLandmark.RIGHT_HIP: (0.53, 0.55),
+        PoseLandmark.LEFT_KNEE: (0.47, 0.40), PoseLandmark.RIGHT_KNEE: (0.53, 0.40),
+        PoseLandmark.LEFT_ANKLE: (0.30, 0.90), PoseLandmark.RIGHT_ANKLE: (0.70, 0.90),
+    }.items():
+        landmarks[:, point, 0] = x
+        landmarks[:, point, 1] = y
+    return landmarks
+
+def synthetic_landmarks(exercise: str, frames: int, reps: int = 0, noise: float = 0.0,
+                        seed: int = 0) -> Tuple[np.ndarray, float]:
+    """Landmarks упражнения с известным результатом.
+
+    Сигнал каждого счетчика - косинус с reps периодами, начинающийся в исходном
+    состоянии, поэтому без шума ожидается ровно reps повторений. Для планки
+    ожидаемое значение - число кадров с ровным корпусом.
+    """
+    landmarks = neutral_pose(frames)
+    t = np.arange(frames) / max(frames, 1)
+    wave = -np.cos(2 * np.pi * reps * t)  # -1 в исходном состоянии, +1 в середине повторения
+    if exercise == "Отжимания":
+        for point in (PoseLandmark.LEFT_ELBOW, PoseLandmark.RIGHT_ELBOW):
+            landmarks[:, point, 1] = 0.30 + 0.08 * wave
+        expected = reps
+    elif exercise == "Подтягивания":
+        for point in (PoseLandmark.LEFT_ELBOW, PoseLandmark.RIGHT_ELBOW):
+            landmarks[:, point, 1] = 0.30 - 0.08 * wave
+        expected = reps
+    elif exercise == "Приседания":
+        for point in (PoseLandmark.LEFT_KNEE, PoseLandmark.RIGHT_KNEE):
+            landmarks[:, point, 1] = 0.55 + 0.08 * wave
+        expected = reps
+    elif exercise == "Выпады":
+        # Переднее колено уходит к лодыжке: разница по x от 0.17 до 0.03
+        landmarks[:, PoseLandmark.LEFT_KNEE, 0] = 0.40 - 0.07 * wave
+        landmarks[:, PoseLandmark.LEFT_ANKLE, 0] = 0.30
+        expected = reps
+    elif exercise == "Планка":
+        # Корпус ровный на средних 60% кадров, в остальное время бедра подняты
+        hold = (t >= 0.2) & (t < 0.8)
+        for point in (PoseLandmark.LEFT_HIP, PoseLandmark.RIGHT_HIP):
+            landmarks[:, point, 1] = np.where(hold, 0.32, 0.55)
+        expected = int(np.count_nonzero(hold))
+    else:
+        raise ValueError(f"Неизвестное упражнение: {exercise}")
+
+    if noise:
+        rng = np.random.default_rng(seed)
+        landmarks[:, :, :3] += rng.normal(0, noise, (frames, 33, 3)).astype(np.float32)
+    return landmarks, expected
+
+def stage_result(frames: int, seconds: float) -> Dict:
+    return {
+        "frames": frames,
+        "seconds": round(seconds, 6),
+        "fps": round(frames / seconds, 2) if seconds > 0 else None
+    }
+
+def bench_video_stages(video_path: str, work_dir: str, sample_frames: int, model_complexity: int) -> Dict:
+    """Декодирование всего видео и остальные стадии на первых sample_frames кадрах"""
+    stages = {}
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    decoded = 0
+    started = time.perf_counter()
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+        decoded += 1
+        if len(frames) < sample_frames:
+            frames.append(frame)
+    stages["decode"] = stage_result(decoded, time.perf_counter() - started)
+    cap.release()
+
+    started = time.perf_counter()
+    images = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+    stages["color_conversion"] = stage_result(len(frames), time.perf_counter() - started)
+
+    with analysis.pose_pool.checkout(model_complexity) as pose:
+        started = time.perf_counter()
+        for image in images:
+            pose.process(image)
+        stages["inference"] = stage_result(len(images), time.perf_counter() - started)
+
+    pose_landmarks = analysis.landmarks_from_array(neutral_pose(1)[0])
+    started = time.perf_counter()
+    for frame in frames:
+        analysis.annotate_frame(frame, pose_landmarks, ("Отжимания",))
+    stages["drawing"] = stage_result(len(frames), time.perf_counter() - started)
+
+    height, width = frames[0].shape[:2] if frames else (0, 0)
+    out = cv2.VideoWriter(os.path.join(work_dir, "encoded.mp4"), cv2.VideoWriter_fourcc(*'mp4v'),
+                          30, (width, height))
+    started = time.perf_counter()
+    for frame in frames:
+        out.write(frame)
+    out.release()
+    stages["encode"] = stage_result(len(frames), time.perf_counter() - started)
+    return stages
+
+def bench_counters(frames: int, reps: Dict[str, int], noise: float, vector_frames: int,
+                   fps: float) -> Tuple[Dict, Dict]:
+    """Скорость count_* и векторных счетчиков и их точность на синтетических landmarks"""
+    stages = {}
+    accuracy = {}
+    for exercise in analysis.EXERCISE_TYPES:
+        series, expected = synthetic_landmarks(exercise, frames, reps.get(exercise, 0), noise)
+        pose_landmarks = [analysis.landmarks_from_array(row) for row in series]
+
+        if exercise == "Планка":
+            state, stats = analysis.create_exercise_state()
+            started = time.perf_counter()
+            for landmarks in pose_landmarks:
+                analysis.update_exercise(exercise, landmarks, state, stats)
+            seconds = time.perf_counter() - started
+            scalar_value = state[exercise]["duration"]
+            vector_value = int(np.count_nonzero(vector_counters.plank_aligned(series)))
+            accuracy[exercise] = {"expected_hold_frames": expected, "scalar_hold_frames": scalar_value,
+                                  "vector_hold_frames": vector_value,
+                                  "scalar_correct": scalar_value == expected,
+                                  "vector_correct": vector_value == expected}
+        else:
+            counter_fn = analysis.EXERCISE_COUNTERS[exercise]
+            initial = analysis.create_exercise_state()[0][exercise]["prev_state"]
+            counter, prev_state = 0, initial
+            started = time.perf_counter()
+            for landmarks in pose_landmarks:
+                counter, prev_state = counter_fn(landmarks, prev_state, counter)
+            seconds = time.perf_counter() - started
+            vector_value = analysis.VECTOR_COUNTERS[exercise](series, initial, 0)[0]
+            accuracy[exercise] = {"expected": expected, "scalar": counter, "vector": vector_value,
+                                  "scalar_correct": counter == expected, "vector_correct": vector_value == expected}
+        stages[f"count:{exercise}"] = stage_result(frames, seconds)
+
+    # Векторный подсчет всех упражнений по длинному ряду landmarks
+    repeats = max(1, vector_frames // frames)
+    series = np.concatenate([synthetic_landmarks("Отжимания", frames, reps.get("Отжимания", 0))[0]] * repeats)
+    status = np.full(len(series), analysis.FRAME_POSE, dtype=np.uint8)
+    segments = [(0, len(series) - 1, tuple(analysis.EXERCISE_TYPES))]
+    started = time.perf_counter()
+    analysis.count_exercises_vectorized(series, status, segments, fps)
+    stages["count:vectorized_all"] = stage_result(len(series), time.perf_counter() - started)
+    return stages, accuracy
+
+def count_series(exercise: str, pose_landmarks, sampler=None) -> Tuple[int, float]:
+    """Повторения и время планки (в кадрах) по ряду landmarks, полным проходом или с выборкой"""
+    state, stats = analysis.create_exercise_state()
+    frames = range(len(pose_landmarks))
+    if sampler is None:
+        resolved = [(i, pose_landmarks[i]) for i in frames]
+    else:
+        resolved = []
+        for i in frames:
+            resolved.extend(sampler.step(i, (exercise,), i, lambda j: pose_landmarks[j]))
+        resolved.extend(sampler.flush(lambda j: pose_landmarks[j]))
+    for _, landmarks in resolved:
+        if landmarks:
+            analysis.update_exercise(exercise, landmarks, state, stats)
+    return stats[exercise]["count"], state["Планка"]["duration"]
+
+def bench_sampling(frames: int, reps: Dict[str, int], noise: float, stride: int) -> Dict:
+    """Адаптивная выборка против полного прохода: совпадение результата и доля кадров с инференсом"""
+    report = {}
+    for exercise in analysis.EXERCISE_TYPES:
+        series, _ = synthetic_landmarks(exercise, frames, reps.get(exercise, 0), noise)
+        pose_landmarks = [analysis.landmarks_from_array(row) for row in series]
+        sampler = analysis.AdaptiveSampler(stride, edges=analysis.sampling_edges([(0, frames - 1, (exercise,))], frames))
+        full = count_series(exercise, pose_landmarks)
+        adaptive = count_series(exercise, pose_landmarks, sampler)
+        report[exercise] = {
+            "full": full,
+            "adaptive": adaptive,
+            "match": full == adaptive,
+            "inferred_fraction": sampler.report()["inferred_fraction"]
+        }
+    return report
+
+def count_tuned(exercise: str, pose_landmarks, fps: float, tuning: analysis.CounterTuning) -> Tuple[int, float]:
+    """Как count_series, но через сглаживание и гистерезис CounterTuning (время кадра - i / fps)"""
+    state, stats = analysis.create_exercise_state()
+    for i, landmarks in enumerate(pose_landmarks):
+        analysis.advance_clock((exercise,), state)
+        counted = tuning.smooth(landmarks, i / fps)
+        analysis.update_exercise(exercise, counted, state, stats, tuning=tuning)
+    return stats[exercise]["count"], state["Планка"]["duration"]
+
+def bench_tuning(frames: int, reps: Dict[str, int], noise: float, fps: float, smoothing: str,
+                 band: float, min_rep_duration: float, frame_steps: Tuple[int, ...] = (1, 2, 3)) -> Dict:
+    """Точность исходных и устойчивых счетчиков на зашумленных landmarks.
+
+    frame_step > 1 прореживает ряд, как видео с меньшим fps: шум тот же, а кадров
+    на повторение меньше.
+    """
+    report = {}
+    for exercise in analysis.EXERCISE_TYPES:
+        if exercise == "Планка":
+            continue
+        series, expected = synthetic_landmarks(exercise, frames, reps.get(exercise, 0), noise)
+        report[exercise] = {"expected": expected}
+        for step in frame_steps:
+            pose_landmarks = [analysis.landmarks_from_array(row) for row in series[::step]]
+            step_fps = fps / step
+            raw = count_tuned(exercise, pose_landmarks, step_fps, analysis.CounterTuning())
+            tuned = count_tuned(exercise, pose_landmarks, step_fps,
+                                analysis.CounterTuning(smoothing, band, min_rep_duration, step_fps))
+            report[exercise][f"fps_{step_fps:g}"] = {"raw": raw[0], "tuned": tuned[0]}
+    return report
+
+def run_benchmark(width: int, height: int, fps: float, seconds: float, sample_frames: int,
+                  model_complexity: int, landmark_frames: int, noise: float, vector_frames: int,
+                  sample_stride: int = analysis.SAMPLING_STRIDE, smoothing: str = "one_euro",
+                  hysteresis: float = 0.02, min_rep_duration: float = 0.3) -> Dict:
+    work_dir = tempfile.mkdtemp(prefix="diplom_bench_")
+    try:
+        video_path = os.path.join(work_dir, "synthetic.mp4")
+        started = time.perf_counter()
+        frames = make_synthetic_video(video_path, width, height, fps, seconds)
+        generation_seconds = time.perf_counter() - started
+
+        stages = bench_video_stages(video_path, work_dir, sample_frames, model_complexity)
+        counter_stages, accuracy = bench_counters(landmark_frames, DEFAULT_REPS, noise, vector_frames, fps)
+        stages.update(counter_stages)
+        sampling = bench_sampling(landmark_frames, DEFAULT_REPS, noise, sample_stride)
+        tuning = bench_tuning(landmark_frames, DEFAULT_REPS, noise, fps, smoothing, hysteresis, min_rep_duration)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "config": {
+            "width": width, "height": height, "fps": fps, "seconds": seconds,
+            "video_frames": frames, "sample_frames": sample_frames,
+            "model_complexity": model_complexity, "landmark_frames": landmark_frames,
+            "noise": noise, "vector_frames": vector_frames, "sample_stride": sample_stride,
+            "smoothing": smoothing, "hysteresis": hysteresis, "min_rep_duration": min_rep_duration
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count()
+        },
+        "video_generation_seconds": round(generation_seconds, 4),
+        "stages": stages,
+        "accuracy": accuracy,
+        # Результат (повторения, кадры планки) полного прохода и адаптивной выборки
+        "sampling": sampling,
+        # Повторения исходных и устойчивых счетчиков при полном и уменьшенном fps
+        "tuning": tuning,
+        # ru_maxrss в Linux - в килобайтах
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк стадий анализа на синтетических данных")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--sample-frames", type=int, default=150,
+                        help="Сколько кадров прогонять через перевод цвета, модель, отрисовку и кодирование")
+    parser.add_argument("--model-complexity", type=int, default=1)
+    parser.add_argument("--landmark-frames", type=int, default=3000,
+                        help="Длина синтетических рядов landmarks для count_*")
+    parser.add_argument("--noise", type=float, default=0.0, help="Шум координат landmarks (σ)")
+    parser.add_argument("--vector-frames", type=int, default=300000,
+                        help="Длина ряда для векторного подсчета")
+    parser.add_argument("--sample-stride", type=int, default=analysis.SAMPLING_STRIDE,
+                        help="Базовый шаг адаптивной выборки")
+    parser.add_argument("--smoothing", choices=analysis.SMOOTHING_METHODS, default="one_euro",
+                        help="Сглаживание landmarks для сравнения устойчивых счетчиков")
+    parser.add_argument("--hysteresis", type=float, default=0.02, help="Полоса гистерезиса порогов")
+    parser.add_argument("--min-rep-duration", type=float, default=0.3,
+                        help="Минимальная длительность повторения, сек")
+    parser.add_argument("--output", help="Файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.width, args.height, args.fps, args.seconds, args.sample_frames,
+                           args.model_complexity, args.landmark_frames, args.noise, args.vector_frames,
+                           args.sample_stride, args.smoothing, args.hysteresis, args.min_rep_duration)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
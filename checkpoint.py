@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Optional
+
+# Контрольные точки долгого анализа. Состояние прохода (номер кадра, счетчики,
+# готовые отрезки) пишется в JSON атомарно, landmarks остаются в кеше landmarks.
+# Точка ищется по ключу - хешу видео и всех параметров, влияющих на результат,
+# поэтому повторная отправка того же видео после падения сервера продолжает
+# анализ с последней точки. После успешного анализа точка удаляется.
+
+class Checkpoint:
+    """Папка контрольной точки: state.json и вспомогательные файлы (например, отрезки видео)"""
+
+    def __init__(self, store: "CheckpointStore", path: str, key: Dict):
+        self.store = store
+        self.path = path
+        self.key = key
+        self.state_path = os.path.join(path, "state.json")
+        self.saves = 0
+
+    def load(self) -> Optional[Dict]:
+        """Сохраненное состояние или None, если точки нет или она от других параметров"""
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("key") != self.key:
+            return None
+        return state
+
+    def save(self, state: Dict):
+        """Пишет состояние через временный файл: при падении остается прежняя точка"""
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dict(state, key=self.key, saved_at=time.time()), f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+        self.saves += 1
+
+    def directory(self, name: str) -> str:
+        """Подпапка точки, которая переживает перезапуск вместе с state.json"""
+        path = os.path.join(self.path, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def discard(self):
+        """Удаляет точку (анализ завершен)"""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def release(self):
+        """Освобождает ключ для следующих запросов; файлы точки остаются"""
+        self.store.release(self)
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class CheckpointStore:
+    """Контрольные точки в папке root; не обновлявшиеся дольше ttl секунд удаляются.
+
+    Один ключ в процессе ведет только один анализ: одинаковый параллельный
+    запрос идет без контрольных точек, чтобы не писать в ту же папку.
+    """
+
+    def __init__(self, root: str, ttl: int):
+        self.root = root
+        self.ttl = ttl
+        self.active = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key_name(key: Dict) -> str:
+        return hashlib.sha256(json.dumps(key, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def open(self, key: Dict) -> Optional[Checkpoint]:
+        """Точка для ключа (может быть пустой) или None, если ключ уже занят"""
+        self.purge_expired()
+        # Ключ сравнивается с сохраненным после круга через JSON
+        key = json.loads(json.dumps(key))
+        name = self.key_name(key)
+        with self.lock:
+            if name in self.active:
+                return None
+            self.active.add(name)
+        return Checkpoint(self, os.path.join(self.root, name), key)
+
+    def release(self, checkpoint: Checkpoint):
+        with self.lock:
+            self.active.discard(os.path.basename(checkpoint.path))
+
+    def purge_expired(self):
+        if not os.path.isdir(self.root):
+            return
+        now = time.time()
+        with self.lock:
+            active = set(self.active)
+        for name in os.listdir(self.root):
+            if name in active:
+                continue
+            path = os.path.join(self.root, name)
+            state_path = os.path.join(path, "state.json")
+            try:
+                updated = os.path.getmtime(state_path if os.path.exists(state_path) else path)
+            except OSError:
+                continue
+            if now - updated > self.ttl:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        names = os.listdir(self.root) if os.path.isdir(self.root) else []
+        with self.lock:
+            active = len(self.active)
+        return {"checkpoints": len(names), "active": active, "ttl": self.ttl}
@@ -0,0 +1,252 @@
+"""Оценка тренировок по планам: одна сессия в приложении и весь поток разом из файлов.
+
+Планы заданы одной таблицей PLANS, из нее же строится текст программы в app.py.
+Массовая оценка читает сохраненные статистики (CSV кнопки "Скачать статистику"
+или JSON ответа API), считает проценты всех студентов по всем планам одним
+векторным проходом и выдает оценки и сводку по группе. Проценты и оценки
+совпадают с calculate_workout_score.
+
+Пример:
+    python grading.py results/ --output grades.csv --summary summary.csv
+    python grading.py results/*.csv --plan "Силовая"
+"""
+import argparse
+import glob
+import json
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# План -> упражнение -> цель (повторения, для планки - секунды)
+PLANS = {
+    "Новичок – 1 круг": {
+        "Отжимания": 10,
+        "Приседания": 20,
+        "Планка": 30
+    },
+    "Классика – 2 круга": {
+        "Отжимания": 15,
+        "Приседания": 30,
+        "Подтягивания": 10,
+        "Планка": 45
+    },
+    "Полная тренировка": {
+        "Отжимания": 20,
+        "Приседания": 30,
+        "Подтягивания": 15,
+        "Планка": 60,
+        "Выпады": 20
+    },
+    "Силовая": {
+        "Отжимания": 30,
+        "Подтягивания": 20,
+        "Планка": 90
+    },
+    "Ноги и корпус": {
+        "Приседания": 40,
+        "Выпады": 30,
+        "Планка": 60
+    }
+}
+
+# Как цель упражнения выглядит в программе тренировки
+STEP_TEMPLATES = {
+    "Отжимания": "{} отжиманий",
+    "Приседания": "{} приседаний",
+    "Подтягивания": "{} подтягиваний",
+    "Планка": "{} секунд планки",
+    "Выпады": "{} выпадов"
+}
+
+# Упражнения, у которых цель - время, а не число повторений
+TIMED_EXERCISES = ("Планка",)
+
+# Нижние границы общего процента для оценок, по убыванию
+GRADES = [
+    (90, "5 (Отлично)"),
+    (70, "4 (Хорошо)"),
+    (50, "3 (Удовлетворительно)"),
+    (30, "2 (Плохо)"),
+    (0, "1 (Очень плохо)")
+]
+NO_DATA_GRADE = "Нет данных"
+
+def plan_steps(plan_name: str) -> List[str]:
+    """Программа тренировки текстом: ["10 отжиманий", ...]"""
+    return [STEP_TEMPLATES[ex].format(target) for ex, target in PLANS[plan_name].items()]
+
+def grade_for(percent: float) -> str:
+    for threshold, grade in GRADES:
+        if percent >= threshold:
+            return grade
+    return GRADES[-1][1]
+
+def calculate_workout_score(plan_name: str, stats_df: pd.DataFrame) -> Dict:
+    """Рассчитывает процент выполнения и оценку тренировки"""
+    if plan_name not in PLANS:
+        return {"error": "Unknown plan"}
+
+    results = {}
+    total_percent = 0
+    exercise_count = 0
+
+    for exercise, target in PLANS[plan_name].items():
+        # Для планки учитываем время, для остальных - количество
+        if exercise in TIMED_EXERCISES:
+            actual = stats_df.loc[exercise, "Время (сек)"] if exercise in stats_df.index else 0
+        else:
+            actual = stats_df.loc[exercise, "Количество"] if exercise in stats_df.index else 0
+
+        percent = min(100, round((actual / target) * 100)) if target > 0 else 0
+        results[exercise] = {
+            "target": target,
+            "actual": actual,
+            "percent": percent
+        }
+        total_percent += percent
+        exercise_count += 1
+
+    if exercise_count > 0:
+        overall_percent = total_percent / exercise_count
+        # Оценка от 1 до 5
+        grade = grade_for(overall_percent)
+    else:
+        overall_percent = 0
+        grade = NO_DATA_GRADE
+
+    return {
+        "exercises": results,
+        "overall_percent": overall_percent,
+        "grade": grade
+    }
+
+# Названия колонок статистики: из API/CSV (count, time) и из таблицы приложения
+STATS_COLUMNS = {"count": "count", "time": "time", "Количество": "count", "Время (сек)": "time"}
+
+def read_stats_file(path: str) -> pd.DataFrame:
+    """Статистика одной сессии: индекс - упражнение, колонки count и time.
+
+    CSV - как у кнопки скачивания, JSON - exercise_stats или весь ответ API.
+    """
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        stats = pd.DataFrame.from_dict(data.get("exercise_stats", data), orient="index")
+    else:
+        stats = pd.read_csv(path, index_col=0)
+    stats = stats.rename(columns=STATS_COLUMNS)
+    return stats.reindex(columns=["count", "time"]).fillna(0)
+
+def student_ids(paths: List[str]) -> List[str]:
+    """Имя файла без расширения; при совпадении имен - путь от общей папки"""
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    if len(set(stems)) == len(stems):
+        return stems
+    root = os.path.commonpath([os.path.abspath(path) for path in paths])
+    if len(paths) == 1 or os.path.isfile(root):
+        root = os.path.dirname(root)
+    return [os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0] for path in paths]
+
+def expand_paths(inputs: List[str]) -> List[str]:
+    """Файлы из аргументов: папки раскрываются в их *.csv и *.json"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += sorted(glob.glob(os.path.join(item, "*.csv")) + glob.glob(os.path.join(item, "*.json")))
+        else:
+            paths += sorted(glob.glob(item)) or [item]
+    return paths
+
+def load_sessions(paths: List[str]) -> pd.DataFrame:
+    """Фактические результаты: строка - студент, колонка - упражнение.
+
+    Для упражнений на время берется time, для остальных - count; нет упражнения - 0.
+    """
+    frames = []
+    for student, path in zip(student_ids(paths), paths):
+        stats = read_stats_file(path)
+        stats["student"] = student
+        frames.append(stats.rename_axis("exercise").reset_index())
+    exercises = list(STEP_TEMPLATES)
+    if not frames:
+        return pd.DataFrame(columns=exercises, dtype=float).rename_axis("student")
+    long = pd.concat(frames, ignore_index=True)
+    timed = long["exercise"].isin(TIMED_EXERCISES)
+    long["actual"] = np.where(timed, long["time"], long["count"])
+    actual = long.pivot_table(index="student", columns="exercise", values="actual", aggfunc="sum")
+    return actual.reindex(index=student_ids(paths), columns=exercises).fillna(0).astype(float)
+
+def plan_targets(plans: Dict[str, Dict[str, int]] = PLANS) -> pd.DataFrame:
+    """Цели планов: строка - план, колонка - упражнение, NaN - упражнения нет в плане"""
+    return pd.DataFrame.from_dict(plans, orient="index").reindex(columns=list(STEP_TEMPLATES)).astype(float)
+
+def score_sessions(actual: pd.DataFrame, plans: Dict[str, Dict[str, int]] = PLANS) -> pd.DataFrame:
+    """Оценки всех студентов по всем планам одним проходом NumPy.
+
+    Строка результата - (студент, план): процент по каждому упражнению плана,
+    overall_percent и grade. Округление и пороги - как в calculate_workout_score.
+    """
+    targets = plan_targets(plans)
+    actual = actual.reindex(columns=targets.columns).fillna(0)
+    a = actual.to_numpy(dtype=float)[:, None, :]   # студенты x 1 x упражнения
+    t = targets.to_numpy(dtype=float)[None, :, :]  # 1 x планы x упражнения
+    in_plan = ~np.isnan(t)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent = np.minimum(100, np.round(a / t * 100))
+    # Цель 0 дает 0%, как в calculate_workout_score
+    percent = np.where(in_plan & (t > 0), percent, np.where(in_plan, 0.0, np.nan))
+    exercise_count = in_plan.sum(axis=2)
+    overall = np.divide(np.nansum(percent, axis=2), exercise_count,
+                        out=np.zeros(percent.shape[:2]), where=exercise_count > 0)
+
+    thresholds = [threshold for threshold, _ in GRADES]
+    grades = np.array([grade for _, grade in GRADES] + [NO_DATA_GRADE], dtype=object)
+    # Индекс первой границы, которую процент не меньше; без упражнений - "Нет данных"
+    grade_index = np.select([overall >= threshold for threshold in thresholds],
+                            list(range(len(thresholds))), default=len(thresholds) - 1)
+    grade_index = np.where(exercise_count > 0, grade_index, len(thresholds))
+
+    index = pd.MultiIndex.from_product([actual.index, targets.index], names=["student", "plan"])
+    scores = pd.DataFrame(percent.reshape(-1, targets.shape[1]), index=index, columns=targets.columns)
+    scores["overall_percent"] = overall.reshape(-1)
+    scores["grade"] = grades[grade_index.reshape(-1)]
+    return scores
+
+def class_summary(scores: pd.DataFrame) -> pd.DataFrame:
+    """Сводка по группе для каждого плана: средний процент, разброс, число оценок и средние по упражнениям"""
+    by_plan = scores.groupby(level="plan", sort=False)
+    summary = by_plan["overall_percent"].agg(["count", "mean", "median", "min", "max"])
+    summary.columns = ["students", "mean_percent", "median_percent", "min_percent", "max_percent"]
+    grade_counts = pd.crosstab(scores.index.get_level_values("plan"), scores["grade"])
+    grade_counts = grade_counts.reindex(columns=[grade for _, grade in GRADES], fill_value=0)
+    exercise_means = by_plan[[column for column in STEP_TEMPLATES]].mean().add_prefix("mean_")
+    return summary.join(grade_counts).join(exercise_means).reindex(scores.index.unique(level="plan"))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="Файлы статистики (CSV/JSON) или папки с ними")
+    parser.add_argument("--plan", action="append", choices=list(PLANS),
+                        help="Оценивать только по этим планам (по умолчанию - по всем)")
+    parser.add_argument("--output", help="CSV с оценками студентов (по умолчанию - вывод в консоль)")
+    parser.add_argument("--summary", help="CSV со сводкой по группе")
+    args = parser.parse_args()
+
+    paths = expand_paths(args.inputs)
+    plans = {name: PLANS[name] for name in args.plan} if args.plan else PLANS
+    scores = score_sessions(load_sessions(paths), plans)
+    summary = class_summary(scores)
+
+    if args.output:
+        scores.to_csv(args.output, encoding="utf-8")
+    else:
+        print(scores[["overall_percent", "grade"]].to_string())
+    if args.summary:
+        summary.to_csv(args.summary, encoding="utf-8")
+    print()
+    print(f"Студентов: {len(paths)}, планов: {len(plans)}")
+    print(summary[["students", "mean_percent", "median_percent"] + [grade for _, grade in GRADES]].to_string())
+
+if __name__ == '__main__':
+    main()
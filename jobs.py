@@ -0,0 +1,123 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from admission import AdmissionTicket
+from metrics import StageRecorder
+from scratch import ScratchDir
+
+# Фоновые задачи анализа: видео ставится в очередь, клиент опрашивает прогресс
+# и забирает результат. Папка задачи и билет контроля нагрузки освобождаются
+# по окончании задачи.
+
+class JobManager:
+    """Очередь задач анализа видео с ограниченным пулом фоновых потоков.
+
+    run(input_path, output_path, params, progress, recorder) выполняет задачу и
+    возвращает (результат, идентификатор видео или None); finished(задача)
+    вызывается по завершении задачи с любым исходом. Завершенные задачи
+    забываются через ttl секунд.
+    """
+    
+    def __init__(self, workers: int, ttl: float,
+                 run: Callable[[str, str, Dict, Callable[[int, int], None], StageRecorder],
+                               Tuple[Dict, Optional[str]]],
+                 finished: Optional[Callable[[Dict], None]] = None):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="video-job")
+        self.ttl = ttl
+        self.run = run
+        self.finished = finished
+        self.jobs = {}
+        self.lock = threading.Lock()
+    
+    def submit(self, scratch: ScratchDir, ticket: AdmissionTicket, input_path: str, output_path: str,
+               params: Dict, recorder: Optional[StageRecorder] = None) -> str:
+        """Ставит видео в очередь и сразу возвращает идентификатор задачи"""
+        self.purge_expired()
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[job_id] = {
+                "status": "queued",
+                "processed_frames": 0,
+                "total_frames": 0,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "scratch": scratch,
+                "admission": ticket,
+                "video_id": None,
+                "result": None,
+                "error": None,
+                "recorder": recorder or StageRecorder()
+            }
+        self.executor.submit(self._run, job_id, input_path, output_path, params)
+        return job_id
+    
+    def _run(self, job_id, input_path, output_path, params):
+        job = self.jobs[job_id]
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        
+        def on_progress(processed_frames, total_frames):
+            job["processed_frames"] = processed_frames
+            job["total_frames"] = total_frames
+        
+        recorder = job["recorder"]
+        recorder.observe("queue_wait", job["started_at"] - job["submitted_at"])
+        try:
+            # Кадры задачи занимают бюджет с постановки в очередь до конца анализа
+            with job["admission"], job["scratch"]:
+                job["result"], job["video_id"] = self.run(input_path, output_path, params, on_progress, recorder)
+            job["status"] = "done"
+        except Exception as e:
+            job["error"] = str(e)
+            job["status"] = "error"
+        finally:
+            job["finished_at"] = time.time()
+            recorder.observe("request", job["finished_at"] - job["submitted_at"])
+            if self.finished is not None:
+                self.finished(job)
+    
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Состояние задачи: прогресс по кадрам и оценка оставшегося времени"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        processed, total = job["processed_frames"], job["total_frames"]
+        eta = None
+        if job["status"] == "running" and processed > 0 and total > 0:
+            elapsed = time.time() - job["started_at"]
+            eta = elapsed / processed * (total - processed)
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "processed_frames": processed,
+            "total_frames": total,
+            "progress": processed / total if total else 0.0,
+            "eta": eta,
+            "error": job["error"]
+        }
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.jobs.get(job_id)
+    
+    def counts(self) -> Dict[str, int]:
+        """Число задач по состояниям"""
+        counts = {status: 0 for status in ("queued", "running", "done", "error")}
+        with self.lock:
+            for job in self.jobs.values():
+                counts[job["status"]] += 1
+        return counts
+    
+    def purge_expired(self):
+        """Забывает завершенные задачи старше ttl (их видео удаляет purge_videos в api.py)"""
+        now = time.time()
+        with self.lock:
+            expired = [
+                job_id for job_id, job in self.jobs.items()
+                if job["finished_at"] and now - job["finished_at"] > self.ttl
+            ]
+            for job_id in expired:
+                del self.jobs[job_id]
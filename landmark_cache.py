@@ -0,0 +1,169 @@
+import json
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+# Кеш landmarks на диске. Landmarks кадра зависят только от видео, модели и входа
+# модели, поэтому их можно переиспользовать между анализами с разной разметкой.
+# Запись - папка с memmap-массивами landmarks и статусов кадров и meta.json.
+
+# Статусы кадров в кеше landmarks
+FRAME_MISSING = 0  # кадр еще не обрабатывался
+FRAME_NO_POSE = 1  # модель не нашла человека
+FRAME_POSE = 2     # landmarks сохранены
+
+def landmarks_to_array(pose_landmarks) -> np.ndarray:
+    """NormalizedLandmarkList -> массив 33×4 (x, y, z, visibility)"""
+    return np.array(
+        [(lm.x, lm.y, lm.z, lm.visibility) for lm in pose_landmarks.landmark], dtype=np.float32)
+
+def landmarks_from_array(row: np.ndarray) -> landmark_pb2.NormalizedLandmarkList:
+    """Массив 33×4 -> NormalizedLandmarkList, пригодный для count_* и draw_landmarks"""
+    pose_landmarks = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z, visibility in row.tolist():
+        pose_landmarks.landmark.add(x=x, y=y, z=z, visibility=visibility)
+    return pose_landmarks
+
+class LandmarkCacheEntry:
+    """Запись кеша: memmap-массивы landmarks (кадры×33×4) и статусов кадров"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            total_frames = json.load(f)["total_frames"]
+        self.landmarks = np.memmap(os.path.join(path, "landmarks.f32"), dtype=np.float32,
+                                   mode="r+", shape=(total_frames, 33, 4))
+        self.status = np.memmap(os.path.join(path, "status.u8"), dtype=np.uint8,
+                                mode="r+", shape=(total_frames,))
+    
+    def __len__(self):
+        return len(self.status)
+    
+    def covers(self, segments: List[Tuple[int, int, Tuple[str, ...]]]) -> bool:
+        """Есть ли в кеше все кадры отрезков"""
+        return all(
+            end < len(self) and np.all(self.status[start:end + 1] != FRAME_MISSING)
+            for start, end, _ in segments
+        )
+    
+    def covers_sampled(self, segments: List[Tuple[int, int, Tuple[str, ...]]], inferred_mask: np.ndarray,
+                       inferred_frames: int) -> bool:
+        """Покрытие после адаптивной выборки: концы отрезков отмечены в inferred_mask,
+        отмеченных кадров не меньше inferred_frames, и все они есть в кеше.
+        Кадры, записанные в кеш другими анализами, не в счет."""
+        if any(end >= len(self) or not inferred_mask[end] for _, end, _ in segments):
+            return False
+        inferred = 0
+        for start, end, _ in segments:
+            frames = np.flatnonzero(inferred_mask[start:end + 1]) + start
+            if np.any(self.status[frames] == FRAME_MISSING):
+                return False
+            inferred += len(frames)
+        return inferred >= inferred_frames
+    
+    def get(self, frame_index: int):
+        """landmarks кадра или None, если человек не найден"""
+        if frame_index >= len(self) or self.status[frame_index] != FRAME_POSE:
+            return None
+        return landmarks_from_array(self.landmarks[frame_index])
+    
+    def put(self, frame_index: int, pose_landmarks):
+        if frame_index >= len(self):
+            return
+        if pose_landmarks:
+            self.landmarks[frame_index] = landmarks_to_array(pose_landmarks)
+            self.status[frame_index] = FRAME_POSE
+        else:
+            self.status[frame_index] = FRAME_NO_POSE
+    
+    def flush(self):
+        self.landmarks.flush()
+        self.status.flush()
+
+class LandmarkCache:
+    """Дисковый кеш landmarks по SHA-256 видео и model_complexity.
+
+    Landmarks не зависят от exercise_ranges, поэтому повторный анализ того же видео
+    с другой разметкой считает только счетчики. Записи вытесняются по размеру
+    в порядке давности использования (LRU).
+    """
+    
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+    
+    def open(self, video_hash: str, model_complexity: int, total_frames: int,
+             variant: str = "") -> Optional[LandmarkCacheEntry]:
+        """Открывает (или создает пустую) запись кеша для видео"""
+        if total_frames <= 0:
+            return None
+        path = os.path.join(self.root, f"{video_hash}_{model_complexity}{variant}")
+        meta_path = os.path.join(path, "meta.json")
+        created = False
+        with self.lock:
+            if not os.path.exists(meta_path):
+                os.makedirs(path, exist_ok=True)
+                np.memmap(os.path.join(path, "landmarks.f32"), dtype=np.float32,
+                          mode="w+", shape=(total_frames, 33, 4)).flush()
+                np.memmap(os.path.join(path, "status.u8"), dtype=np.uint8,
+                          mode="w+", shape=(total_frames,)).flush()
+                # meta.json пишется последним и отмечает запись как готовую
+                with open(meta_path, "w") as f:
+                    json.dump({"total_frames": total_frames, "model_complexity": model_complexity}, f)
+                created = True
+            os.utime(meta_path)
+        if created:
+            self.evict(keep=path)
+        return LandmarkCacheEntry(path)
+    
+    def record(self, hit: bool):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(время использования, размер, путь) всех записей"""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                last_used = os.path.getmtime(os.path.join(path, "meta.json"))
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            except OSError:
+                continue
+            entries.append((last_used, size, path))
+        return entries
+    
+    def evict(self, keep: Optional[str] = None):
+        """Удаляет самые давно использованные записи, пока кеш больше max_bytes"""
+        with self.lock:
+            entries = sorted(self._entries())
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total_size <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                total_size -= size
+    
+    def stats(self) -> Dict:
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes
+        }
@@ -0,0 +1,103 @@
+"""Компактный экспорт результатов анализа: landmarks по кадрам и таблица повторений.
+
+Файл - несжатый .npz с колоночными массивами, поэтому read_export отображает
+их в память без копирования (np.memmap по смещению внутри zip) и повторный
+анализ не требует ни видео, ни MediaPipe. Модуль зависит только от NumPy.
+
+Массивы:
+    frame            int32 (N,)        номер кадра видео
+    landmarks        float16/32 (N,33,4) x, y, z, visibility
+    status           uint8 (N,)        0 - нет данных, 1 - человек не найден, 2 - landmarks есть
+    inferred         bool (N,)         модель запускалась на этом кадре (иначе landmarks
+                                       взяты у следующего кадра, как их видел счетчик)
+    rep_exercise     uint8 (R,)        индекс в exercises
+    rep_start_frame  int32 (R,)        кадр перехода в рабочую фазу (засчитывание повторения)
+    rep_end_frame    int32 (R,)        последний кадр рабочей фазы
+    rep_bottom_frame int32 (R,)        кадр нижней (для подтягиваний - верхней) точки, -1 у планки
+    rep_duration     float32 (R,)      длительность фазы по часам видео, сек
+    exercises        str (E,)          названия упражнений
+    meta             str ()            JSON: fps, размер кадра, отрезки упражнений и т.п.
+
+Пример:
+    python landmark_export.py export.npz
+"""
+import argparse
+import json
+import os
+import zipfile
+from typing import Dict, List
+
+import numpy as np
+
+LANDMARK_DTYPES = {"float16": np.float16, "float32": np.float32}
+
+REP_COLUMNS = ("rep_exercise", "rep_start_frame", "rep_end_frame", "rep_bottom_frame", "rep_duration")
+
+def write_export(path: str, arrays: Dict[str, np.ndarray], meta: Dict):
+    """Пишет массивы и meta в несжатый .npz (через временный файл, атомарно)"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+    os.replace(tmp_path, path)
+
+def _member_array(f, info: zipfile.ZipInfo, path: str) -> np.ndarray:
+    """Массив .npy внутри zip как memmap, без чтения данных"""
+    f.seek(info.header_offset)
+    local_header = f.read(30)
+    name_length = int.from_bytes(local_header[26:28], "little")
+    extra_length = int.from_bytes(local_header[28:30], "little")
+    f.seek(info.header_offset + 30 + name_length + extra_length)
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    if dtype.hasobject:
+        raise ValueError(f"{info.filename}: object arrays are not supported")
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                     order="F" if fortran_order else "C")
+
+def read_export(path: str) -> Dict:
+    """Открывает экспорт: {имя: массив (memmap)}, meta - уже разобранный словарь"""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                # Сжатый архив (например, пересохраненный) читается обычным способом
+                arrays[name] = np.load(archive.open(info), allow_pickle=False)
+            else:
+                arrays[name] = _member_array(f, info, path)
+    arrays["meta"] = json.loads(str(np.asarray(arrays["meta"])[()]))
+    return arrays
+
+def rep_events(export: Dict) -> List[Dict]:
+    """Таблица повторений строками: [{"exercise", "start_frame", ...}, ...]"""
+    exercises = [str(name) for name in export["exercises"]]
+    return [
+        {
+            "exercise": exercises[ex],
+            "start_frame": int(start),
+            "end_frame": int(end),
+            "bottom_frame": int(bottom),
+            "duration": float(duration)
+        }
+        for ex, start, end, bottom, duration in zip(*(export[column] for column in REP_COLUMNS))
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("export", help="Файл .npz из /exports/<id>")
+    args = parser.parse_args()
+
+    export = read_export(args.export)
+    meta = export["meta"]
+    print(f"Кадров: {len(export['frame'])}, landmarks: {export['landmarks'].dtype}, fps: {meta['fps']}")
+    for event in rep_events(export):
+        print(f"{event['exercise']}: кадры {event['start_frame']}-{event['end_frame']}, "
+              f"нижняя точка {event['bottom_frame']}, {event['duration']:.2f} сек")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from analysis import (CounterTuning, InferenceInput, advance_clock, annotate_frame, clock_stats,
+                      create_exercise_state, filter_exercise_stats, update_exercise)
+from pose_pool import create_pose
+
+# Онлайн-подсчет повторений: сессии получают кадры по одному (от клиента или
+# из источника на сервере) и отдают счетчики и размеченные кадры по мере обработки.
+
+# Паузы между кадрами длиннее этого (сек) не засчитываются во время упражнения
+LIVE_MAX_FRAME_GAP = 1.0
+
+class LiveSession:
+    """Онлайн-подсчет повторений: кадры приходят по одному, счетчики живут всю сессию.
+
+    У сессии своя модель Pose в режиме трекинга и свой поток обработки. Кадры
+    кладутся в слот на один кадр: если модель не успевает, необработанный кадр
+    заменяется новым и считается пропущенным, поэтому задержка не накапливается.
+    Источником может быть клиент (push) или камера/файл/pipe (source, см. resolve_live_source
+    в api.py). max_side - максимальная сторона кадра для модели (0 - без уменьшения),
+    jpeg_quality - качество JPEG размеченных кадров.
+    """
+    
+    def __init__(self, exercises: Tuple[str, ...], model_complexity: int = 1,
+                 source: Optional[str] = None, tuning: Optional[CounterTuning] = None,
+                 max_side: int = 0, jpeg_quality: int = 70):
+        self.id = uuid.uuid4().hex
+        self.exercises = exercises
+        # Часы сессии в секундах, поэтому и минимальная длительность повторения в секундах
+        self.tuning = tuning or CounterTuning()
+        self.pose = create_pose(model_complexity)
+        self.inference_input = InferenceInput(max_side)
+        self.jpeg_quality = jpeg_quality
+        self.exercise_states, self.exercise_stats = create_exercise_state()
+        self.cond = threading.Condition()
+        self.pending = None
+        self.status = "running"
+        self.error = None
+        self.seq = 0
+        self.jpeg = None
+        self.received_frames = 0
+        self.processed_frames = 0
+        self.dropped_frames = 0
+        self.last_latency = None
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_frame_time = None
+        self.last_activity = time.time()
+        self.worker = threading.Thread(target=self._run, daemon=True, name=f"live-{self.id[:8]}")
+        self.worker.start()
+        if source is not None:
+            threading.Thread(target=self._read_source, args=(source,), daemon=True).start()
+    
+    def push(self, frame: np.ndarray, received_at: Optional[float] = None) -> bool:
+        """Кладет кадр в слот; False, если сессия уже закрыта"""
+        with self.cond:
+            if self.status != "running":
+                return False
+            if self.pending is not None:
+                self.dropped_frames += 1
+            self.pending = (frame, received_at or time.time())
+            self.received_frames += 1
+            self.last_activity = time.time()
+            self.cond.notify_all()
+        return True
+    
+    def set_exercises(self, exercises: Tuple[str, ...]):
+        with self.cond:
+            self.exercises = exercises
+            self.last_activity = time.time()
+    
+    def touch(self):
+        """Сессию смотрят: она не простаивает, даже пока клиент еще не прислал кадры"""
+        with self.cond:
+            self.last_activity = time.time()
+    
+    def _read_source(self, source: str):
+        """Читает файл, pipe или камеру (номер устройства) как живой источник.
+
+        Файл отдается в темпе его fps, как камера: кадры, которые модель
+        не успела взять, вытесняются следующими.
+        """
+        cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        is_file = os.path.isfile(source)
+        started = time.time()
+        index = 0
+        try:
+            while self.status == "running":
+                success, frame = cap.read()
+                if not success:
+                    break
+                if is_file and fps > 0:
+                    delay = started + index / fps - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                index += 1
+                self.push(frame)
+        finally:
+            cap.release()
+        # Дожидаемся обработки последнего кадра и отмечаем конец источника
+        with self.cond:
+            self.cond.wait_for(lambda: self.pending is None or self.status != "running", timeout=5)
+            if self.status == "running":
+                self.status = "finished"
+            self.cond.notify_all()
+    
+    def _run(self):
+        try:
+            while True:
+                with self.cond:
+                    self.cond.wait_for(lambda: self.pending is not None or self.status != "running")
+                    if self.pending is None:
+                        break
+                    frame, received_at = self.pending
+                    self.pending = None
+                    exercises = self.exercises
+                self._process(frame, received_at, exercises)
+        except Exception as e:
+            with self.cond:
+                self.error = str(e)
+                self.status = "error"
+                self.cond.notify_all()
+        finally:
+            self.pose.close()
+    
+    def _process(self, frame: np.ndarray, received_at: float, exercises: Tuple[str, ...]):
+        """Инференс, счетчики и размеченный JPEG для одного кадра"""
+        pose_landmarks = self.inference_input.process(self.pose, frame)
+        # Часы сессии - время получения кадров: кадр длится до следующего
+        gap = 0.0
+        if self.last_frame_time is not None:
+            gap = received_at - self.last_frame_time
+            if not 0 < gap <= LIVE_MAX_FRAME_GAP:
+                gap = 0.0
+        self.last_frame_time = received_at
+        with self.cond:
+            advance_clock(exercises, self.exercise_states, gap)
+            if pose_landmarks:
+                counted = self.tuning.smooth(pose_landmarks, received_at)
+                for ex_type in exercises:
+                    update_exercise(ex_type, counted, self.exercise_states, self.exercise_stats, gap,
+                                    self.tuning)
+        if pose_landmarks:
+            annotate_frame(frame, pose_landmarks, exercises)
+        success, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        latency = time.time() - received_at
+        with self.cond:
+            if success:
+                self.jpeg = encoded.tobytes()
+            self.processed_frames += 1
+            self.last_latency = latency
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.seq += 1
+            self.cond.notify_all()
+    
+    def wait_frame(self, seq: int, timeout: float = 1.0) -> Tuple[int, Optional[bytes]]:
+        """Ждет размеченный кадр новее seq"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > seq or self.status != "running", timeout=timeout)
+            return self.seq, self.jpeg
+    
+    def close(self):
+        with self.cond:
+            if self.status == "running":
+                self.status = "closed"
+            self.cond.notify_all()
+    
+    def state(self) -> Dict:
+        """Текущие счетчики и задержка обработки"""
+        with self.cond:
+            processed = self.processed_frames
+            return {
+                "session_id": self.id,
+                "status": self.status,
+                "exercises": list(self.exercises),
+                "exercise_stats": filter_exercise_stats(
+                    clock_stats(self.exercise_states, self.exercise_stats, 1.0)),
+                "received_frames": self.received_frames,
+                "processed_frames": processed,
+                "dropped_frames": self.dropped_frames,
+                "counting": self.tuning.report(),
+                "latency_ms": {
+                    "last": round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+                    "mean": round(self.total_latency / processed * 1000, 1) if processed else None,
+                    "max": round(self.max_latency * 1000, 1)
+                },
+                "error": self.error
+            }
+
+class LiveSessionManager:
+    """Открытые онлайн-сессии; простаивающие дольше ttl секунд закрываются"""
+    
+    def __init__(self, max_sessions: int, ttl: float, max_side: int = 0, jpeg_quality: int = 70):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+        self.sessions = {}
+        self.lock = threading.Lock()
+    
+    def create(self, exercises: Tuple[str, ...], model_complexity: int,
+               source: Optional[str] = None, tuning: Optional[CounterTuning] = None) -> Optional[LiveSession]:
+        """Новая сессия или None, если достигнут лимит"""
+        self.purge_idle()
+        with self.lock:
+            if len(self.sessions) >= self.max_sessions:
+                return None
+            session = LiveSession(exercises, model_complexity, source, tuning,
+                                  self.max_side, self.jpeg_quality)
+            self.sessions[session.id] = session
+        return session
+    
+    def get(self, session_id: str) -> Optional[LiveSession]:
+        return self.sessions.get(session_id)
+    
+    def remove(self, session_id: str) -> Optional[LiveSession]:
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session
+    
+    def purge_idle(self):
+        now = time.time()
+        with self.lock:
+            idle = [
+                session_id for session_id, session in self.sessions.items()
+                if now - session.last_activity > self.ttl
+            ]
+        for session_id in idle:
+            self.remove(session_id)
@@ -0,0 +1,93 @@
+"""Клиент онлайн-подсчета: отправляет кадры камеры или файла в API по мере съемки.
+
+Кадр уходит JPEG-ом в /live/sessions/<id>/frames, в ответ сразу приходят
+текущие счетчики. Размеченное видео можно смотреть в браузере по stream_url.
+С --session клиент отправляет кадры в сессию, открытую в app.py: ее счетчики
+показывает и закрывает приложение.
+
+Пример:
+    python live_client.py 0 --exercise Приседания
+    python live_client.py workout.mp4 --exercise Отжимания --api http://localhost:5000
+    python live_client.py 0 --session 3f2a... --api http://localhost:5000
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+import requests
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="Номер камеры или путь к видео")
+    parser.add_argument("--exercise", help="Упражнение (несколько - через запятую)")
+    parser.add_argument("--session", help="Идентификатор уже открытой сессии (например, из app.py)")
+    parser.add_argument("--api", default=os.environ.get("API_URL", "http://localhost:5000"))
+    parser.add_argument("--model-complexity", type=int, default=1)
+    parser.add_argument("--max-side", type=int, default=640, help="Уменьшать кадр перед отправкой")
+    parser.add_argument("--quality", type=int, default=80, help="Качество JPEG")
+    args = parser.parse_args()
+    if not args.session and not args.exercise:
+        parser.error("--exercise is required without --session")
+
+    if args.session:
+        base = f"/live/sessions/{args.session}"
+        session = {"session_id": args.session, "frames_url": f"{base}/frames",
+                   "stream_url": f"{base}/stream", "state_url": base}
+    else:
+        response = requests.post(f"{args.api}/live/sessions", timeout=(5, 30), data={
+            "exercise": args.exercise, "model_complexity": args.model_complexity})
+        response.raise_for_status()
+        session = response.json()
+    print(f"Сессия {session['session_id']}, видео: {args.api}{session['stream_url']}")
+
+    cap = cv2.VideoCapture(int(args.source) if args.source.isdigit() else args.source)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    is_file = os.path.isfile(args.source)
+    started = time.time()
+    index = 0
+    state = None
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            # Файл отправляется в темпе съемки, как с камеры
+            if is_file and fps > 0:
+                delay = started + index / fps - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -1 / fps:
+                    index += 1
+                    continue
+            index += 1
+            height, width = frame.shape[:2]
+            if args.max_side and max(width, height) > args.max_side:
+                scale = args.max_side / max(width, height)
+                frame = cv2.resize(frame, (round(width * scale), round(height * scale)),
+                                   interpolation=cv2.INTER_AREA)
+            _, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, args.quality])
+            response = requests.post(f"{args.api}{session['frames_url']}", data=jpeg.tobytes(),
+                                     headers={"Content-Type": "image/jpeg"}, timeout=(5, 10))
+            if response.status_code != 202:
+                # Сессию закрыли (например, кнопкой в приложении)
+                break
+            state = response.json()
+            counts = ", ".join(f"{ex}: {stats['count']}" for ex, stats in state["exercise_stats"].items())
+            print(f"\r{counts or 'нет повторений'} | задержка {state['latency_ms']['last']} мс, "
+                  f"пропущено {state['dropped_frames']}", end="", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cap.release()
+        if args.session:
+            # Итог чужой сессии показывает тот, кто ее открыл
+            print()
+            return
+        final = requests.delete(f"{args.api}{session['state_url']}", timeout=(5, 30)).json()
+        print()
+        print(json.dumps(final, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import os
+import time
+import bisect
+import threading
+import contextlib
+from typing import Dict, Tuple, Callable, Optional
+
+# Метрики обработки видео в текстовом формате Prometheus (без prometheus_client).
+# Покадровые замеры копятся в StageRecorder запроса без блокировок и попадают
+# в общий реестр одним merge в конце запроса, поэтому их можно не выключать.
+
+# Границы корзин гистограмм, секунды: от долей миллисекунды (кадр) до минут (запрос)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (le-семантика Prometheus)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+class StageRecorder:
+    """Замеры одного запроса: время стадий и число кадров с найденным человеком.
+
+    Каждую стадию пишет один поток, поэтому блокировки не нужны. Объект
+    сериализуется pickle и возвращается из процессов параллельного анализа.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.frames = 0
+        self.frames_with_pose = 0
+
+    def observe(self, stage: str, seconds: float):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages.setdefault(stage, Histogram())
+        histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def time(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def frame(self, has_pose: bool):
+        self.frames += 1
+        if has_pose:
+            self.frames_with_pose += 1
+
+    def merge(self, other: "StageRecorder"):
+        for stage, histogram in other.stages.items():
+            self.stages.setdefault(stage, Histogram()).merge(histogram)
+        self.frames += other.frames
+        self.frames_with_pose += other.frames_with_pose
+
+    def summary(self) -> Dict:
+        """Сводка для JSON ответа"""
+        return {
+            "stages": {
+                stage: {
+                    "count": histogram.count,
+                    "total_seconds": round(histogram.sum, 4),
+                    "mean_ms": round(histogram.sum / histogram.count * 1000, 3) if histogram.count else 0.0,
+                    "max_ms": round(histogram.max * 1000, 3)
+                }
+                for stage, histogram in self.stages.items()
+            },
+            "frames_processed": self.frames,
+            "frames_with_pose": self.frames_with_pose,
+            "landmark_detection_rate": round(self.frames_with_pose / self.frames, 4) if self.frames else None
+        }
+
+def directory_size(path: str) -> int:
+    """Размер файлов в папке (рекурсивно), байты; 0, если папки нет"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+class MetricsRegistry:
+    """Общие метрики процесса API и их вывод для /metrics"""
+
+    def __init__(self, prefix: str = "diplom"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.totals = StageRecorder()
+        self.counters = {}
+        self.gauges = []
+
+    def record(self, recorder: StageRecorder):
+        """Добавляет замеры завершенного запроса"""
+        with self.lock:
+            self.totals.merge(recorder)
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, help_text: str, collect: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]):
+        """Регистрирует gauge, значение которого считается в момент запроса /metrics.
+
+        collect возвращает {кортеж пар (метка, значение): число}.
+        """
+        self.gauges.append((name, help_text, collect))
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus 0.0.4"""
+        p = self.prefix
+        lines = []
+        with self.lock:
+            totals = StageRecorder()
+            totals.merge(self.totals)
+            counters = dict(self.counters)
+
+        lines.append(f"# HELP {p}_stage_seconds Время стадии обработки (на кадр или на запрос)")
+        lines.append(f"# TYPE {p}_stage_seconds histogram")
+        for stage, histogram in sorted(totals.stages.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        lines.append(f"# HELP {p}_frames_processed_total Обработанные кадры")
+        lines.append(f"# TYPE {p}_frames_processed_total counter")
+        lines.append(f"{p}_frames_processed_total {totals.frames}")
+        lines.append(f"# HELP {p}_frames_without_pose_total Кадры, где модель не нашла человека")
+        lines.append(f"# TYPE {p}_frames_without_pose_total counter")
+        lines.append(f"{p}_frames_without_pose_total {totals.frames - totals.frames_with_pose}")
+        lines.append(f"# HELP {p}_landmark_detection_ratio Доля кадров с найденным человеком")
+        lines.append(f"# TYPE {p}_landmark_detection_ratio gauge")
+        ratio = totals.frames_with_pose / totals.frames if totals.frames else 0.0
+        lines.append(f"{p}_landmark_detection_ratio {ratio}")
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {p}_{name} counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{p}_{name}{_labels(dict(labels))} {value}")
+
+        for name, help_text, collect in self.gauges:
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} gauge")
+            for labels, value in collect().items():
+                lines.append(f"{p}_{name}{_labels(dict(labels))} {value}")
+        return "\n".join(lines) + "\n"
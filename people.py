@@ -0,0 +1,142 @@
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Поиск и сопровождение нескольких людей в кадре для группового режима.
+# Детектор - HOG из OpenCV (без дополнительных моделей), сопровождение - жадное
+# сопоставление рамок по IoU. Между запусками детектора рамку трека обновляет
+# сама модель Pose (по landmarks), поэтому детектор нужен только раз в несколько кадров.
+
+Box = Tuple[int, int, int, int]  # x0, y0, x1, y1 в пикселях кадра
+
+def iou_matrix(boxes_a: List[Box], boxes_b: List[Box]) -> np.ndarray:
+    """Матрица IoU: строка - рамка из boxes_a, колонка - из boxes_b"""
+    if not boxes_a or not boxes_b:
+        return np.zeros((len(boxes_a), len(boxes_b)))
+    a = np.asarray(boxes_a, dtype=np.float64)[:, None, :]
+    b = np.asarray(boxes_b, dtype=np.float64)[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-9)
+
+def expand_box(box: Box, padding: float, width: int, height: int) -> Box:
+    """Рамка с запасом padding от ее размера, обрезанная по кадру"""
+    x0, y0, x1, y1 = box
+    pad_x, pad_y = (x1 - x0) * padding, (y1 - y0) * padding
+    return (int(max(x0 - pad_x, 0)), int(max(y0 - pad_y, 0)),
+            int(min(x1 + pad_x, width)), int(min(y1 + pad_y, height)))
+
+class PersonDetector:
+    """Детектор людей в полный рост: HOG + линейный SVM из OpenCV.
+
+    Кадр уменьшается до max_side по большей стороне, пересекающиеся рамки
+    схлопываются NMS. Возвращает рамки в координатах исходного кадра.
+    """
+
+    def __init__(self, max_side: int = 640, min_score: float = 0.3, nms_threshold: float = 0.4):
+        self.max_side = max_side
+        self.min_score = min_score
+        self.nms_threshold = nms_threshold
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def detect(self, frame: np.ndarray) -> List[Box]:
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.max_side / max(width, height)) if self.max_side else 1.0
+        image = frame
+        if scale < 1.0:
+            image = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        rects, weights = self.hog.detectMultiScale(image, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects) == 0:
+            return []
+        scores = np.asarray(weights, dtype=np.float64).reshape(-1)
+        keep = cv2.dnn.NMSBoxes([list(map(int, r)) for r in rects], scores.tolist(),
+                                self.min_score, self.nms_threshold)
+        boxes = []
+        for i in np.asarray(keep).reshape(-1):
+            x, y, w, h = rects[i]
+            boxes.append((int(x / scale), int(y / scale), int(min((x + w) / scale, width)),
+                          int(min((y + h) / scale, height))))
+        return boxes
+
+class Track:
+    """Сопровождаемый человек: номер, рамка и кадры, на которых он был найден"""
+
+    def __init__(self, track_id: int, box: Box, frame_index: int):
+        self.id = track_id
+        self.box = box
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.misses = 0
+
+class PersonTracker:
+    """Жадное сопоставление рамок с треками по IoU.
+
+    HOG находит только людей в полный рост, поэтому детекции лишь добавляют
+    новые треки и возвращают потерянные, а жив ли трек, решает модель Pose:
+    трек, на котором она max_misses кадров подряд не нашла человека, завершается.
+    Одновременно живет не больше max_tracks треков.
+    """
+
+    def __init__(self, max_tracks: int, iou_threshold: float = 0.3, max_misses: int = 30,
+                 duplicate_iou: float = 0.7):
+        self.max_tracks = max_tracks
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.duplicate_iou = duplicate_iou
+        self.tracks: List[Track] = []
+        self.next_id = 1
+
+    def match(self, detections: List[Box], frame_index: int) -> List[Track]:
+        """Сопоставляет детекции кадра с треками; возвращает новые треки"""
+        iou = iou_matrix([track.box for track in self.tracks], detections)
+        matched_tracks, matched_detections = set(), set()
+        # Пары по убыванию IoU, каждый трек и каждая детекция - не больше одного раза
+        for flat in np.argsort(-iou, axis=None):
+            t, d = np.unravel_index(flat, iou.shape)
+            if iou[t, d] < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            track = self.tracks[t]
+            # Рамка по landmarks точнее; рамку детектора берет только потерянный трек
+            if track.misses:
+                track.box = detections[d]
+        new = []
+        for d, box in enumerate(detections):
+            if d in matched_detections or len(self.tracks) >= self.max_tracks:
+                continue
+            track = Track(self.next_id, box, frame_index)
+            self.next_id += 1
+            self.tracks.append(track)
+            new.append(track)
+        return new
+
+    def update(self, track: Track, box: Optional[Box], frame_index: int) -> bool:
+        """Рамка трека по landmarks (None - модель человека не нашла); True, если трек пора завершить"""
+        if box is None:
+            track.misses += 1
+            return track.misses > self.max_misses
+        track.box = box
+        track.misses = 0
+        track.last_frame = frame_index
+        return False
+
+    def duplicates(self) -> List[Track]:
+        """Треки, чья рамка почти совпадает с рамкой более старого трека (один человек дважды)"""
+        boxes = [track.box for track in self.tracks]
+        iou = iou_matrix(boxes, boxes)
+        duplicates = []
+        for i, track in enumerate(self.tracks):
+            if any(iou[i, j] >= self.duplicate_iou for j in range(i) if self.tracks[j] not in duplicates):
+                duplicates.append(track)
+        return duplicates
+
+    def remove(self, tracks: List[Track]):
+        self.tracks = [track for track in self.tracks if track not in tracks]
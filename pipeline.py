@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator
+
+# Конвейер кадров последовательного анализа (см. analyze_video и analyze_span в analysis.py):
+# декодирование, инференс и кодирование видео перекрываются по времени.
+
+class FramePipeline:
+    """Конвейер из трех стадий: декодирование -> инференс -> разметка/кодирование.
+
+    Декодер и кодировщик работают в своих потоках (OpenCV отпускает GIL),
+    инференс - в вызывающем потоке. Стадии связаны очередями ограниченного размера,
+    поэтому память не растет с длиной видео. Элементы несут порядковый номер,
+    и кодировщик проверяет, что кадры приходят строго по порядку.
+    """
+    
+    _DONE = object()
+    
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.stop = threading.Event()
+        self.errors = []
+        self.stages = {
+            name: {"busy": 0.0, "wait": 0.0, "items": 0}
+            for name in ("decode", "inference", "encode")
+        }
+    
+    def _put(self, q: queue.Queue, item, stage: str):
+        started = time.perf_counter()
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.stages[stage]["wait"] += time.perf_counter() - started
+    
+    def _get(self, q: queue.Queue, stage: str):
+        started = time.perf_counter()
+        while not self.stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        else:
+            item = self._DONE
+        self.stages[stage]["wait"] += time.perf_counter() - started
+        return item
+    
+    def _decode(self, source: Iterator, decoded: queue.Queue):
+        try:
+            seq = 0
+            while not self.stop.is_set():
+                started = time.perf_counter()
+                item = next(source, self._DONE)
+                self.stages["decode"]["busy"] += time.perf_counter() - started
+                if item is self._DONE:
+                    break
+                self.stages["decode"]["items"] += 1
+                self._put(decoded, (seq, item), "decode")
+                seq += 1
+        except Exception as e:
+            self.errors.append(e)
+            self.stop.set()
+        finally:
+            self._put(decoded, self._DONE, "decode")
+    
+    def _encode(self, inferred: queue.Queue, sink: Callable):
+        try:
+            expected = 0
+            while True:
+                item = self._get(inferred, "encode")
+                if item is self._DONE:
+                    break
+                seq, value = item
+                if seq != expected:
+                    raise RuntimeError(f"Нарушен порядок кадров: {seq} вместо {expected}")
+                started = time.perf_counter()
+                sink(value)
+                self.stages["encode"]["busy"] += time.perf_counter() - started
+                self.stages["encode"]["items"] += 1
+                expected += 1
+        except Exception as e:
+            self.errors.append(e)
+            self.stop.set()
+    
+    def run(self, source: Iterable, process: Callable, sink: Callable) -> Dict:
+        """Прогоняет элементы source через process (в этом потоке) и sink (в потоке кодировщика)"""
+        decoded = queue.Queue(maxsize=self.queue_size)
+        inferred = queue.Queue(maxsize=self.queue_size)
+        decoder = threading.Thread(target=self._decode, args=(iter(source), decoded), daemon=True)
+        encoder = threading.Thread(target=self._encode, args=(inferred, sink), daemon=True)
+        wall_started = time.perf_counter()
+        decoder.start()
+        encoder.start()
+        try:
+            while True:
+                item = self._get(decoded, "inference")
+                if item is self._DONE:
+                    break
+                seq, value = item
+                started = time.perf_counter()
+                result = process(value)
+                self.stages["inference"]["busy"] += time.perf_counter() - started
+                self.stages["inference"]["items"] += 1
+                self._put(inferred, (seq, result), "inference")
+        except Exception as e:
+            self.errors.append(e)
+            self.stop.set()
+        finally:
+            self._put(inferred, self._DONE, "inference")
+            decoder.join()
+            encoder.join()
+        if self.errors:
+            raise self.errors[0]
+        return self.report(time.perf_counter() - wall_started)
+    
+    def report(self, wall_time: float) -> Dict:
+        """Загрузка стадий: доля времени в работе и в ожидании соседних стадий"""
+        stages = {
+            name: {
+                "items": stage["items"],
+                "busy_seconds": round(stage["busy"], 4),
+                "wait_seconds": round(stage["wait"], 4),
+                "utilisation": round(stage["busy"] / wall_time, 4) if wall_time > 0 else 0.0
+            }
+            for name, stage in self.stages.items()
+        }
+        return {
+            "wall_seconds": round(wall_time, 4),
+            "stages": stages,
+            "bottleneck": max(stages, key=lambda name: stages[name]["busy_seconds"])
+        }
@@ -0,0 +1,131 @@
+import contextlib
+import queue
+import threading
+from typing import Dict
+
+import mediapipe as mp
+
+# Модели Pose MediaPipe: загрузка модели занимает сотни миллисекунд, поэтому
+# запросы берут готовые модели из пула и возвращают их после анализа.
+
+MODEL_COMPLEXITIES = (0, 1, 2)
+
+def parse_pool_sizes(spec: str) -> Dict[int, int]:
+    """Разбирает строку вида "0:1,1:2,2:1" в {model_complexity: размер пула}"""
+    sizes = {complexity: 1 for complexity in MODEL_COMPLEXITIES}
+    for item in spec.split(","):
+        if ":" not in item:
+            continue
+        complexity, size = item.split(":", 1)
+        if int(complexity) in sizes:
+            sizes[int(complexity)] = max(1, int(size))
+    return sizes
+
+def create_pose(model_complexity: int):
+    """Новая модель Pose с настройками по умолчанию"""
+    return mp.solutions.pose.Pose(
+        model_complexity=model_complexity,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5)
+
+class PosePool:
+    """Пул загруженных моделей Pose по model_complexity.
+
+    Модель выдается через checkout() и возвращается в пул после использования,
+    состояние трекинга сбрасывается перед каждой выдачей. Моделей каждой
+    сложности создается не больше размера пула, лишние запросы ждут свободную.
+    """
+    
+    def __init__(self, sizes: Dict[int, int]):
+        self.sizes = sizes
+        self.available = {complexity: queue.Queue() for complexity in sizes}
+        self.created = {complexity: 0 for complexity in sizes}
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.warming = False
+        self.error = None
+    
+    def warm(self):
+        """Загружает все модели пула заранее"""
+        errors = []
+        for complexity, size in self.sizes.items():
+            try:
+                while self._reserve(complexity):
+                    self.available[complexity].put(self._create(complexity))
+            except Exception as e:
+                errors.append(f"model_complexity={complexity}: {e}")
+        self.error = "; ".join(errors) or None
+        if not errors:
+            self.ready.set()
+    
+    def _reserve(self, model_complexity: int) -> bool:
+        """Резервирует место под новую модель, если пул еще не заполнен"""
+        with self.lock:
+            if self.created[model_complexity] >= self.sizes[model_complexity]:
+                return False
+            self.created[model_complexity] += 1
+            return True
+    
+    def _create(self, model_complexity: int):
+        try:
+            return create_pose(model_complexity)
+        except Exception:
+            with self.lock:
+                self.created[model_complexity] -= 1
+            raise
+    
+    def warm_async(self):
+        """Запускает прогрев в фоне (один раз)"""
+        with self.lock:
+            if self.warming:
+                return
+            self.warming = True
+        threading.Thread(target=self.warm, name="pose-pool-warmup", daemon=True).start()
+    
+    @contextlib.contextmanager
+    def checkout(self, model_complexity: int):
+        """Выдает модель из пула на время блока with"""
+        pose = self.acquire(model_complexity)
+        try:
+            yield pose
+        finally:
+            self.release(pose, model_complexity)
+    
+    def acquire(self, model_complexity: int, block: bool = True):
+        """Модель со сброшенным трекингом; при block=False - None, если свободных нет"""
+        available = self.available[model_complexity]
+        if available.empty() and self._reserve(model_complexity):
+            return self._create(model_complexity)
+        try:
+            return self.reset(available.get(block=block), model_complexity)
+        except queue.Empty:
+            return None
+    
+    def release(self, pose, model_complexity: int):
+        self.available[model_complexity].put(pose)
+    
+    @staticmethod
+    def reset(pose, model_complexity: int):
+        """Сбрасывает трекинг модели; если reset() недоступен - пересоздает модель.
+
+        Возвращает модель, которой пользоваться дальше (и вернуть в пул).
+        """
+        if hasattr(pose, "reset"):
+            pose.reset()
+            return pose
+        pose.close()
+        return create_pose(model_complexity)
+    
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready.is_set(),
+            "error": self.error,
+            "models": {
+                str(complexity): {
+                    "size": self.sizes[complexity],
+                    "created": self.created[complexity],
+                    "available": self.available[complexity].qsize()
+                }
+                for complexity in self.sizes
+            }
+        }
@@ -0,0 +1,25 @@
+"""Отчет: ускорение и совпадение счетчиков при уменьшенном разрешении для модели.
+
+Пример:
+    python resolution_report.py workout.mp4 --ranges "[(0, 30, 'Отжимания')]" --max-side 640 --crop
+"""
+import argparse
+import json
+
+from analysis import inference_resolution_report, parse_exercise_ranges
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("video", help="Путь к видео")
+    parser.add_argument("--ranges", required=True, help="Интервалы как в exercise_ranges API")
+    parser.add_argument("--model-complexity", type=int, default=1)
+    parser.add_argument("--max-side", type=int, default=640, help="Максимальная сторона кадра для модели")
+    parser.add_argument("--crop", action="store_true", help="Вырезать кадр по человеку")
+    args = parser.parse_args()
+
+    report = inference_resolution_report(
+        args.video, parse_exercise_ranges(args.ranges), args.model_complexity, args.max_side, args.crop)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
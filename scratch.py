@@ -0,0 +1,254 @@
+import os
+import time
+import uuid
+import shutil
+import threading
+from typing import Dict, Optional
+
+from metrics import directory_size
+
+# Управляемое временное место для загрузок и промежуточных файлов задач.
+# Загрузки пишутся на диск кусками, каждый записанный байт учитывается
+# в квоте задачи и общей квоте, папки задач удаляются при выходе из with,
+# а фоновый сборщик удаляет папки, оставшиеся после падения процесса.
+
+CHUNK_SIZE = 1024 * 1024
+
+class ScratchQuotaError(Exception):
+    """Превышена квота временного места; status - HTTP-код ответа (413 или 507)"""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+class QuotaFile:
+    """Файл в папке incoming, запись в который учитывается в квотах.
+
+    Используется как stream_factory для multipart: загрузка сразу пишется
+    в хранилище, а потом переносится в папку задачи без копирования.
+    При закрытии без переноса файл удаляется, а место возвращается в квоту.
+    """
+
+    def __init__(self, storage: "ScratchStorage", path: str, limit: int):
+        self.storage = storage
+        self.path = path
+        self.limit = limit
+        self.size = 0
+        self.adopted = False
+        self.file = open(path, "wb+")
+
+    def write(self, data) -> int:
+        try:
+            if self.size + len(data) > self.limit:
+                raise ScratchQuotaError(f"Upload exceeds {self.limit} bytes", 413)
+            self.storage.charge(len(data))
+        except ScratchQuotaError:
+            # Разбор формы прервется, и файл может так и не попасть в request.files
+            self.close()
+            raise
+        self.size += len(data)
+        return self.file.write(data)
+
+    def close(self):
+        """Удаляет файл; место возвращается в квоту, если загрузку не забрала задача"""
+        if self.file.closed:
+            return
+        self.file.close()
+        if not self.adopted:
+            self.storage.refund(self.size)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.storage.forget(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __iter__(self):
+        return iter(self.file)
+
+class ScratchDir:
+    """Папка одной задачи с квотой; удаляется при выходе из with или release()"""
+
+    def __init__(self, storage: "ScratchStorage", path: str, quota: int):
+        self.storage = storage
+        self.path = path
+        self.quota = quota
+        self.bytes = 0
+        self.released = False
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def reserve(self, nbytes: int):
+        """Учитывает место под файл, который запишет не хранилище (например, OpenCV)"""
+        if self.bytes + nbytes > self.quota:
+            raise ScratchQuotaError(f"Job exceeds its scratch quota of {self.quota} bytes", 413)
+        self.storage.charge(nbytes)
+        self.bytes += nbytes
+
+    def save_stream(self, stream, name: str, max_bytes: Optional[int] = None) -> str:
+        """Пишет поток в файл кусками по CHUNK_SIZE с проверкой квот"""
+        limit = min(max_bytes or self.storage.max_upload_bytes, self.storage.max_upload_bytes)
+        path = self.file(name)
+        written = 0
+        with open(path, "wb") as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if written + len(chunk) > limit:
+                    raise ScratchQuotaError(f"Upload exceeds {limit} bytes", 413)
+                self.reserve(len(chunk))
+                f.write(chunk)
+                written += len(chunk)
+        return path
+
+    def adopt(self, stream, name: str) -> str:
+        """Переносит загрузку в папку задачи: QuotaFile - ссылкой, иной поток - копированием"""
+        if not isinstance(stream, QuotaFile):
+            stream.seek(0)
+            return self.save_stream(stream, name)
+        if self.bytes + stream.size > self.quota:
+            raise ScratchQuotaError(f"Job exceeds its scratch quota of {self.quota} bytes", 413)
+        stream.flush()
+        path = self.file(name)
+        os.link(stream.path, path)
+        stream.adopted = True
+        self.bytes += stream.size
+        return path
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.storage.refund(self.bytes)
+        self.storage.forget(self.path)
+
+    def __enter__(self) -> "ScratchDir":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class ScratchStorage:
+    """Временное место под загрузки и файлы задач с общей квотой и сборщиком сирот.
+
+    Папка, которой нет среди активных и которая старше ttl секунд, считается
+    оставшейся после падения и удаляется фоновым потоком.
+    """
+
+    def __init__(self, root: str, max_upload_bytes: int, job_quota_bytes: int,
+                 total_quota_bytes: int, ttl: int):
+        self.root = root
+        self.incoming = os.path.join(root, "incoming")
+        self.max_upload_bytes = max_upload_bytes
+        self.job_quota_bytes = job_quota_bytes
+        self.total_quota_bytes = total_quota_bytes
+        self.ttl = ttl
+        self.active = set()
+        self.lock = threading.Lock()
+        self.reaper = None
+        self.reaped = 0
+        # Диск читается при первом обращении, а не при создании: процессы
+        # параллельного анализа, которые заново выполняют api.py, его не трогают
+        self.used = None
+
+    def _ready(self):
+        """Папки хранилища и занятое место (под self.lock)"""
+        if self.used is None:
+            os.makedirs(self.incoming, exist_ok=True)
+            # Остатки прошлых запусков занимают место, пока их не удалит сборщик
+            self.used = directory_size(self.root)
+
+    def charge(self, nbytes: int):
+        with self.lock:
+            self._ready()
+            if self.used + nbytes > self.total_quota_bytes:
+                raise ScratchQuotaError("Scratch storage is full", 507)
+            self.used += nbytes
+
+    def refund(self, nbytes: int):
+        with self.lock:
+            self._ready()
+            self.used = max(0, self.used - nbytes)
+
+    def forget(self, path: str):
+        with self.lock:
+            self.active.discard(path)
+
+    def allocate(self) -> ScratchDir:
+        """Новая папка задачи"""
+        self.start_reaper()
+        with self.lock:
+            self._ready()
+            if self.used >= self.total_quota_bytes:
+                raise ScratchQuotaError("Scratch storage is full", 507)
+            path = os.path.join(self.root, uuid.uuid4().hex)
+            os.makedirs(path)
+            self.active.add(path)
+        return ScratchDir(self, path, self.job_quota_bytes)
+
+    def incoming_file(self) -> QuotaFile:
+        """Файл для потоковой записи загрузки"""
+        path = os.path.join(self.incoming, uuid.uuid4().hex)
+        with self.lock:
+            self._ready()
+            self.active.add(path)
+        return QuotaFile(self, path, min(self.max_upload_bytes, self.job_quota_bytes))
+
+    def reap(self):
+        """Удаляет неактивные папки и файлы загрузок старше ttl"""
+        now = time.time()
+        with self.lock:
+            self._ready()
+        candidates = [os.path.join(self.root, name) for name in os.listdir(self.root) if name != "incoming"]
+        candidates += [os.path.join(self.incoming, name) for name in os.listdir(self.incoming)]
+        for path in candidates:
+            with self.lock:
+                if path in self.active:
+                    continue
+            try:
+                if now - os.path.getmtime(path) <= self.ttl:
+                    continue
+                size = directory_size(path) if os.path.isdir(path) else os.path.getsize(path)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError:
+                continue
+            self.refund(size)
+            self.reaped += 1
+
+    def _reap_forever(self, interval: float):
+        while True:
+            try:
+                self.reap()
+            except OSError:
+                pass
+            time.sleep(interval)
+
+    def start_reaper(self, interval: Optional[float] = None):
+        """Запускает сборщик (один раз на процесс)"""
+        with self.lock:
+            if self.reaper is not None:
+                return
+            self.reaper = threading.Thread(
+                target=self._reap_forever, args=(interval or max(1.0, self.ttl / 4),),
+                daemon=True, name="scratch-reaper")
+        self.reaper.start()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            self._ready()
+            return {
+                "used_bytes": self.used,
+                "total_quota_bytes": self.total_quota_bytes,
+                "job_quota_bytes": self.job_quota_bytes,
+                "max_upload_bytes": self.max_upload_bytes,
+                "active": len(self.active),
+                "reaped": self.reaped
+            }
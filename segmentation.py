@@ -0,0 +1,186 @@
+import math
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import mediapipe as mp
+import numpy as np
+
+# Автоматическая разметка упражнений по потоку landmarks. Окно последних кадров
+# описывается несколькими признаками позы (наклон корпуса, руки над плечами,
+# разница высоты коленей) и размахом движения плеч и таза, а правила по этим
+# признакам относят окно к одному из упражнений или к отдыху. Суммы по окну
+# скользящие, поэтому кадр стоит O(1) при любой длине окна. Метки кадров
+# сливаются в отрезки, короткие отрезки поглощаются соседями.
+
+PoseLandmark = mp.solutions.pose.PoseLandmark
+
+REST = "Отдых"
+
+# Признаки кадра: доля вертикали в наклоне корпуса (1 - стоит или висит, 0 - лежит),
+# высота запястий над плечами, разница высоты коленей и высоты плеч и таза
+# (все в длинах корпуса)
+FEATURES = ("vertical", "hands_up", "knee_gap", "shoulder_y", "hip_y")
+
+# Доля кадров окна с найденным человеком, без которой окно - отдых, и оценка отдыха:
+# окно относится к упражнению, только если его оценка выше
+MIN_POSE_FRACTION = 0.5
+REST_SCORE = 0.25
+
+def ramp(value: float, low: float, high: float) -> float:
+    """0 до low, 1 после high, линейно между ними"""
+    return min(max((value - low) / (high - low), 0.0), 1.0)
+
+def frame_features(landmarks: np.ndarray, aspect: float) -> np.ndarray:
+    """Признаки кадра по массиву 33×4; aspect - ширина кадра к высоте (x и y в одном масштабе)"""
+    x = landmarks[:, 0].astype(np.float64) * aspect
+    y = landmarks[:, 1].astype(np.float64)
+    shoulder_x = (x[PoseLandmark.LEFT_SHOULDER] + x[PoseLandmark.RIGHT_SHOULDER]) / 2
+    shoulder_y = (y[PoseLandmark.LEFT_SHOULDER] + y[PoseLandmark.RIGHT_SHOULDER]) / 2
+    hip_x = (x[PoseLandmark.LEFT_HIP] + x[PoseLandmark.RIGHT_HIP]) / 2
+    hip_y = (y[PoseLandmark.LEFT_HIP] + y[PoseLandmark.RIGHT_HIP]) / 2
+    wrist_y = (y[PoseLandmark.LEFT_WRIST] + y[PoseLandmark.RIGHT_WRIST]) / 2
+    dx, dy = abs(shoulder_x - hip_x), abs(shoulder_y - hip_y)
+    torso = max(math.hypot(dx, dy), 1e-3)
+    return np.array([
+        dy / (dx + dy + 1e-6),
+        (shoulder_y - wrist_y) / torso,
+        abs(y[PoseLandmark.LEFT_KNEE] - y[PoseLandmark.RIGHT_KNEE]) / torso,
+        shoulder_y / torso,
+        hip_y / torso
+    ])
+
+class ExerciseClassifier:
+    """Скользящее окно из window кадров: средние признаков и размах движения по суммам окна"""
+
+    def __init__(self, window: int, aspect: float = 1.0):
+        self.window = max(1, window)
+        self.aspect = aspect
+        self.frames = deque()
+        self.sum = np.zeros(len(FEATURES))
+        self.sum_sq = np.zeros(len(FEATURES))
+        self.count = 0
+
+    def push(self, landmarks: Optional[np.ndarray]):
+        """Добавляет кадр (None - человек не найден) и убирает вышедший из окна"""
+        features = frame_features(landmarks, self.aspect) if landmarks is not None else None
+        self.frames.append(features)
+        if features is not None:
+            self.sum += features
+            self.sum_sq += features * features
+            self.count += 1
+        if len(self.frames) > self.window:
+            old = self.frames.popleft()
+            if old is not None:
+                self.sum -= old
+                self.sum_sq -= old * old
+                self.count -= 1
+
+    def scores(self) -> Dict[str, float]:
+        """Оценки упражнений и отдыха для текущего окна"""
+        if self.count < MIN_POSE_FRACTION * len(self.frames) or self.count == 0:
+            return {REST: 1.0}
+        mean = self.sum / self.count
+        std = np.sqrt(np.maximum(self.sum_sq / self.count - mean * mean, 0.0))
+        vertical, hands_up, knee_gap = mean[0], mean[1], mean[2]
+        shoulder_motion, hip_motion = std[3], std[4]
+
+        upright = ramp(vertical, 0.4, 0.7)
+        horizontal = 1.0 - upright
+        moving_shoulders = ramp(shoulder_motion, 0.06, 0.12)
+        moving_hips = ramp(hip_motion, 0.1, 0.2)
+        hanging = ramp(hands_up, 0.2, 0.8)
+        # В выпаде колени на разной высоте, в приседании - на одной
+        stepping = ramp(knee_gap, 0.15, 0.35)
+        return {
+            "Отжимания": horizontal * moving_shoulders,
+            "Планка": horizontal * (1.0 - moving_shoulders),
+            "Подтягивания": upright * hanging * moving_shoulders,
+            "Приседания": upright * (1.0 - hanging) * moving_hips * (1.0 - stepping),
+            "Выпады": upright * (1.0 - hanging) * moving_hips * stepping,
+            REST: REST_SCORE
+        }
+
+class ExerciseSegmenter:
+    """Метки окон -> отрезки (первый кадр, последний кадр, упражнение, уверенность).
+
+    Метка окна относится к его середине, поэтому разметка отстает на половину
+    окна. Уверенность кадра - доля оценки метки в сумме оценок; у отрезка -
+    среднее по его кадрам (кадры, отданные отрезку от поглощенных соседей, идут
+    с нулевой уверенностью). Серии короче min_frames поглощаются более длинным
+    соседом, отдых в отрезки не попадает.
+    """
+
+    def __init__(self, window: int, min_frames: int, aspect: float = 1.0):
+        self.classifier = ExerciseClassifier(window, aspect)
+        self.min_frames = max(1, min_frames)
+        self.runs = []  # [метка, первый кадр, последний кадр, сумма уверенности]
+        self.labeled = 0
+        self.last_frame = -1
+        self.label = REST
+        self.confidence = 0.0
+
+    def update(self, frame_index: int, landmarks: Optional[np.ndarray]) -> str:
+        """Следующий кадр прохода; возвращает метку текущего окна"""
+        self.classifier.push(landmarks)
+        scores = self.classifier.scores()
+        self.label = max(scores, key=scores.get)
+        self.confidence = scores[self.label] / sum(scores.values())
+        self.last_frame = frame_index
+        center = frame_index - self.classifier.window // 2
+        if center >= self.labeled:
+            self._extend(center, self.label, self.confidence)
+        return self.label
+
+    def _extend(self, last: int, label: str, confidence: float):
+        """Кадры до last включительно получают метку"""
+        frames = last - self.labeled + 1
+        if self.runs and self.runs[-1][0] == label:
+            self.runs[-1][2] = last
+            self.runs[-1][3] += confidence * frames
+        else:
+            self.runs.append([label, self.labeled, last, confidence * frames])
+        self.labeled = last + 1
+
+    def finish(self) -> List[Tuple[int, int, str, float]]:
+        """Отрезки упражнений по всем кадрам; кадры последней половины окна - с последней меткой"""
+        if self.last_frame >= self.labeled:
+            self._extend(self.last_frame, self.label, self.confidence)
+        runs = merge_short_runs(self.runs, self.min_frames)
+        return [(first, last, label, confidence / (last - first + 1))
+                for label, first, last, confidence in runs if label != REST]
+
+def merge_short_runs(runs: List[List], min_frames: int) -> List[List]:
+    """Поглощает серии короче min_frames соседями.
+
+    Порог растет вдвое за проход, поэтому сначала исчезают одиночные выбросы,
+    а более длинные серии сравниваются уже с очищенными соседями. Проход линейный.
+    """
+    runs = coalesce_runs(runs)
+    threshold = 1
+    while threshold < min_frames and len(runs) > 1:
+        threshold = min(threshold * 2, min_frames)
+        kept = []
+        for i, run in enumerate(runs):
+            length = run[2] - run[1] + 1
+            previous = kept[-1] if kept else None
+            following = runs[i + 1] if i + 1 < len(runs) else None
+            if length >= threshold or (previous is None and following is None):
+                kept.append(run)
+            elif following is None or (previous is not None and
+                                       previous[2] - previous[1] >= following[2] - following[1]):
+                previous[2] = run[2]
+            else:
+                following[1] = run[1]
+        runs = coalesce_runs(kept)
+    return runs
+
+def coalesce_runs(runs: List[List]) -> List[List]:
+    """Склеивает соседние серии с одной меткой"""
+    merged = []
+    for label, first, last, confidence in runs:
+        if merged and merged[-1][0] == label:
+            merged[-1][2] = last
+            merged[-1][3] += confidence
+        else:
+            merged.append([label, first, last, confidence])
+    return merged
@@ -0,0 +1,86 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+# Фильтры координат landmarks перед счетчиками. Оба работают с моментами
+# времени кадров, а не с их номерами, поэтому пропуски кадров (человек не найден,
+# выборка кадров, неровный поток с камеры) учитываются честно: чем длиннее
+# пауза, тем сильнее новый кадр вытесняет старое значение.
+
+SMOOTHING_METHODS = ("none", "ema", "one_euro")
+
+def smoothing_alpha(dt: float, cutoff: float) -> float:
+    """Коэффициент сглаживания первого порядка для шага dt (сек) и частоты среза cutoff (Гц)"""
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+class EmaFilter:
+    """Экспоненциальное сглаживание с постоянной времени tau (сек)"""
+
+    def __init__(self, tau: float = 0.08):
+        self.tau = tau
+        self.value = None
+        self.time = None
+
+    def reset(self):
+        self.value = None
+        self.time = None
+
+    def __call__(self, x: np.ndarray, t: float) -> np.ndarray:
+        if self.value is None:
+            self.value, self.time = np.array(x, dtype=np.float64), t
+            return self.value
+        dt = t - self.time
+        if dt <= 0:
+            return self.value
+        alpha = 1.0 - math.exp(-dt / self.tau)
+        self.value = self.value + alpha * (x - self.value)
+        self.time = t
+        return self.value
+
+class OneEuroFilter:
+    """Фильтр One Euro (Casiez и др., 2012): сильное сглаживание в покое, слабое в движении.
+
+    min_cutoff - частота среза в покое (Гц), beta - насколько она растет со скоростью,
+    d_cutoff - частота среза для оценки скорости.
+    """
+
+    def __init__(self, min_cutoff: float = 1.5, beta: float = 1.0, d_cutoff: float = 1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.value = None
+        self.velocity = None
+        self.time = None
+
+    def reset(self):
+        self.value = None
+        self.velocity = None
+        self.time = None
+
+    def __call__(self, x: np.ndarray, t: float) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        if self.value is None:
+            self.value, self.velocity, self.time = x.copy(), np.zeros_like(x), t
+            return self.value
+        dt = t - self.time
+        if dt <= 0:
+            return self.value
+        a_d = smoothing_alpha(dt, self.d_cutoff)
+        self.velocity = a_d * (x - self.value) / dt + (1 - a_d) * self.velocity
+        cutoff = self.min_cutoff + self.beta * np.abs(self.velocity)
+        tau = 1.0 / (2 * math.pi * cutoff)
+        alpha = 1.0 / (1.0 + tau / dt)
+        self.value = alpha * x + (1 - alpha) * self.value
+        self.time = t
+        return self.value
+
+def create_filter(method: str, min_cutoff: float = 1.5, beta: float = 1.0,
+                  tau: float = 0.08) -> Optional[object]:
+    """Фильтр по названию из SMOOTHING_METHODS; None для "none" """
+    if method == "ema":
+        return EmaFilter(tau)
+    if method == "one_euro":
+        return OneEuroFilter(min_cutoff, beta)
+    return None
@@ -0,0 +1,100 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import mediapipe as mp
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analysis
+from benchmark import synthetic_landmarks
+from checkpoint import CheckpointStore
+from landmark_cache import LandmarkCache, landmarks_from_array
+from pose_pool import PosePool
+
+# Тестовое видео: номер кадра записан полосами в пикселях, а поддельная модель
+# Pose по номеру отдает заранее известные landmarks (см. benchmark.synthetic_landmarks)
+FPS = 30.0
+WIDTH, HEIGHT = 320, 240
+FRAME_BITS = 10
+# Упражнения видео подряд: (упражнение, секунды, повторения)
+PLAN = [("Отжимания", 3, 3), ("Приседания", 3, 3), ("Планка", 2, 0), ("Подтягивания", 3, 3)]
+# Кадры без человека (каждый NO_POSE_EVERY-й)
+NO_POSE_EVERY = 37
+
+def plan_ranges():
+    """exercise_ranges видео в секундах"""
+    ranges, start = [], 0.0
+    for exercise, seconds, _ in PLAN:
+        ranges.append((start, start + seconds, exercise))
+        start += seconds
+    return ranges
+
+def plan_landmarks() -> np.ndarray:
+    return np.concatenate([
+        synthetic_landmarks(exercise, int(seconds * FPS), reps)[0] for exercise, seconds, reps in PLAN])
+
+LANDMARKS = plan_landmarks()
+
+def encode_frame(index: int) -> np.ndarray:
+    frame = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    bar = WIDTH // FRAME_BITS
+    for bit in range(FRAME_BITS):
+        if (index >> bit) & 1:
+            frame[:, bit * bar:(bit + 1) * bar] = 255
+    return frame
+
+def decode_frame(image: np.ndarray) -> int:
+    height, width = image.shape[:2]
+    bar = width / FRAME_BITS
+    return sum(1 << bit for bit in range(FRAME_BITS) if image[height // 2, int((bit + 0.5) * bar)].mean() > 127)
+
+class FakeResult:
+    def __init__(self, pose_landmarks):
+        self.pose_landmarks = pose_landmarks
+
+class FakePose:
+    """Pose без модели: landmarks кадра определяются его номером"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def process(self, image):
+        index = decode_frame(image)
+        if index % NO_POSE_EVERY == 0 or index >= len(LANDMARKS):
+            return FakeResult(None)
+        return FakeResult(landmarks_from_array(LANDMARKS[index]))
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.fixture(scope="session")
+def video_path(tmp_path_factory) -> str:
+    path = str(tmp_path_factory.mktemp("video") / "workout.mp4")
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), FPS, (WIDTH, HEIGHT))
+    for index in range(len(LANDMARKS)):
+        out.write(encode_frame(index))
+    out.release()
+    return path
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Анализ с поддельной моделью, своими кешем и контрольными точками и пулом отрезков в потоках"""
+    monkeypatch.setattr(mp.solutions.pose, "Pose", FakePose)
+    monkeypatch.setattr(analysis, "pose_pool", PosePool({0: 1, 1: 2, 2: 1}))
+    monkeypatch.setattr(analysis, "landmark_cache", LandmarkCache(str(tmp_path / "landmarks"), 10 ** 9))
+    monkeypatch.setattr(analysis, "checkpoint_store", CheckpointStore(str(tmp_path / "checkpoints"), 3600))
+    # Куски отрезков режут повторения посередине, чтобы слияние выбирало ветку счетчика
+    monkeypatch.setattr(analysis, "CHUNK_FRAMES", 47)
+    monkeypatch.setattr(analysis, "CHECKPOINT_FRAMES", 40)
+    # Отрезки в потоках этого процесса: в процессах spawn не было бы поддельной модели
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(analysis, "get_process_pool", lambda: pool)
+    yield tmp_path
+    pool.shutdown(wait=True)
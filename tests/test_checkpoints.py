@@ -0,0 +1,81 @@
+import hashlib
+import os
+
+import pytest
+
+import analysis
+from conftest import plan_ranges
+from landmark_cache import LandmarkCache
+
+class Crash(Exception):
+    """Падение процесса посреди анализа"""
+
+def crash_after(frames: int):
+    def progress(done, total):
+        if done >= frames:
+            raise Crash()
+    return progress
+
+def analyze(video_path, tmp_path, name, ranges=None, render=False, **kwargs):
+    return analysis.analyze_video(video_path, str(tmp_path / f"{name}.mp4"), ranges or plan_ranges(),
+                                  render=render, **kwargs)
+
+def video_digest(path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def uninterrupted(video_path, tmp_path, monkeypatch, **kwargs):
+    """Тот же анализ без падения, со своим кешем landmarks.
+
+    Контрольные точки входят в результат: на них трекинг, фильтр и выборка
+    начинают заново, поэтому сравнивать нужно с анализом с контрольными точками.
+    """
+    with monkeypatch.context() as patch:
+        patch.setattr(analysis, "landmark_cache", LandmarkCache(str(tmp_path / "expected_landmarks"), 10 ** 9))
+        return analyze(video_path, tmp_path, "expected", checkpoints=True, **kwargs)
+
+def resumed(result) -> bool:
+    checkpoint = result["checkpoint"]
+    return bool(checkpoint.get("resumed_from_frame") or checkpoint.get("resumed_spans"))
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"only_ranges": False},
+    {"sampling": "adaptive"},
+    {"smoothing": "one_euro", "min_rep_duration": 0.2},
+    {"workers": 2},
+], ids=["full", "all_frames", "adaptive", "tuned", "parallel"])
+def test_resume_after_crash_matches_uninterrupted_run(engine, video_path, monkeypatch, options):
+    expected = uninterrupted(video_path, engine, monkeypatch, **options)
+    with pytest.raises(Crash):
+        analyze(video_path, engine, "crashed", checkpoints=True, progress=crash_after(150), **options)
+    result = analyze(video_path, engine, "resumed", checkpoints=True, **options)
+    assert resumed(result)
+    assert result["exercise_stats"] == expected["exercise_stats"]
+    assert result["processed_frames"] == expected["processed_frames"]
+    if options.get("sampling") == "adaptive":
+        assert result["sampling"] == expected["sampling"]
+    # Точка удаляется после успешного анализа
+    assert os.listdir(analysis.checkpoint_store.root) == []
+
+def test_adaptive_resume_ignores_frames_cached_by_other_analyses(engine, video_path, monkeypatch):
+    expected = uninterrupted(video_path, engine, monkeypatch, sampling="adaptive", render=True)
+    # Другой анализ того же видео уже положил в кеш все кадры первых секунд
+    analyze(video_path, engine, "other", ranges=[(0.0, 4.0, "Отжимания")])
+    with pytest.raises(Crash):
+        analyze(video_path, engine, "crashed", checkpoints=True, sampling="adaptive", render=True,
+                progress=crash_after(150))
+    result = analyze(video_path, engine, "resumed", checkpoints=True, sampling="adaptive", render=True)
+    assert resumed(result)
+    assert result["exercise_stats"] == expected["exercise_stats"]
+    assert result["sampling"] == expected["sampling"]
+    # Кадры до точки размечены landmarks этого анализа, а не кадров другого
+    assert video_digest(engine / "resumed.mp4") == video_digest(engine / "expected.mp4")
+
+def test_checkpoint_is_not_reused_with_other_parameters(engine, video_path, monkeypatch):
+    expected = uninterrupted(video_path, engine, monkeypatch, use_cache=False, hysteresis=0.05)
+    with pytest.raises(Crash):
+        analyze(video_path, engine, "crashed", checkpoints=True, use_cache=False, progress=crash_after(150))
+    result = analyze(video_path, engine, "other", checkpoints=True, use_cache=False, hysteresis=0.05)
+    assert not resumed(result)
+    assert result["exercise_stats"] == expected["exercise_stats"]
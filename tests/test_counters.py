@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import analysis
+from benchmark import synthetic_landmarks
+from landmark_cache import FRAME_NO_POSE, FRAME_POSE, landmarks_from_array
+
+FPS = 30.0
+
+def scalar_stats(landmarks, status, segments, fps):
+    """Покадровый подсчет, как в analyze_video"""
+    exercise_states, exercise_stats = analysis.create_exercise_state()
+    for start, end, active in segments:
+        for frame_index in range(start, end + 1):
+            analysis.advance_clock(active, exercise_states)
+            if status[frame_index] != FRAME_POSE:
+                continue
+            pose_landmarks = landmarks_from_array(landmarks[frame_index])
+            for ex_type in active:
+                analysis.update_exercise(ex_type, pose_landmarks, exercise_states, exercise_stats)
+    return analysis.clock_stats(exercise_states, exercise_stats, fps)
+
+def workout(noise: float, seed: int):
+    """Упражнения подряд, часть кадров без человека"""
+    plan = [("Отжимания", 120, 5), ("Приседания", 150, 4), ("Планка", 90, 0),
+            ("Подтягивания", 120, 6), ("Выпады", 150, 5)]
+    series, segments, start = [], [], 0
+    for exercise, frames, reps in plan:
+        series.append(synthetic_landmarks(exercise, frames, reps, noise, seed)[0])
+        segments.append((start, start + frames - 1, (exercise,)))
+        start += frames
+    landmarks = np.concatenate(series)
+    status = np.full(len(landmarks), FRAME_POSE, dtype=np.uint8)
+    status[np.random.default_rng(seed).random(len(landmarks)) < 0.05] = FRAME_NO_POSE
+    return landmarks, status, segments
+
+@pytest.mark.parametrize("noise, seed", [(0.0, 0), (0.01, 1), (0.03, 2)])
+def test_vectorized_counters_match_scalar(noise, seed):
+    landmarks, status, segments = workout(noise, seed)
+    expected = scalar_stats(landmarks, status, segments, FPS)
+    assert analysis.count_exercises_vectorized(landmarks, status, segments, FPS) == expected
+
+def test_overlapping_segments_count_each_exercise():
+    landmarks, status, _ = workout(0.01, 3)
+    segments = analysis.build_range_segments(
+        [(0, 300, "Отжимания"), (100, 500, "Приседания"), (250, 700, "Планка")], len(landmarks))
+    expected = scalar_stats(landmarks, status, segments, FPS)
+    assert analysis.count_exercises_vectorized(landmarks, status, segments, FPS) == expected
+
+def test_rep_events_and_replay_agree_with_counts():
+    landmarks, status, segments = workout(0.01, 4)
+    frames = np.arange(len(landmarks))
+    stats = analysis.count_exercises_vectorized(landmarks, status, segments, FPS)
+    events = analysis.rep_events_vectorized(landmarks, status, frames, segments, FPS)
+    replayed, replay_events = analysis.replay_counters(landmarks, status, frames, segments, FPS,
+                                                       analysis.CounterTuning())
+    assert replayed == stats
+    for ex_index, ex_type in enumerate(analysis.EXERCISE_TYPES):
+        if ex_type == "Планка":
+            continue
+        assert np.count_nonzero(events["rep_exercise"] == ex_index) == stats[ex_type]["count"]
+        assert np.count_nonzero(replay_events["rep_exercise"] == ex_index) == stats[ex_type]["count"]
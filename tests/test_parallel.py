@@ -0,0 +1,27 @@
+import pytest
+
+import analysis
+from conftest import plan_ranges
+
+def analyze(video_path, tmp_path, name, **kwargs):
+    return analysis.analyze_video(video_path, str(tmp_path / f"{name}.mp4"), plan_ranges(), **kwargs)
+
+@pytest.mark.parametrize("only_ranges", [True, False])
+def test_span_merge_matches_sequential_run(engine, video_path, only_ranges):
+    sequential = analyze(video_path, engine, "sequential", only_ranges=only_ranges, use_cache=False, render=False)
+    parallel = analyze(video_path, engine, "parallel", only_ranges=only_ranges, use_cache=False, render=False,
+                       workers=2)
+    assert parallel["exercise_stats"] == sequential["exercise_stats"]
+    assert parallel["processed_frames"] == sequential["processed_frames"]
+    assert sequential["exercise_stats"]["Отжимания"]["count"] > 0
+
+def test_span_merge_with_hysteresis(engine, video_path):
+    sequential = analyze(video_path, engine, "sequential", use_cache=False, render=False, hysteresis=0.05)
+    parallel = analyze(video_path, engine, "parallel", use_cache=False, render=False, hysteresis=0.05, workers=2)
+    assert parallel["exercise_stats"] == sequential["exercise_stats"]
+
+def test_parallel_run_fills_landmark_cache(engine, video_path):
+    parallel = analyze(video_path, engine, "parallel", workers=2, render=False)
+    cached = analyze(video_path, engine, "cached", counting_engine="vector", render=False)
+    assert cached["cache_hit"]
+    assert cached["exercise_stats"] == parallel["exercise_stats"]
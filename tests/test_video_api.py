@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+import api
+from conftest import plan_ranges
+from scratch import ScratchStorage
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "VIDEO_DIR", str(tmp_path / "videos"))
+    monkeypatch.setattr(api, "scratch_storage", ScratchStorage(str(tmp_path / "scratch"), 10 ** 9, 10 ** 9,
+                                                               10 ** 10, 3600))
+    return api.app.test_client()
+
+@pytest.fixture
+def stored_video(tmp_path, client):
+    """Идентификатор и содержимое видео в хранилище размеченных видео"""
+    content = bytes(range(256)) * 40
+    path = tmp_path / "annotated.mp4"
+    path.write_bytes(content)
+    return api.store_video(str(path)), content
+
+def test_full_video(client, stored_video):
+    video_id, content = stored_video
+    response = client.get(f"/videos/{video_id}")
+    assert response.status_code == 200
+    assert response.mimetype == "video/mp4"
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.data == content
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=1000-", 1000, 10239),
+    ("bytes=-256", 9984, 10239),
+    ("bytes=5000-99999", 5000, 10239),
+])
+def test_range_request(client, stored_video, header, start, end):
+    video_id, content = stored_video
+    response = client.get(f"/videos/{video_id}", headers={"Range": header})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes {start}-{end}/{len(content)}"
+    assert response.data == content[start:end + 1]
+
+def test_unsatisfiable_range(client, stored_video):
+    video_id, content = stored_video
+    response = client.get(f"/videos/{video_id}", headers={"Range": f"bytes={len(content)}-"})
+    assert response.status_code == 416
+
+@pytest.mark.parametrize("video_id", ["0" * 32, "../etc/passwd", "ABCDEF" + "0" * 26])
+def test_unknown_video(client, video_id):
+    assert client.get(f"/videos/{video_id}").status_code == 404
+
+@pytest.mark.parametrize("render", [0, 1])
+def test_process_video_streams_annotated_video_only_on_request(engine, client, video_path, render):
+    with open(video_path, "rb") as f:
+        response = client.post("/process_video", data={
+            "video": (f, "workout.mp4"), "exercise_ranges": str(plan_ranges()), "render": render})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["exercise_stats"]["Отжимания"]["count"] > 0
+    assert "video" not in result
+    if not render:
+        assert result["video_url"] is None
+        return
+    head = client.get(result["video_url"], headers={"Range": "bytes=0-1023"})
+    assert head.status_code == 206
+    assert len(head.data) == 1024
+    size = os.path.getsize(os.path.join(api.VIDEO_DIR, result["video_url"].rsplit("/", 1)[1] + ".mp4"))
+    assert head.headers["Content-Range"] == f"bytes 0-1023/{size}"
@@ -0,0 +1,128 @@
+import numpy as np
+import mediapipe as mp
+from typing import Tuple
+
+# Векторные версии счетчиков из api.py. Работают с массивом landmarks
+# формы (кадры×33×4: x, y, z, visibility) только по кадрам, где человек найден,
+# и возвращают тот же результат, что и покадровые count_* на тех же данных.
+
+PoseLandmark = mp.solutions.pose.PoseLandmark
+
+def _midpoint(landmarks: np.ndarray, left: int, right: int, axis: int = 1) -> np.ndarray:
+    """Середина пары точек по оси (в float64, как в покадровых функциях)"""
+    return (landmarks[:, left, axis].astype(np.float64) + landmarks[:, right, axis].astype(np.float64)) / 2
+
+def count_transitions(target: np.ndarray, prev_is_target: bool) -> Tuple[int, bool]:
+    """Число переходов в целевое состояние и итоговое состояние.
+
+    target - булев массив "кадр в целевом состоянии", prev_is_target - состояние
+    до первого кадра. Предыдущее состояние в счетчиках всегда равно состоянию
+    последнего кадра, поэтому переходы считаются по сдвинутому массиву.
+    """
+    if len(target) == 0:
+        return 0, prev_is_target
+    previous = np.empty_like(target)
+    previous[0] = prev_is_target
+    previous[1:] = target[:-1]
+    return int(np.count_nonzero(target & ~previous)), bool(target[-1])
+
+def transition_runs(target: np.ndarray, prev_is_target: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """Серии подряд идущих кадров в целевом состоянии, начавшиеся с перехода.
+
+    Возвращает индексы первого и последнего кадра каждой серии. Серий столько же,
+    сколько переходов насчитает count_transitions: серия, продолжающая
+    состояние до первого кадра, не считается.
+    """
+    if len(target) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    previous = np.empty_like(target)
+    previous[0] = prev_is_target
+    previous[1:] = target[:-1]
+    following = np.zeros_like(target)
+    following[:-1] = target[1:]
+    starts = np.flatnonzero(target & ~previous)
+    ends = np.flatnonzero(target & ~following)
+    return starts, ends[np.searchsorted(ends, starts)]
+
+def pushups_down(landmarks: np.ndarray) -> np.ndarray:
+    """Кадры в нижней фазе отжимания"""
+    shoulder_y = _midpoint(landmarks, PoseLandmark.LEFT_SHOULDER, PoseLandmark.RIGHT_SHOULDER)
+    elbow_y = _midpoint(landmarks, PoseLandmark.LEFT_ELBOW, PoseLandmark.RIGHT_ELBOW)
+    return elbow_y > shoulder_y
+
+def squats_down(landmarks: np.ndarray) -> np.ndarray:
+    """Кадры в нижней фазе приседания"""
+    hip_y = _midpoint(landmarks, PoseLandmark.LEFT_HIP, PoseLandmark.RIGHT_HIP)
+    knee_y = _midpoint(landmarks, PoseLandmark.LEFT_KNEE, PoseLandmark.RIGHT_KNEE)
+    return knee_y > hip_y
+
+def pullups_up(landmarks: np.ndarray) -> np.ndarray:
+    """Кадры в верхней фазе подтягивания"""
+    shoulder_y = _midpoint(landmarks, PoseLandmark.LEFT_SHOULDER, PoseLandmark.RIGHT_SHOULDER)
+    elbow_y = _midpoint(landmarks, PoseLandmark.LEFT_ELBOW, PoseLandmark.RIGHT_ELBOW)
+    return elbow_y < shoulder_y
+
+def lunges_down(landmarks: np.ndarray) -> np.ndarray:
+    """Кадры в нижней фазе выпада"""
+    left_knee = landmarks[:, PoseLandmark.LEFT_KNEE].astype(np.float64)
+    right_knee = landmarks[:, PoseLandmark.RIGHT_KNEE].astype(np.float64)
+    left_ankle_x = landmarks[:, PoseLandmark.LEFT_ANKLE, 0].astype(np.float64)
+    right_ankle_x = landmarks[:, PoseLandmark.RIGHT_ANKLE, 0].astype(np.float64)
+
+    left_in_front = left_knee[:, 0] < right_knee[:, 0]
+    front_knee_x = np.where(left_in_front, left_knee[:, 0], right_knee[:, 0])
+    # count_lunges сравнивает точки целиком: у совпадающих коленей берется левая лодыжка
+    use_left_ankle = left_in_front | np.all(left_knee == right_knee, axis=1)
+    ankle_x = np.where(use_left_ankle, left_ankle_x, right_ankle_x)
+    return np.abs(front_knee_x - ankle_x) < 0.1
+
+def plank_aligned(landmarks: np.ndarray) -> np.ndarray:
+    """Кадры, где плечи и бедра на одной линии"""
+    shoulder_y = _midpoint(landmarks, PoseLandmark.LEFT_SHOULDER, PoseLandmark.RIGHT_SHOULDER)
+    hip_y = _midpoint(landmarks, PoseLandmark.LEFT_HIP, PoseLandmark.RIGHT_HIP)
+    return np.abs(shoulder_y - hip_y) < 0.1
+
+# Глубина фазы: чем больше, тем дальше кадр от порога внутри целевой фазы.
+# Нужна, чтобы найти кадр нижней (для подтягиваний - верхней) точки повторения
+
+def pushups_depth(landmarks: np.ndarray) -> np.ndarray:
+    return (_midpoint(landmarks, PoseLandmark.LEFT_ELBOW, PoseLandmark.RIGHT_ELBOW)
+            - _midpoint(landmarks, PoseLandmark.LEFT_SHOULDER, PoseLandmark.RIGHT_SHOULDER))
+
+def squats_depth(landmarks: np.ndarray) -> np.ndarray:
+    return (_midpoint(landmarks, PoseLandmark.LEFT_KNEE, PoseLandmark.RIGHT_KNEE)
+            - _midpoint(landmarks, PoseLandmark.LEFT_HIP, PoseLandmark.RIGHT_HIP))
+
+def pullups_depth(landmarks: np.ndarray) -> np.ndarray:
+    return -pushups_depth(landmarks)
+
+def lunges_depth(landmarks: np.ndarray) -> np.ndarray:
+    """Чем ближе переднее колено к лодыжке по x, тем глубже выпад"""
+    left_knee_x = landmarks[:, PoseLandmark.LEFT_KNEE, 0].astype(np.float64)
+    right_knee_x = landmarks[:, PoseLandmark.RIGHT_KNEE, 0].astype(np.float64)
+    left_in_front = left_knee_x < right_knee_x
+    front_knee_x = np.where(left_in_front, left_knee_x, right_knee_x)
+    ankle_x = np.where(left_in_front, landmarks[:, PoseLandmark.LEFT_ANKLE, 0],
+                       landmarks[:, PoseLandmark.RIGHT_ANKLE, 0]).astype(np.float64)
+    return -np.abs(front_knee_x - ankle_x)
+
+def count_pushups(landmarks: np.ndarray, prev_state: str, counter: int) -> Tuple[int, str]:
+    """Векторный аналог api.count_pushups"""
+    count, down = count_transitions(pushups_down(landmarks), prev_state == "down")
+    return counter + count, "down" if down else "up"
+
+def count_squats(landmarks: np.ndarray, prev_state: str, counter: int) -> Tuple[int, str]:
+    """Векторный аналог api.count_squats"""
+    count, down = count_transitions(squats_down(landmarks), prev_state == "down")
+    return counter + count, "down" if down else "up"
+
+def count_pullups(landmarks: np.ndarray, prev_state: str, counter: int) -> Tuple[int, str]:
+    """Векторный аналог api.count_pullups"""
+    count, up = count_transitions(pullups_up(landmarks), prev_state == "up")
+    return counter + count, "up" if up else "down"
+
+def count_lunges(landmarks: np.ndarray, prev_state: str, counter: int) -> Tuple[int, str]:
+    """Векторный аналог api.count_lunges"""
+    count, down = count_transitions(lunges_down(landmarks), prev_state == "down")
+    return counter + count, "down" if down else "up"